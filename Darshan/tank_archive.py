@@ -0,0 +1,148 @@
+"""
+Run archive for the coupled tank app.
+
+Every finished run is stored under RUNS_DIR as <run_id>.gtc (compressed,
+see tank_codec) plus <run_id>.json with the run parameters. Runs archived
+as <run_id>.csv by earlier versions are still readable. Recorded runs can
+be loaded back by run ID or by CSV path for replay; CSV paths must lie
+under RUNS_DIR or one of TANK_REPLAY_DIRS (os.pathsep-separated), since
+they come from HTTP requests.
+"""
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import tank_codec
+
+RUNS_DIR = os.getenv("TANK_RUNS_DIR", "runs")
+REPLAY_DIRS = [d for d in os.getenv("TANK_REPLAY_DIRS", "").split(os.pathsep) if d]
+TIME_COLUMN = "Time (s)"
+DEFAULT_COLUMNS = [TIME_COLUMN, "Tank 1 Height (cm)", "Tank 2 Height (cm)"]
+
+
+def new_run_id():
+    return time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+
+
+def is_run_id(name):
+    """True for a plain file name that cannot point outside RUNS_DIR."""
+    return (bool(name) and name not in (".", "..") and os.path.basename(name) == name
+            and "/" not in name and "\\" not in name)
+
+
+def run_path(run_id, ext):
+    if not is_run_id(run_id):
+        raise FileNotFoundError(f"No archived run named '{run_id}'")
+    return os.path.join(RUNS_DIR, f"{run_id}.{ext}")
+
+
+def replayable(path):
+    """True if path resolves (symlinks included) inside RUNS_DIR or a REPLAY_DIRS entry."""
+    real = os.path.realpath(path)
+    for directory in [RUNS_DIR, *REPLAY_DIRS]:
+        root = os.path.realpath(directory)
+        if os.path.commonpath([real, root]) == root:
+            return True
+    return False
+
+
+def save_run(rows, columns=DEFAULT_COLUMNS, meta=None):
+    """Write a finished run to the archive and return its run ID."""
+    if not rows:
+        return None
+    os.makedirs(RUNS_DIR, exist_ok=True)
+    run_id = new_run_id()
+
+    tank_codec.write_file(run_path(run_id, "gtc"), columns, rows)
+
+    info = dict(meta or {})
+    info.update({
+        "run_id": run_id,
+        "columns": list(columns),
+        "samples": len(rows),
+        "format": "gtc",
+        "bytes": os.path.getsize(run_path(run_id, "gtc"))
+    })
+    with open(run_path(run_id, "json"), "w") as f:
+        json.dump(info, f, indent=2)
+
+    print(f"[ARCHIVE] Saved run {run_id} ({len(rows)} samples)")
+    return run_id
+
+
+def list_runs():
+    """Metadata of every archived run, newest first."""
+    if not os.path.isdir(RUNS_DIR):
+        return []
+    runs = []
+    for name in sorted(os.listdir(RUNS_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(RUNS_DIR, name)) as f:
+                runs.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return runs
+
+
+def load_csv(path):
+    """Read a CSV in the /download layout. Returns (columns, rows)."""
+    df = pd.read_csv(path)
+    if "Sample" in df.columns:
+        df = df.drop(columns=["Sample"])
+    if TIME_COLUMN not in df.columns:
+        raise ValueError(f"{path}: missing '{TIME_COLUMN}' column")
+    columns = [TIME_COLUMN] + [c for c in df.columns if c != TIME_COLUMN]
+    rows = [tuple(r) for r in df[columns].itertuples(index=False, name=None)]
+    return columns, rows
+
+
+def load_meta(run_id):
+    if os.path.isfile(run_path(run_id, "json")):
+        with open(run_path(run_id, "json")) as f:
+            return json.load(f)
+    return {"run_id": run_id}
+
+
+def load_range(run_id, t_from=None, t_to=None):
+    """Rows of an archived run between two times. Returns (columns, times, values).
+
+    Compressed runs only decode the chunks that overlap the range.
+    """
+    if os.path.isfile(run_path(run_id, "gtc")):
+        reader = tank_codec.GtcReader(run_path(run_id, "gtc"))
+        times, values = reader.read_range(t_from, t_to)
+        return reader.columns, times, values
+
+    columns, rows, _ = load_run(run_id)
+    data = np.array(rows, dtype=np.float64).reshape(-1, len(columns))
+    keep = np.ones(len(data), dtype=bool)
+    if t_from is not None:
+        keep &= data[:, 0] >= t_from
+    if t_to is not None:
+        keep &= data[:, 0] <= t_to
+    return columns, data[keep, 0], data[keep, 1:]
+
+
+def load_run(source):
+    """Load an archived run by ID, or a CSV file under RUNS_DIR / REPLAY_DIRS by path.
+
+    Returns (columns, rows, meta).
+    """
+    if is_run_id(source) and os.path.isfile(run_path(source, "gtc")):
+        reader = tank_codec.GtcReader(run_path(source, "gtc"))
+        times, values = reader.read_range()
+        rows = [(t, *v) for t, v in zip(times.tolist(), values.tolist())]
+        return reader.columns, rows, load_meta(source)
+
+    if is_run_id(source) and os.path.isfile(run_path(source, "csv")):
+        columns, rows = load_csv(run_path(source, "csv"))
+        return columns, rows, load_meta(source)
+
+    if source.endswith(".csv") and os.path.isfile(source) and replayable(source):
+        columns, rows = load_csv(source)
+        return columns, rows, {"run_id": os.path.basename(source)}
+
+    raise FileNotFoundError(f"No archived run or CSV named '{source}'")
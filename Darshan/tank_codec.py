@@ -0,0 +1,321 @@
+"""
+Gorilla-style compressed storage for tank runs (.gtc files).
+
+Samples are split into chunks of CHUNK_SIZE rows. Inside a chunk the
+timestamps are stored as delta-of-delta bit codes and every channel as
+XOR-compressed float64 values (Pelkonen et al., "Gorilla", VLDB 2015),
+each column in its own bit stream so one channel can be decoded alone.
+
+File layout:
+
+    b"GTC1" | u32 header length | JSON header (columns, scales)
+    chunk 0 | chunk 1 | ...
+    chunk index: per chunk (offset, length, count, t_first, t_last)
+    footer: u64 index offset | u32 chunk count | b"GTC1"
+
+The footer/index give random access by chunk and by time range.
+
+Tank levels are logged with 2 decimals. When every value in a file
+survives a round trip through x * 100, the scaled (integer-valued)
+floats are XOR-encoded instead, which leaves long runs of trailing
+zero bits and compresses far better. Decoding divides back exactly.
+"""
+import json
+import struct
+import numpy as np
+
+MAGIC = b"GTC1"
+CHUNK_SIZE = 1024
+TIME_SCALE = 1000          # timestamps are stored as integer milliseconds
+VALUE_SCALE = 100          # used when values have at most 2 decimals
+
+INDEX_ENTRY = struct.Struct("<QIIdd")
+FOOTER = struct.Struct("<QI4s")
+CHUNK_HEADER = struct.Struct("<I")     # row count, followed by one u32 length per column
+
+# (prefix bits, prefix length, payload bits) for zigzagged delta-of-deltas
+DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+# ------------------------------------------------------------
+# Bit streams
+# ------------------------------------------------------------
+class BitWriter:
+    def __init__(self):
+        self.out = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+        if self.nbits >= 64:
+            nbytes, rem = divmod(self.nbits, 8)
+            self.out += (self.acc >> rem).to_bytes(nbytes, "big")
+            self.acc &= (1 << rem) - 1
+            self.nbits = rem
+
+    def getvalue(self):
+        pad = -self.nbits % 8
+        tail = (self.acc << pad).to_bytes((self.nbits + pad) // 8, "big")
+        return bytes(self.out + tail)
+
+
+class BitReader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, nbits):
+        start, skip = divmod(self.pos, 8)
+        nbytes = (skip + nbits + 7) // 8
+        word = int.from_bytes(self.data[start:start + nbytes], "big")
+        self.pos += nbits
+        return (word >> (nbytes * 8 - skip - nbits)) & ((1 << nbits) - 1)
+
+    def bit(self):
+        byte = self.data[self.pos >> 3]
+        value = (byte >> (7 - (self.pos & 7))) & 1
+        self.pos += 1
+        return value
+
+
+def zigzag(n):
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+
+def unzigzag(z):
+    return (z >> 1) if not z & 1 else -((z + 1) >> 1)
+
+
+# ------------------------------------------------------------
+# Column codecs
+# ------------------------------------------------------------
+def encode_times(ticks):
+    w = BitWriter()
+    w.write(ticks[0] & 0xFFFFFFFFFFFFFFFF, 64)
+    prev, prev_delta = ticks[0], 0
+    for i in range(1, len(ticks)):
+        delta = ticks[i] - prev
+        z = zigzag(delta - prev_delta)
+        if z == 0:
+            w.write(0, 1)
+        else:
+            for prefix, plen, bits in DOD_BUCKETS:
+                if z < (1 << bits):
+                    w.write(prefix, plen)
+                    w.write(z, bits)
+                    break
+            else:
+                w.write(0b1111, 4)
+                w.write(z, 64)
+        prev, prev_delta = ticks[i], delta
+    return w.getvalue()
+
+
+def decode_times(data, count):
+    r = BitReader(data)
+    first = r.read(64)
+    if first >= 1 << 63:
+        first -= 1 << 64
+    ticks = [first]
+    prev, prev_delta = first, 0
+    for _ in range(count - 1):
+        if not r.bit():
+            z = 0
+        elif not r.bit():
+            z = r.read(7)
+        elif not r.bit():
+            z = r.read(9)
+        elif not r.bit():
+            z = r.read(12)
+        else:
+            z = r.read(64)
+        prev_delta += unzigzag(z)
+        prev += prev_delta
+        ticks.append(prev)
+    return ticks
+
+
+def encode_values(values):
+    bits = np.asarray(values, dtype=np.float64).view(np.uint64).tolist()
+    w = BitWriter()
+    w.write(bits[0], 64)
+    prev = bits[0]
+    lead, trail = 65, 0            # no previous window yet
+    for b in bits[1:]:
+        x = b ^ prev
+        prev = b
+        if x == 0:
+            w.write(0, 1)
+            continue
+        new_lead = min(64 - x.bit_length(), 31)
+        new_trail = (x & -x).bit_length() - 1
+        if new_lead >= lead and new_trail >= trail:
+            w.write(0b10, 2)
+            w.write(x >> trail, 64 - lead - trail)
+        else:
+            lead, trail = new_lead, new_trail
+            size = 64 - lead - trail
+            w.write(0b11, 2)
+            w.write(lead, 5)
+            w.write(size & 63, 6)          # 64 is stored as 0
+            w.write(x >> trail, size)
+    return w.getvalue()
+
+
+def decode_values(data, count):
+    r = BitReader(data)
+    prev = r.read(64)
+    out = [prev]
+    lead = trail = 0
+    for _ in range(count - 1):
+        if r.bit():
+            if r.bit():
+                lead = r.read(5)
+                size = r.read(6) or 64
+                trail = 64 - lead - size
+            prev ^= r.read(64 - lead - trail) << trail
+        out.append(prev)
+    return np.array(out, dtype=np.uint64).view(np.float64)
+
+
+# ------------------------------------------------------------
+# Chunks
+# ------------------------------------------------------------
+def encode_chunk(times, values, value_scale=1):
+    """times (n,) seconds and values (n, channels) -> chunk bytes."""
+    values = np.asarray(values, dtype=np.float64).reshape(len(times), -1)
+    if value_scale != 1:
+        values = np.rint(values * value_scale)
+    ticks = np.rint(np.asarray(times, dtype=np.float64) * TIME_SCALE).astype(np.int64).tolist()
+    sections = [encode_times(ticks)] + [encode_values(values[:, c]) for c in range(values.shape[1])]
+    lengths = struct.pack(f"<{len(sections)}I", *map(len, sections))
+    return CHUNK_HEADER.pack(len(ticks)) + lengths + b"".join(sections)
+
+
+def decode_chunk(buf, channels, columns=None, value_scale=1):
+    """Inverse of encode_chunk. `columns` limits decoding to those value columns."""
+    (count,) = CHUNK_HEADER.unpack_from(buf, 0)
+    lengths = struct.unpack_from(f"<{channels + 1}I", buf, CHUNK_HEADER.size)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]) + CHUNK_HEADER.size + 4 * (channels + 1)
+
+    def section(i):
+        return buf[offsets[i]:offsets[i + 1]]
+
+    times = np.array(decode_times(section(0), count), dtype=np.float64) / TIME_SCALE
+    wanted = range(channels) if columns is None else columns
+    values = np.empty((count, len(wanted)))
+    for k, c in enumerate(wanted):
+        values[:, k] = decode_values(section(c + 1), count)
+    if value_scale != 1:
+        values /= value_scale
+    return times, values
+
+
+# ------------------------------------------------------------
+# Files
+# ------------------------------------------------------------
+def write_file(path, columns, rows, chunk_size=CHUNK_SIZE):
+    """Write rows of (time, value, ...) with the given column names."""
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(columns))
+    values = rows[:, 1:]
+    scaled = np.rint(values * VALUE_SCALE)
+    value_scale = VALUE_SCALE if np.array_equal(scaled / VALUE_SCALE, values) else 1
+    header = json.dumps({
+        "columns": list(columns),
+        "time_scale": TIME_SCALE,
+        "value_scale": value_scale
+    }).encode()
+    index = []
+
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for i in range(0, len(rows), chunk_size):
+            block = rows[i:i + chunk_size]
+            chunk = encode_chunk(block[:, 0], block[:, 1:], value_scale)
+            index.append(INDEX_ENTRY.pack(f.tell(), len(chunk), len(block), block[0, 0], block[-1, 0]))
+            f.write(chunk)
+        index_offset = f.tell()
+        f.write(b"".join(index))
+        f.write(FOOTER.pack(index_offset, len(index), MAGIC))
+
+
+class GtcReader:
+    """Chunk-level random access to a .gtc file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        if self.data[:4] != MAGIC or self.data[-4:] != MAGIC:
+            raise ValueError(f"{path}: not a GTC file")
+
+        (hlen,) = struct.unpack_from("<I", self.data, 4)
+        self.header = json.loads(self.data[8:8 + hlen])
+        self.columns = self.header["columns"]
+        self.value_scale = self.header.get("value_scale", 1)
+
+        index_offset, nchunks, _ = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        entries = [INDEX_ENTRY.unpack_from(self.data, index_offset + i * INDEX_ENTRY.size)
+                   for i in range(nchunks)]
+        self.offsets = [e[0] for e in entries]
+        self.lengths = [e[1] for e in entries]
+        self.counts = np.array([e[2] for e in entries], dtype=np.int64)
+        self.t_first = np.array([e[3] for e in entries])
+        self.t_last = np.array([e[4] for e in entries])
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def read_chunk(self, i):
+        buf = self.data[self.offsets[i]:self.offsets[i] + self.lengths[i]]
+        return decode_chunk(buf, len(self.columns) - 1, value_scale=self.value_scale)
+
+    def read_range(self, t_from=None, t_to=None):
+        """Rows with t_from <= t <= t_to, decoding only the chunks that overlap."""
+        lo = 0 if t_from is None else int(np.searchsorted(self.t_last, t_from, side="left"))
+        hi = len(self.offsets) if t_to is None else int(np.searchsorted(self.t_first, t_to, side="right"))
+        if hi <= lo:
+            return np.empty(0), np.empty((0, len(self.columns) - 1))
+
+        parts = [self.read_chunk(i) for i in range(lo, hi)]
+        times = np.concatenate([p[0] for p in parts])
+        values = np.concatenate([p[1] for p in parts])
+        keep = np.ones(len(times), dtype=bool)
+        if t_from is not None:
+            keep &= times >= t_from
+        if t_to is not None:
+            keep &= times <= t_to
+        return times[keep], values[keep]
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    # Compression / decode speed check on a synthetic 1 h, 10 Hz, 4-channel run
+    n = 36000
+    t = np.round(np.arange(n) / 10.0, 3)
+    levels = np.round(10 + 5 * np.sin(t[:, None] / 60 + np.arange(4)) + np.random.normal(0, 0.05, (n, 4)), 2)
+    rows = np.column_stack([t, levels])
+    path = os.path.join(tempfile.gettempdir(), "bench.gtc")
+
+    start = time.perf_counter()
+    write_file(path, ["Time (s)"] + [f"Tank {i + 1}" for i in range(4)], rows)
+    encode_s = time.perf_counter() - start
+
+    reader = GtcReader(path)
+    start = time.perf_counter()
+    times, values = reader.read_range()
+    decode_s = time.perf_counter() - start
+    assert np.array_equal(times, t) and np.array_equal(values, levels)
+
+    start = time.perf_counter()
+    reader.read_range(1800, 1860)
+    window_s = time.perf_counter() - start
+
+    raw = rows.nbytes
+    size = os.path.getsize(path)
+    print(f"{n} rows: {raw} B raw -> {size} B ({raw / size:.1f}x)")
+    print(f"encode {encode_s * 1e3:.0f} ms, decode all {decode_s * 1e3:.0f} ms, 60 s window {window_s * 1e3:.1f} ms")
@@ -0,0 +1,120 @@
+"""
+Run comparison for the coupled tank app.
+
+Several runs are put on one common time grid with vectorised linear
+interpolation (all channels of a run in one pass) and each one is
+scored against a noise-free simulation of the twin driven by the same
+input: RMSE and the lag of the cross-correlation peak, per channel.
+"""
+import numpy as np
+import tank_model
+
+INITIAL_HEIGHT = 5.0     # same starting level as run_simulation()
+MAX_GRID_POINTS = 20000  # largest common grid a comparison may ask for
+
+
+def median_step(times):
+    return float(np.median(np.diff(times))) if len(times) > 1 else 1.0
+
+
+def common_grid(runs, dt=None):
+    """Grid over the time span every run covers, at the coarsest run's step."""
+    start = max(r["times"][0] for r in runs)
+    end = min(r["times"][-1] for r in runs)
+    if end <= start:
+        raise ValueError("runs do not overlap in time")
+    if dt is not None and not dt > 0:
+        raise ValueError("dt must be positive")
+    dt = dt or max(median_step(r["times"]) for r in runs)
+    points = int(np.floor((end - start) / dt + 1e-9)) + 1
+    if points > MAX_GRID_POINTS:
+        raise ValueError(f"dt {dt:g} s gives {points} grid points over {end - start:g} s "
+                         f"(at most {MAX_GRID_POINTS})")
+    grid = start + dt * np.arange(points)
+    if len(grid) == 0:
+        raise ValueError("empty comparison grid")
+    return grid
+
+
+def interpolate(times, values, grid):
+    """Linear interpolation of (n, channels) values onto grid, all channels at once."""
+    idx = np.clip(np.searchsorted(times, grid, side="right"), 1, len(times) - 1)
+    t0, t1 = times[idx - 1], times[idx]
+    span = np.where(t1 > t0, t1 - t0, 1.0)
+    w = np.clip((grid - t0) / span, 0.0, 1.0)[:, None]
+    return values[idx - 1] * (1 - w) + values[idx] * w
+
+
+def simulate_twin(params, grid, channels):
+    """Noise-free twin response to the run's sine input, sampled on grid.
+
+    Returns None when the run does not record its input (e.g. CSV imports
+    or MPC runs, whose voltage depended on the measured levels).
+    """
+    if params.get("mode") == "mpc":
+        return None
+    try:
+        base = float(params["base_voltage"])
+        freq = float(params["frequency"])
+        amp = float(params["amplitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    network = tank_model.from_config(params.get("network") or {"tanks": channels})
+    dt = min(0.05, median_step(grid))
+    steps = int(np.ceil(grid[-1] / dt)) + 1
+    t = np.arange(steps) * dt
+    voltages = np.clip(base + amp * np.sin(2 * np.pi * freq * t), 0.0, 10.0)
+
+    levels = np.empty((steps, network.n))
+    h = network.initial_state(INITIAL_HEIGHT)
+    for k, v in enumerate(voltages):
+        levels[k] = h
+        h = network.step(h, v, dt)
+    return interpolate(t, levels[:, :channels], grid)
+
+
+def rmse(a, b):
+    return np.sqrt(np.mean((a - b) ** 2, axis=0))
+
+
+def peak_lag(a, b, dt):
+    """Lag (s) of a behind b at the cross-correlation peak, per channel.
+
+    Computed with FFTs over every channel at once; positive means `a` lags.
+    """
+    n = len(a)
+    a = a - a.mean(axis=0)
+    b = b - b.mean(axis=0)
+    size = 1 << int(np.ceil(np.log2(2 * n)))
+    xcorr = np.fft.irfft(np.fft.rfft(a, size, axis=0) * np.conj(np.fft.rfft(b, size, axis=0)), size, axis=0)
+    lags = np.concatenate([np.arange(n), np.arange(-n + 1, 0)])
+    xcorr = np.concatenate([xcorr[:n], xcorr[size - n + 1:]])
+    return lags[np.argmax(xcorr, axis=0)] * dt
+
+
+def compare(runs, dt=None):
+    """Overlay runs and score each against its twin.
+
+    runs: list of dicts with run_id, columns, times (n,), values (n, c), params.
+    """
+    names = [c for c in runs[0]["columns"][1:] if all(c in r["columns"] for r in runs)]
+    if not names:
+        raise ValueError("runs have no channels in common")
+    grid = common_grid(runs, dt)
+    step = float(grid[1] - grid[0]) if len(grid) > 1 else 0.0
+
+    result = {"grid": grid.tolist(), "channels": names, "runs": []}
+    for r in runs:
+        cols = [r["columns"].index(c) - 1 for c in names]
+        series = interpolate(r["times"], r["values"][:, cols], grid)
+        entry = {"run_id": r["run_id"], "series": series.T.tolist(), "twin": None, "rmse": None, "peak_lag": None}
+
+        twin = simulate_twin(r.get("params") or {}, grid, len(r["columns"]) - 1)
+        if twin is not None:
+            twin = twin[:, cols]
+            entry["twin"] = twin.T.tolist()
+            entry["rmse"] = rmse(series, twin).tolist()
+            entry["peak_lag"] = peak_lag(series, twin, step).tolist()
+        result["runs"].append(entry)
+    return result
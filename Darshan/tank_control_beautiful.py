@@ -3,7 +3,6 @@ import numpy as np
 import pandas as pd
 import time
 import threading
-import math
 import cv2
 try:
     from quanser.hardware import HIL
@@ -13,7 +12,16 @@ except ImportError:
     print("[WARNING] Quanser hardware module not found. Running in simulation mode.")
 import webbrowser
 import os
+import sys
+import glob
+import json
 import atexit
+import tank_archive
+import tank_model
+import tank_pipeline
+import tank_compare
+import tank_sweep
+import tank_mpc
 
 # ------------------------------------------------------------
 # Flask Initialization
@@ -21,73 +29,262 @@ import atexit
 app = Flask(__name__)
 CSV_FILE_PATH = "tank_data.csv"
 
+# Default simulated plant, e.g. TANK_NETWORK='{"topology": "cascade", "tanks": 4}'
+TANK_NETWORK = tank_model.from_config(os.getenv("TANK_NETWORK", ""))
+HARDWARE_CHANNELS = ["Tank 1", "Tank 2"]
+
+# Acquisition, storage and chart rates (Hz); each must divide the one before it
+ACQ_RATE = float(os.getenv("ACQ_RATE", 200))
+STORAGE_RATE = float(os.getenv("STORAGE_RATE", 10))
+UI_RATE = float(os.getenv("UI_RATE", 2))
+MAX_RATE = float(os.getenv("MAX_RATE", 1000))   # highest sample_rate /start accepts
+BLOCK_SECONDS = 0.1      # acquisition block length
+REPLAY_BLOCK = 256       # rows per block when replaying at max speed
+SWEEP_RATE = 50.0        # hardware sweep sample rate (Hz)
+
+# Latest Bode sweep result (hardware sweeps fill it in from their thread)
+sweep_result = {"result": None}
+
 # ------------------------------------------------------------
 # Thread-Safe State
 # ------------------------------------------------------------
 state_lock = threading.Lock()
 state = {
     "running": False,
-    "data": []
+    "source": None,      # "sim", "hardware" or "replay"
+    "params": {},
+    "channels": list(TANK_NETWORK.names),
+    "data": [],      # storage-rate rows of (time, level 1, ..., level N)
+    "ui": [],        # the same stream reduced to UI_RATE for the charts
+    "ui_chain": None
 }
 
+def channel_columns(channels):
+    return ["Time (s)"] + [f"{name} Height (cm)" for name in channels]
+
+def begin_run(source, params, channels, storage_rate):
+    """Claim the run slot. Returns False if something is already running."""
+    with state_lock:
+        if state["running"]:
+            return False
+        state["running"] = True
+        state["source"] = source
+        state["params"] = params
+        state["channels"] = list(channels)
+        state["data"] = []
+        state["ui"] = []
+        state["ui_chain"] = tank_pipeline.resampler(storage_rate, UI_RATE, strict=False)
+    return True
+
+def publish_block(t, x):
+    """Single publication path for live, hardware and replayed samples.
+
+    t is (n,) times and x is (n, channels) levels at the storage rate.
+    """
+    if len(t) == 0:
+        return
+    # Round once, so live data and a replay of its archive are identical
+    t = np.round(np.asarray(t, dtype=np.float64), 3)
+    x = np.round(np.asarray(x, dtype=np.float64), 2)
+    with state_lock:
+        state["data"].extend((ti, *xi) for ti, xi in zip(t.tolist(), x.tolist()))
+        append_ui(*state["ui_chain"].process(t, x))
+
+def append_ui(t, x):
+    """Add UI-rate rows, rounded like the storage rows (caller holds state_lock)."""
+    if len(t) == 0:
+        return
+    # The UI filter shifts times by its delay, so round them again
+    state["ui"].extend((ti, *xi) for ti, xi in zip(np.round(t, 3).tolist(), np.round(x, 2).tolist()))
+
+def finish_run(archive=True):
+    with state_lock:
+        append_ui(*state["ui_chain"].flush())
+        rows = list(state["data"])
+        columns = channel_columns(state["channels"])
+        meta = {"source": state["source"], "params": state["params"]}
+    if archive:
+        try:
+            tank_archive.save_run(rows, columns=columns, meta=meta)
+        except OSError as e:
+            print("[ARCHIVE] Could not save run:", e)
+    with state_lock:
+        state["running"] = False
+
 # ------------------------------------------------------------
 # Camera Initialization
 # ------------------------------------------------------------
 CAMERA_INDEX = int(os.getenv("CAMERA_INDEX", 1))
+CAMERA_SOURCE = os.getenv("CAMERA_SOURCE", "auto")   # "auto", "synthetic" or "none"
+CAMERA_CACHE_PATH = os.getenv("CAMERA_CACHE_PATH", "camera_cache.json")
+CAMERA_SEARCH_RANGE = 5
 camera = None
+camera_info = {"source": None, "backend": None, "index": None}
+camera_lock = threading.Lock()
+camera_ready = threading.Event()
+
+class SyntheticCamera:
+    """Fake VideoCapture that draws a moving test pattern (no device needed)."""
+
+    def __init__(self, width=640, height=480, fps=15):
+        self.width = width
+        self.height = height
+        self.period = 1.0 / fps
+        self.frame_count = 0
+        self.opened = True
+        self.last_read = 0.0
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        wait = self.last_read + self.period - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        self.last_read = time.time()
+
+        frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        frame[:, :, 0] = np.linspace(40, 120, self.width, dtype=np.uint8)
+        x = (self.frame_count * 8) % self.width
+        frame[:, x:x + 20] = (255, 255, 255)
+        cv2.putText(frame, f"SYNTHETIC {self.frame_count}", (20, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 0), 2)
+        self.frame_count += 1
+        return True, frame
+
+    def release(self):
+        self.opened = False
+
+# Extra camera sources selectable with CAMERA_SOURCE (name -> factory)
+CAMERA_SOURCES = {
+    "synthetic": SyntheticCamera,
+}
 
-def initialize_camera():
-    """Initialize camera with fallback search."""
-    global camera
-    tried_indices = []
+def camera_backends():
+    """Capture backends worth trying on this platform, best first."""
+    if sys.platform.startswith("win"):
+        return [("DSHOW", cv2.CAP_DSHOW), ("MSMF", cv2.CAP_MSMF)]
+    if sys.platform.startswith("linux"):
+        return [("V4L2", cv2.CAP_V4L2), ("ANY", cv2.CAP_ANY)]
+    if sys.platform == "darwin":
+        return [("AVFOUNDATION", cv2.CAP_AVFOUNDATION), ("ANY", cv2.CAP_ANY)]
+    return [("ANY", cv2.CAP_ANY)]
+
+def camera_candidates():
+    """Device indices to search, skipping ones that obviously don't exist."""
+    if sys.platform.startswith("linux"):
+        found = []
+        for path in glob.glob("/dev/video*"):
+            suffix = path[len("/dev/video"):]
+            if suffix.isdigit():
+                found.append(int(suffix))
+        return sorted(found)
+    return list(range(CAMERA_SEARCH_RANGE))
+
+def load_camera_cache():
+    try:
+        with open(CAMERA_CACHE_PATH) as f:
+            cached = json.load(f)
+        return int(cached["index"]), cached["backend"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
 
-    # 1. DSHOW primary attempt
-    print(f"[Camera] Trying index {CAMERA_INDEX} (DSHOW)")
-    camera = cv2.VideoCapture(CAMERA_INDEX, cv2.CAP_DSHOW)
-    if camera.isOpened():
-        print(f"[Camera] Success at index {CAMERA_INDEX} (DSHOW)")
-        return True
+def save_camera_cache(index, backend):
+    try:
+        with open(CAMERA_CACHE_PATH, "w") as f:
+            json.dump({"index": index, "backend": backend}, f)
+    except OSError as e:
+        print("[Camera] Could not write cache:", e)
 
-    # 2. MSMF fallback
-    print(f"[Camera] Trying index {CAMERA_INDEX} (MSMF)")
-    camera = cv2.VideoCapture(CAMERA_INDEX, cv2.CAP_MSMF)
-    if camera.isOpened():
-        print(f"[Camera] Success at index {CAMERA_INDEX} (MSMF)")
+def set_camera(source, info):
+    """Install a VideoCapture-like object as the active camera."""
+    global camera
+    with camera_lock:
+        old = camera
+        camera = source
+        camera_info.update(info)
+    if old is not None and old is not source:
+        old.release()
+
+def try_open(index, backend_name):
+    backend = dict(camera_backends()).get(backend_name)
+    if backend is None:
+        return None
+    print(f"[Camera] Trying index {index} ({backend_name})")
+    cap = cv2.VideoCapture(index, backend)
+    if cap.isOpened():
+        return cap
+    cap.release()
+    return None
+
+def initialize_camera():
+    """Find a working camera: cached device first, then configured index, then search."""
+    if CAMERA_SOURCE == "none":
+        print("[Camera] Disabled (CAMERA_SOURCE=none)")
+        return False
+
+    if CAMERA_SOURCE in CAMERA_SOURCES:
+        print(f"[Camera] Using {CAMERA_SOURCE} source")
+        set_camera(CAMERA_SOURCES[CAMERA_SOURCE](),
+                   {"source": CAMERA_SOURCE, "backend": None, "index": None})
         return True
 
-    # 3. Fallback search (DSHOW)
-    print("[Camera] Starting fallback search (DSHOW)")
-    for idx in range(5):
-        if idx == CAMERA_INDEX:
+    attempts = []
+    cached = load_camera_cache()
+    if cached:
+        attempts.append(cached)
+    backends = [name for name, _ in camera_backends()]
+    for name in backends:
+        attempts.append((CAMERA_INDEX, name))
+    for name in backends:
+        for idx in camera_candidates():
+            attempts.append((idx, name))
+
+    tried = set()
+    for idx, name in attempts:
+        if (idx, name) in tried:
             continue
-        temp = cv2.VideoCapture(idx, cv2.CAP_DSHOW)
-        if temp.isOpened():
-            print(f"[Camera] Found working camera at index {idx} (DSHOW)")
-            camera = temp
-            return True
-        temp.release()
-
-    # 4. MSMF fallback search
-    print("[Camera] Starting fallback search (MSMF)")
-    for idx in range(5):
-        temp = cv2.VideoCapture(idx, cv2.CAP_MSMF)
-        if temp.isOpened():
-            print(f"[Camera] Found working camera at index {idx} (MSMF)")
-            camera = temp
+        tried.add((idx, name))
+
+        cap = try_open(idx, name)
+        if cap is not None:
+            print(f"[Camera] Success at index {idx} ({name})")
+            set_camera(cap, {"source": "device", "backend": name, "index": idx})
+            save_camera_cache(idx, name)
             return True
-        temp.release()
 
     print("[Camera] ERROR: No camera found")
     return False
 
+def probe_camera():
+    try:
+        initialize_camera()
+    except Exception as e:
+        print("[Camera] Probe failed:", e)
+    finally:
+        camera_ready.set()
+
+def start_camera_probe():
+    """Run camera discovery in the background so the server starts immediately."""
+    camera_ready.clear()
+    threading.Thread(target=probe_camera, daemon=True).start()
+
+def camera_available():
+    with camera_lock:
+        return camera is not None and camera.isOpened()
+
 def release_camera():
     global camera
-    if camera and camera.isOpened():
-        camera.release()
-        print("[Camera] Released")
+    with camera_lock:
+        if camera and camera.isOpened():
+            camera.release()
+            print("[Camera] Released")
+        camera = None
 
 atexit.register(release_camera)
-initialize_camera()
+start_camera_probe()
 
 # ------------------------------------------------------------
 # HTML Template
@@ -174,6 +371,15 @@ HTML_TEMPLATE = """
             background: white;
         }
         
+        select {
+            width: 100%;
+            padding: 14px;
+            border: 2px solid #dee2e6;
+            border-radius: 10px;
+            font-size: 16px;
+            background: white;
+        }
+
         input[type="number"]:focus {
             outline: none;
             border-color: #667eea;
@@ -346,27 +552,45 @@ HTML_TEMPLATE = """
                 <label for="amp">Amplitude (0-5V)</label>
                 <input type="number" id="amp" min="0" max="5" step="0.1" value="2">
             </div>
+            <div class="control-group">
+                <label for="mode">Control Mode</label>
+                <select id="mode">
+                    <option value="sine">Sine Input</option>
+                    <option value="mpc">MPC Level Control</option>
+                </select>
+            </div>
+            <div class="control-group">
+                <label for="setpoint">MPC Setpoint (cm)</label>
+                <input type="number" id="setpoint" min="0" max="29" step="0.5" value="12">
+            </div>
+            <div class="control-group">
+                <label for="replayRun">Replay Run</label>
+                <select id="replayRun"></select>
+            </div>
+            <div class="control-group">
+                <label for="replaySpeed">Replay Speed</label>
+                <select id="replaySpeed">
+                    <option value="1">1x</option>
+                    <option value="10">10x</option>
+                    <option value="max">Max</option>
+                </select>
+            </div>
         </div>
 
         <div class="button-group">
             <button class="btn-start" onclick="startSim()">▶ Start</button>
             <button class="btn-stop" onclick="stopSim()">■ Stop</button>
             <button class="btn-download" onclick="downloadData()">⬇ Download CSV</button>
+            <button class="btn-download" onclick="startReplay()">⏩ Replay</button>
             <button class="btn-mic" id="micBtn" onclick="toggleMic()">🎤 Voice Control</button>
         </div>
 
-        <div class="data-display">
-            <div class="chart-container">
-                <canvas id="tank1Chart"></canvas>
-            </div>
-            <div class="chart-container">
-                <canvas id="tank2Chart"></canvas>
-            </div>
-        </div>
+        <div class="data-display" id="charts"></div>
 
-        {% if camera_available %}
-        <div class="camera-feed">
-            <img src="/video_feed" alt="Live Camera Feed">
+        {% if camera_available or camera_probing %}
+        <div class="camera-feed" id="cameraFeed">
+            <img src="/video_feed" alt="Live Camera Feed"
+                 onerror="document.getElementById('cameraFeed').style.display = 'none'">
         </div>
         {% endif %}
 
@@ -377,62 +601,53 @@ HTML_TEMPLATE = """
         let micActive = false;
         let recognition = null;
 
-        const ctx1 = document.getElementById('tank1Chart').getContext('2d');
-        const ctx2 = document.getElementById('tank2Chart').getContext('2d');
-
-        const tank1Chart = new Chart(ctx1, {
-            type: 'line',
-            data: {
-                labels: [],
-                datasets: [{
-                    label: 'Tank 1 Height (cm)',
-                    data: [],
-                    borderColor: '#10b981',
-                    backgroundColor: 'rgba(16, 185, 129, 0.1)',
-                    tension: 0.4,
-                    fill: true,
-                    borderWidth: 3
-                }]
-            },
-            options: {
-                responsive: true,
-                maintainAspectRatio: false,
-                scales: {
-                    y: { beginAtZero: true, title: { display: true, text: 'Height (cm)' } },
-                    x: { title: { display: true, text: 'Time (s)' } }
-                },
-                plugins: {
-                    title: { display: true, text: 'Tank 1 Water Level', font: { size: 16, weight: 'bold' } }
-                }
-            }
-        });
-
-        const tank2Chart = new Chart(ctx2, {
-            type: 'line',
-            data: {
-                labels: [],
-                datasets: [{
-                    label: 'Tank 2 Height (cm)',
-                    data: [],
-                    borderColor: '#3b82f6',
-                    backgroundColor: 'rgba(59, 130, 246, 0.1)',
-                    tension: 0.4,
-                    fill: true,
-                    borderWidth: 3
-                }]
-            },
-            options: {
-                responsive: true,
-                maintainAspectRatio: false,
-                scales: {
-                    y: { beginAtZero: true, title: { display: true, text: 'Height (cm)' } },
-                    x: { title: { display: true, text: 'Time (s)' } }
-                },
-                plugins: {
-                    title: { display: true, text: 'Tank 2 Water Level', font: { size: 16, weight: 'bold' } }
-                }
-            }
-        });
+        const CHART_COLORS = ['#10b981', '#3b82f6', '#f59e0b', '#ef4444', '#8b5cf6', '#06b6d4'];
+        let tankCharts = [];
+        let chartChannels = '';
+
+        function buildCharts(channels) {
+            tankCharts.forEach(c => c.destroy());
+            tankCharts = [];
+            const container = document.getElementById('charts');
+            container.innerHTML = '';
+
+            channels.forEach((name, i) => {
+                const box = document.createElement('div');
+                box.className = 'chart-container';
+                const canvas = document.createElement('canvas');
+                box.appendChild(canvas);
+                container.appendChild(box);
+
+                const color = CHART_COLORS[i % CHART_COLORS.length];
+                tankCharts.push(new Chart(canvas.getContext('2d'), {
+                    type: 'line',
+                    data: {
+                        labels: [],
+                        datasets: [{
+                            label: `${name} Height (cm)`,
+                            data: [],
+                            borderColor: color,
+                            backgroundColor: color + '1a',
+                            tension: 0.4,
+                            fill: true,
+                            borderWidth: 3
+                        }]
+                    },
+                    options: {
+                        responsive: true,
+                        maintainAspectRatio: false,
+                        scales: {
+                            y: { beginAtZero: true, title: { display: true, text: 'Height (cm)' } },
+                            x: { title: { display: true, text: 'Time (s)' } }
+                        },
+                        plugins: {
+                            title: { display: true, text: `${name} Water Level`, font: { size: 16, weight: 'bold' } }
+                        }
+                    }
+                }));
+            });
+            chartChannels = channels.join('|');
+        }
 
         function toggleMic() {
             micActive = !micActive;
@@ -517,7 +732,9 @@ HTML_TEMPLATE = """
             const params = {
                 base_voltage: parseFloat(document.getElementById('base').value),
                 frequency: parseFloat(document.getElementById('freq').value),
-                amplitude: parseFloat(document.getElementById('amp').value)
+                amplitude: parseFloat(document.getElementById('amp').value),
+                mode: document.getElementById('mode').value,
+                setpoint: parseFloat(document.getElementById('setpoint').value)
             };
 
             fetch('/start', {
@@ -541,28 +758,55 @@ HTML_TEMPLATE = """
             window.location.href = '/download';
         }
 
+        function loadRuns() {
+            fetch('/runs')
+                .then(r => r.json())
+                .then(runs => {
+                    const select = document.getElementById('replayRun');
+                    select.innerHTML = '';
+                    runs.forEach(run => {
+                        const opt = document.createElement('option');
+                        opt.value = run.run_id;
+                        opt.textContent = `${run.run_id} (${run.source}, ${run.samples} samples)`;
+                        select.appendChild(opt);
+                    });
+                })
+                .catch(err => console.error(err));
+        }
+
+        function startReplay() {
+            const source = document.getElementById('replayRun').value;
+            if (!source) return;
+
+            fetch('/replay', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ source: source, speed: document.getElementById('replaySpeed').value })
+            })
+            .then(r => r.text())
+            .then(msg => console.log(msg))
+            .catch(err => console.error(err));
+        }
+
         function updateCharts() {
             fetch('/data')
                 .then(r => r.json())
                 .then(resp => {
+                    if (resp.channels.join('|') !== chartChannels) buildCharts(resp.channels);
                     if (resp.data.length === 0) return;
 
                     const times = resp.data.map(d => d[0]);
-                    const tank1 = resp.data.map(d => d[1]);
-                    const tank2 = resp.data.map(d => d[2]);
-
-                    tank1Chart.data.labels = times;
-                    tank1Chart.data.datasets[0].data = tank1;
-                    tank1Chart.update('none');
-
-                    tank2Chart.data.labels = times;
-                    tank2Chart.data.datasets[0].data = tank2;
-                    tank2Chart.update('none');
+                    tankCharts.forEach((chart, i) => {
+                        chart.data.labels = times;
+                        chart.data.datasets[0].data = resp.data.map(d => d[i + 1]);
+                        chart.update('none');
+                    });
                 })
                 .catch(err => console.error(err));
         }
 
         setInterval(updateCharts, 500);
+        loadRuns();
     </script>
 </body>
 </html>
@@ -575,7 +819,8 @@ HTML_TEMPLATE = """
 def index():
     return render_template_string(
         HTML_TEMPLATE,
-        camera_available=camera is not None and camera.isOpened()
+        camera_available=camera_available(),
+        camera_probing=not camera_ready.is_set()
     )
 
 @app.route("/start", methods=["POST"])
@@ -590,15 +835,56 @@ def start_sim():
     except:
         return "Invalid parameters", 400
 
-    with state_lock:
-        if state["running"]:
-            return "Already running", 400
-        state["running"] = True
-        state["data"] = []
+    try:
+        rates = {
+            "sample_rate": float(params.get("sample_rate", ACQ_RATE)),
+            "storage_rate": float(params.get("storage_rate", STORAGE_RATE)),
+        }
+        if not 0 < rates["storage_rate"] <= rates["sample_rate"] <= MAX_RATE:
+            return f"Invalid rates: need 0 < storage_rate <= sample_rate <= {MAX_RATE:g}", 400
+        tank_pipeline.resampler(rates["sample_rate"], rates["storage_rate"])
+        tank_pipeline.resampler(rates["storage_rate"], UI_RATE)
+    except (TypeError, ValueError) as e:
+        return f"Invalid rates: {e}", 400
+
+    network = TANK_NETWORK
+    if params.get("network"):
+        try:
+            network = tank_model.from_config(params["network"])
+        except (TypeError, ValueError) as e:
+            return f"Invalid network: {e}", 400
+    if QUANSER_AVAILABLE:
+        network = tank_model.cascade(len(HARDWARE_CHANNELS))
+
+    mode = params.get("mode", "sine")
+    controller = None
+    if mode == "mpc":
+        try:
+            setpoint = float(params["setpoint"])
+            target = int(params.get("target_tank", network.n))
+            mpc = tank_mpc.RolloutMPC(network, target=target - 1)
+            if not (0 < setpoint < mpc.limit and 1 <= target <= network.n):
+                return "Invalid setpoint or target tank", 400
+        except (KeyError, TypeError, ValueError):
+            return "Invalid MPC parameters", 400
+        controller = tank_mpc.LevelController(mpc, setpoint)
+    elif mode != "sine":
+        return "Invalid mode", 400
+
+    params = {"base_voltage": base, "frequency": freq, "amplitude": amp, "mode": mode, **rates}
+    if controller:
+        params.update({"setpoint": setpoint, "target_tank": target})
+    if QUANSER_AVAILABLE:
+        started = begin_run("hardware", params, HARDWARE_CHANNELS, rates["storage_rate"])
+    else:
+        params["network"] = network.describe()
+        started = begin_run("sim", params, network.names, rates["storage_rate"])
+    if not started:
+        return "Already running", 400
 
     threading.Thread(
         target=run_simulation,
-        args=(base, freq, amp),
+        args=(base, freq, amp, network, rates, controller),
         daemon=True
     ).start()
 
@@ -610,15 +896,155 @@ def stop_sim():
         state["running"] = False
     return "Stopped", 200
 
+@app.route("/replay", methods=["POST"])
+def start_replay():
+    params = request.get_json() or {}
+    source = str(params.get("source", ""))
+    speed = params.get("speed", 1)
+    try:
+        speed = 0.0 if speed == "max" else float(speed)
+        if speed < 0:
+            return "Invalid speed", 400
+    except (TypeError, ValueError):
+        return "Invalid speed", 400
+
+    try:
+        columns, rows, meta = tank_archive.load_run(source)
+    except (FileNotFoundError, ValueError) as e:
+        return str(e), 404
+
+    channels = [c.replace(" Height (cm)", "") for c in columns[1:]]
+    storage_rate = recorded_rate(rows)
+    params = {"replay_of": meta.get("run_id"), "speed": speed, "storage_rate": storage_rate}
+    if not begin_run("replay", params, channels, storage_rate):
+        return "Already running", 400
+
+    threading.Thread(
+        target=run_replay,
+        args=(rows, speed),
+        daemon=True
+    ).start()
+
+    return "Replaying", 200
+
+@app.route("/runs")
+def runs():
+    return jsonify(tank_archive.list_runs())
+
+@app.route("/runs/<run_id>/data")
+def run_data(run_id):
+    try:
+        t_from = request.args.get("from", type=float)
+        t_to = request.args.get("to", type=float)
+        columns, times, values = tank_archive.load_range(run_id, t_from, t_to)
+    except FileNotFoundError:
+        return "Unknown run", 404
+    rows = [(t, *v) for t, v in zip(times.tolist(), values.tolist())]
+    return jsonify({"run_id": run_id, "columns": columns, "data": rows})
+
+@app.route("/compare")
+def compare_runs():
+    """Overlay runs (archived IDs or "live") with twin RMSE and peak lag."""
+    run_ids = [r for r in request.args.get("runs", "").split(",") if r]
+    if not run_ids:
+        return "No runs given", 400
+
+    runs = []
+    for run_id in run_ids:
+        if run_id == "live":
+            with state_lock:
+                columns = channel_columns(state["channels"])
+                rows = np.array(state["data"], dtype=np.float64).reshape(-1, len(columns))
+                params = dict(state["params"])
+            times, values = rows[:, 0], rows[:, 1:]
+        else:
+            try:
+                columns, times, values = tank_archive.load_range(run_id)
+            except FileNotFoundError:
+                return f"Unknown run '{run_id}'", 404
+            params = tank_archive.load_meta(run_id).get("params", {})
+        if len(times) < 2:
+            return f"Run '{run_id}' has too few samples", 400
+        runs.append({"run_id": run_id, "columns": columns, "times": times, "values": values, "params": params})
+
+    try:
+        return jsonify(tank_compare.compare(runs, dt=request.args.get("dt", type=float)))
+    except ValueError as e:
+        return str(e), 400
+
+@app.route("/sweep", methods=["POST"])
+def start_sweep():
+    """Bode sweep. Simulated sweeps answer directly, hardware sweeps run in the background."""
+    params = request.get_json() or {}
+    try:
+        mode = params.get("mode", "stepped")
+        target = params.get("target", "hardware" if QUANSER_AVAILABLE else "sim")
+        base = float(params.get("base_voltage", 5.0))
+        amp = float(params.get("amplitude", 0.5))
+        f_min = float(params.get("f_min", 0.001))
+        f_max = float(params.get("f_max", 0.5))
+        points = int(params.get("points", 20))
+        cycles = int(params.get("cycles", tank_sweep.CYCLES))
+        if not (0 <= base <= 10 and 0 < amp <= 5 and f_max <= 10 and 2 <= points <= 200
+                and 1 <= cycles <= tank_sweep.MAX_CYCLES):
+            return "Invalid parameter range", 400
+        # Only once points is known to be small
+        freqs = tank_sweep.frequencies(f_min, f_max, points)
+        if mode not in ("stepped", "chirp") or target not in ("sim", "hardware"):
+            return "Invalid mode or target", 400
+        # Simulated sweeps run inside the request: refuse ones that would take minutes
+        if target == "sim" and tank_sweep.sim_steps(mode, f_min, f_max, cycles) > tank_sweep.MAX_SIM_STEPS:
+            return (f"Sweep too long to simulate: raise f_min, lower f_max or use fewer cycles "
+                    f"(limit {tank_sweep.MAX_SIM_STEPS} model steps)"), 400
+        network = tank_model.from_config(params["network"]) if params.get("network") else TANK_NETWORK
+    except (TypeError, ValueError) as e:
+        return f"Invalid parameters: {e}", 400
+
+    if target == "sim":
+        if mode == "chirp":
+            return jsonify(tank_sweep.chirp_sim(network, f_min, f_max, points, base, amp))
+        return jsonify(tank_sweep.stepped_sine_sim(network, freqs, base, amp, cycles=cycles))
+
+    if not QUANSER_AVAILABLE:
+        return "Hardware not available", 400
+    if mode != "stepped":
+        return "Hardware sweeps are stepped sine only", 400
+
+    sweep_params = {"sweep": mode, "base_voltage": base, "amplitude": amp,
+                    "f_min": f_min, "f_max": f_max, "points": points}
+    if not begin_run("sweep", sweep_params, HARDWARE_CHANNELS, STORAGE_RATE):
+        return "Already running", 400
+    sweep_result["result"] = None
+
+    threading.Thread(
+        target=run_hardware_sweep,
+        args=(freqs, base, amp, cycles),
+        daemon=True
+    ).start()
+
+    return "Sweep started", 200
+
+@app.route("/sweep")
+def sweep_status():
+    with state_lock:
+        running = state["running"] and state["source"] == "sweep"
+    return jsonify({"running": running, "result": sweep_result["result"]})
+
 @app.route("/data")
 def data():
     with state_lock:
-        return jsonify({"running": state["running"], "data": state["data"]})
+        return jsonify({
+            "running": state["running"],
+            "source": state["source"],
+            "channels": state["channels"],
+            "samples": len(state["data"]),
+            "data": state["ui"]
+        })
 
 @app.route("/download")
 def download():
     with state_lock:
-        df = pd.DataFrame(state["data"], columns=["Time (s)", "Tank 1 Height (cm)", "Tank 2 Height (cm)"])
+        df = pd.DataFrame(state["data"], columns=channel_columns(state["channels"]))
 
     if df.empty:
         return "No data", 400
@@ -627,9 +1053,20 @@ def download():
     df.to_csv(CSV_FILE_PATH, index_label="Sample")
     return send_file(CSV_FILE_PATH, as_attachment=True)
 
+@app.route("/camera")
+def camera_status():
+    return jsonify({
+        "ready": camera_ready.is_set(),
+        "available": camera_available(),
+        **camera_info
+    })
+
 @app.route("/video_feed")
 def video_feed():
-    if not camera or not camera.isOpened():
+    # A page loaded while the probe is still running waits for it here,
+    # not at server startup
+    camera_ready.wait(timeout=10)
+    if not camera_available():
         return Response("Camera not available", status=503)
     return Response(gen_frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
@@ -638,13 +1075,12 @@ def video_feed():
 # ------------------------------------------------------------
 def gen_frames():
     """Stream MJPEG video frames safely."""
-    global camera
     while True:
-        if not camera or not camera.isOpened():
-            print("[Camera] Lost connection")
-            break
-
-        ok, frame = camera.read()
+        with camera_lock:
+            if not camera or not camera.isOpened():
+                print("[Camera] Lost connection")
+                break
+            ok, frame = camera.read()
         if not ok:
             print("[Camera] Frame read failed")
             time.sleep(0.2)
@@ -662,52 +1098,66 @@ def gen_frames():
 # ------------------------------------------------------------
 # SIMULATION THREAD
 # ------------------------------------------------------------
-def run_simulation(base, freq, amp):
+def acquire(read_block, duration, sample_rate, storage_rate):
+    """Acquire blocks at sample_rate and publish them reduced to storage_rate.
+
+    read_block(t, start) returns the (len(t), channels) levels for sample
+    times t (seconds from `start`, a perf_counter value).
+    """
+    chain = tank_pipeline.resampler(sample_rate, storage_rate)
+    total = int(round(duration * sample_rate))
+    block = max(1, int(round(sample_rate * BLOCK_SECONDS)))
+    start = time.perf_counter()
+
+    for i0 in range(0, total, block):
+        with state_lock:
+            if not state["running"]:
+                break
+
+        t = np.arange(i0, min(i0 + block, total)) / sample_rate
+        wait = start + t[0] - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+
+        publish_block(*chain.process(t, read_block(t, start)))
+    publish_block(*chain.flush())
+
+def input_voltages(t, base, freq, amp):
+    return base + amp * np.sin(2 * np.pi * freq * t)
+
+def run_simulation(base, freq, amp, network=TANK_NETWORK, rates=None, controller=None):
+    """Sine input by default; with an MPC controller the voltage follows the levels."""
 
     duration = 30
-    dt = 1
     slope = 9.8
     offset = 0
+    rates = rates or {"sample_rate": ACQ_RATE, "storage_rate": STORAGE_RATE}
+    sample_rate = rates["sample_rate"]
 
     if not QUANSER_AVAILABLE:
         # Simulation mode - generate mock data
-        print("[SIM] Running in simulation mode (no hardware)")
-        t1_height = 5.0  # Initial height for tank 1
-        t2_height = 5.0  # Initial height for tank 2
-        
+        print(f"[SIM] Running in simulation mode (no hardware), {network.n}-tank {network.topology}")
+        heights = network.initial_state(5.0)  # Initial height for every tank
+
+        def read_block(t, start):
+            nonlocal heights
+            voltages = np.clip(input_voltages(t, base, freq, amp), 0.0, 10.0)
+            levels = np.empty((len(t), network.n))
+            for k, voltage in enumerate(voltages):
+                if controller:
+                    voltage = controller.voltage(t[k], heights)
+                # Advance every tank level in one array update
+                heights = network.step(heights, voltage, dt)
+                levels[k] = heights
+
+            # Add some sensor noise for realism
+            return np.clip(levels + np.random.normal(0, 0.1, levels.shape), 0, network.max_height)
+
         try:
-            for i in range(int(duration / dt)):
-                with state_lock:
-                    if not state["running"]:
-                        break
-
-                t = i * dt
-                voltage = base + amp * math.sin(2 * math.pi * freq * t)
-                
-                # Simulate tank dynamics based on voltage input
-                # Tank 1 responds to input voltage
-                t1_target = (voltage / 10.0) * 20.0  # Scale to 0-20 cm
-                t1_height = t1_height + 0.3 * (t1_target - t1_height)  # First order response
-                
-                # Tank 2 responds to tank 1 (coupled system)
-                t2_target = t1_height * 0.8  # Coupling factor
-                t2_height = t2_height + 0.2 * (t2_target - t2_height)
-                
-                # Add some noise for realism
-                t1_height += np.random.normal(0, 0.1)
-                t2_height += np.random.normal(0, 0.1)
-                
-                # Clamp values to reasonable range
-                t1_height = max(0, min(20, t1_height))
-                t2_height = max(0, min(20, t2_height))
-
-                with state_lock:
-                    state["data"].append((round(t,1), round(t1_height,2), round(t2_height,2)))
-
-                time.sleep(dt)
+            dt = 1.0 / sample_rate
+            acquire(read_block, duration, sample_rate, rates["storage_rate"])
         finally:
-            with state_lock:
-                state["running"] = False
+            finish_run()
         return
 
     # Hardware mode
@@ -717,45 +1167,124 @@ def run_simulation(base, freq, amp):
         card.open("q2_usb", "0")
     except Exception as e:
         print("[HIL] Error opening:", e)
-        with state_lock:
-            state["running"] = False
+        finish_run(archive=False)
         return
 
     output_ch = np.array([0], dtype=np.uint32)
-    input_ch = np.array([0, 1], dtype=np.uint32)
+    input_ch = np.arange(len(HARDWARE_CHANNELS), dtype=np.uint32)
+    buffer = np.zeros(len(input_ch), dtype=np.float64)
+    last = np.zeros(len(input_ch), dtype=np.float64)
+
+    def read_block(t, start):
+        nonlocal last
+        voltages = input_voltages(t, base, freq, amp)
+        levels = np.empty((len(t), len(input_ch)))
+        for k, voltage in enumerate(voltages):
+            wait = start + t[k] - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            if controller:
+                voltage = controller.voltage(t[k], last)
+            try:
+                card.write_analog(output_ch, 1, np.array([voltage], dtype=np.float64))
+                card.read_analog(input_ch, len(input_ch), buffer)
+                last = slope * buffer + offset
+            except Exception as e:
+                print("[HIL] Step error:", e)
+            levels[k] = last
+        return levels
 
     try:
-        for i in range(int(duration / dt)):
-            with state_lock:
-                if not state["running"]:
-                    break
-
-            t = i * dt
-            voltage = base + amp * math.sin(2 * math.pi * freq * t)
+        acquire(read_block, duration, sample_rate, rates["storage_rate"])
+        card.write_analog(output_ch, 1, np.array([0.0], dtype=np.float64))
 
-            try:
-                card.write_analog(output_ch, 1, np.array([voltage], dtype=np.float64))
+    finally:
+        card.close()
+        finish_run()
 
-                buffer = np.zeros(2, dtype=np.float64)
-                card.read_analog(input_ch, 2, buffer)
+# ------------------------------------------------------------
+# HARDWARE SWEEP THREAD
+# ------------------------------------------------------------
+def run_hardware_sweep(freqs, base, amp, cycles):
+    slope = 9.8
+    offset = 0
+    card = HIL()
 
-                t1 = slope * buffer[0] + offset
-                t2 = slope * buffer[1] + offset
+    try:
+        card.open("q2_usb", "0")
+    except Exception as e:
+        print("[HIL] Error opening:", e)
+        finish_run(archive=False)
+        return
 
-                with state_lock:
-                    state["data"].append((round(t,1), round(t1,2), round(t2,2)))
+    output_ch = np.array([0], dtype=np.uint32)
+    input_ch = np.arange(len(HARDWARE_CHANNELS), dtype=np.uint32)
+    buffer = np.zeros(len(input_ch), dtype=np.float64)
+    chain = tank_pipeline.resampler(SWEEP_RATE, STORAGE_RATE, strict=False)
 
-            except Exception as e:
-                print("[HIL] Step error:", e)
+    def write_voltage(v):
+        card.write_analog(output_ch, 1, np.array([v], dtype=np.float64))
 
-            time.sleep(dt)
+    def read_levels():
+        card.read_analog(input_ch, len(input_ch), buffer)
+        return slope * buffer + offset
 
-        card.write_analog(output_ch, 1, np.array([0.0], dtype=np.float64))
+    def should_stop():
+        with state_lock:
+            return not state["running"]
 
+    try:
+        print(f"[SWEEP] {len(freqs)} frequencies on hardware, back to back")
+        sweep_result["result"] = tank_sweep.stepped_sine_hardware(
+            write_voltage, read_levels, HARDWARE_CHANNELS, freqs, base, amp, SWEEP_RATE,
+            cycles=cycles, should_stop=should_stop,
+            on_block=lambda t, y: publish_block(*chain.process(t, y))
+        )
+        publish_block(*chain.flush())
+        write_voltage(0.0)
+    except Exception as e:
+        print("[SWEEP] Error:", e)
     finally:
         card.close()
-        with state_lock:
-            state["running"] = False
+        finish_run()
+
+# ------------------------------------------------------------
+# REPLAY THREAD
+# ------------------------------------------------------------
+def recorded_rate(rows):
+    """Sample rate of a recorded run, from its median time step."""
+    if len(rows) < 2:
+        return STORAGE_RATE
+    step = float(np.median(np.diff([r[0] for r in rows])))
+    return 1.0 / step if step > 0 else STORAGE_RATE
+
+def run_replay(rows, speed):
+    """Feed recorded rows through publish_block at `speed`x (0 = as fast as possible)."""
+    print(f"[REPLAY] {len(rows)} samples at {'max speed' if speed == 0 else f'{speed}x'}")
+    times = np.array([r[0] for r in rows], dtype=np.float64)
+    values = np.array([r[1:] for r in rows], dtype=np.float64)
+    start = time.perf_counter()
+    pos = 0
+
+    try:
+        while pos < len(rows):
+            with state_lock:
+                if not state["running"]:
+                    break
+
+            if speed > 0:
+                wait = (times[pos] - times[0]) / speed - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(wait)
+                clock = times[0] + (time.perf_counter() - start) * speed
+                end = max(pos + 1, int(np.searchsorted(times, clock, side="right")))
+            else:
+                end = pos + REPLAY_BLOCK
+
+            publish_block(times[pos:end], values[pos:end])
+            pos = end
+    finally:
+        finish_run(archive=False)
 
 # ------------------------------------------------------------
 # AUTO OPEN BROWSER
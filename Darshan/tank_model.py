@@ -0,0 +1,143 @@
+"""
+N-tank network model for the coupled tank twin.
+
+Levels are held in a NumPy array and every tank is updated in one array
+operation. Leading batch dimensions are allowed, so the same model can
+step one plant (shape (N,)) or many candidate plants at once (shape
+(B, N)) for sweeps and rollouts.
+
+Flows follow Torricelli's law with Quanser coupled-tank default
+parameters (cm, s, V).
+"""
+import json
+import math
+import numpy as np
+
+G = 981.0                # gravity (cm/s^2)
+TANK_AREA = 15.52        # tank cross-section (cm^2)
+OUTLET_AREA = 0.178      # outlet orifice area (cm^2)
+PUMP_GAIN = 3.3          # pump flow constant (cm^3/s/V)
+MAX_HEIGHT = 30.0        # tank overflow height (cm)
+
+
+class TankNetwork:
+    """Tanks connected by a connectivity matrix.
+
+    connectivity[i, j] is the fraction of tank j's outflow that drains into
+    tank i; whatever a column does not route goes back to the reservoir.
+    pump[i] is the fraction of the pump flow delivered to tank i.
+    """
+
+    def __init__(self, connectivity, pump, area=TANK_AREA, outlet=OUTLET_AREA,
+                 pump_gain=PUMP_GAIN, max_height=MAX_HEIGHT, topology="custom"):
+        self.connectivity = np.asarray(connectivity, dtype=np.float64)
+        n = self.connectivity.shape[0]
+        if self.connectivity.shape != (n, n):
+            raise ValueError("connectivity must be a square matrix")
+        if np.any(self.connectivity < 0) or np.any(self.connectivity.sum(axis=0) > 1 + 1e-9):
+            raise ValueError("connectivity columns must be non-negative fractions summing to <= 1")
+
+        self.n = n
+        self.topology = topology
+        self.pump = np.broadcast_to(np.asarray(pump, dtype=np.float64), (n,)).copy()
+        self.area = np.broadcast_to(np.asarray(area, dtype=np.float64), (n,)).copy()
+        self.outlet = np.broadcast_to(np.asarray(outlet, dtype=np.float64), (n,)).copy()
+        self.pump_gain = float(pump_gain)
+        self.max_height = float(max_height)
+
+    @property
+    def names(self):
+        return [f"Tank {i + 1}" for i in range(self.n)]
+
+    def initial_state(self, height=0.0, batch=None):
+        shape = (self.n,) if batch is None else (batch, self.n)
+        return np.full(shape, float(height))
+
+    def outflow(self, h):
+        return self.outlet * np.sqrt(2 * G * np.maximum(h, 0.0))
+
+    def derivative(self, h, voltage):
+        """dh/dt for levels h (..., N) and pump voltage(s) broadcastable to h[..., 0]."""
+        q_out = self.outflow(h)
+        q_in = (np.asarray(voltage, dtype=np.float64)[..., None] * self.pump_gain) * self.pump
+        q_in = q_in + q_out @ self.connectivity.T
+        return (q_in - q_out) / self.area
+
+    def step(self, h, voltage, dt, max_dt=0.05):
+        """Advance levels by dt seconds (explicit Euler, sub-stepped)."""
+        substeps = max(1, math.ceil(dt / max_dt))
+        h_dt = dt / substeps
+        for _ in range(substeps):
+            h = np.clip(h + h_dt * self.derivative(h, voltage), 0.0, self.max_height)
+        return h
+
+    def describe(self):
+        return {
+            "topology": self.topology,
+            "tanks": self.n,
+            "connectivity": self.connectivity.tolist(),
+            "pump": self.pump.tolist(),
+        }
+
+
+# ------------------------------------------------------------
+# Topologies
+# ------------------------------------------------------------
+def cascade(n=2, **kwargs):
+    """Pump feeds tank 1, each tank drains into the next one."""
+    c = np.zeros((n, n))
+    c[np.arange(1, n), np.arange(n - 1)] = 1.0
+    pump = np.zeros(n)
+    pump[0] = 1.0
+    return TankNetwork(c, pump, topology="cascade", **kwargs)
+
+
+def parallel(n=2, **kwargs):
+    """Pump flow split evenly, every tank drains to the reservoir."""
+    return TankNetwork(np.zeros((n, n)), np.full(n, 1.0 / n), topology="parallel", **kwargs)
+
+
+def cross_coupled(n=3, coupling=0.3, **kwargs):
+    """Cascade where a share of each outflow bypasses the next tank."""
+    if not 0 <= coupling <= 1:
+        raise ValueError("coupling must be between 0 and 1")
+    c = np.zeros((n, n))
+    for j in range(n - 1):
+        if j + 2 < n:
+            c[j + 1, j] = 1.0 - coupling
+            c[j + 2, j] = coupling
+        else:
+            c[j + 1, j] = 1.0
+    pump = np.zeros(n)
+    pump[0] = 1.0
+    return TankNetwork(c, pump, topology="cross_coupled", **kwargs)
+
+
+TOPOLOGIES = {
+    "cascade": cascade,
+    "parallel": parallel,
+    "cross_coupled": cross_coupled,
+}
+
+
+def from_config(spec):
+    """Build a network from a dict (or JSON string).
+
+    Either {"topology": "cascade", "tanks": 3, ...} or an explicit
+    {"connectivity": [[...]], "pump": [...]}.
+    """
+    if isinstance(spec, str):
+        spec = json.loads(spec) if spec.strip() else {}
+    spec = dict(spec or {})
+
+    if "connectivity" in spec:
+        spec.pop("tanks", None)      # implied by the matrix (present in describe() output)
+        return TankNetwork(spec.pop("connectivity"), spec.pop("pump", 1.0), **spec)
+
+    topology = spec.pop("topology", "cascade")
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology '{topology}'")
+    n = int(spec.pop("tanks", 2))
+    if n < 1:
+        raise ValueError("tanks must be >= 1")
+    return TOPOLOGIES[topology](n, **spec)
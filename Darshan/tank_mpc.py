@@ -0,0 +1,140 @@
+"""
+Sampling-based model-predictive level control for the coupled tank twin.
+
+Each control step draws a batch of candidate pump-voltage sequences,
+rolls all of them through the TankNetwork model at once (state shape
+(candidates, tanks)), scores them, and applies the first voltage of the
+cheapest one. Sequences use move blocking (a few held levels over the
+horizon) and are warm-started from the previous step's best plan.
+
+Constraints: voltages are clipped to the 0-10 V pump range, and any
+candidate whose predicted level gets within `overflow_margin` of the
+tank top is treated as infeasible.
+
+Run `python tank_mpc.py` for a timing benchmark against the control period.
+"""
+import time
+import numpy as np
+
+U_MIN = 0.0
+U_MAX = 10.0
+INFEASIBLE = 1e9
+
+
+class RolloutMPC:
+    def __init__(self, network, target=-1, horizon=30, control_dt=1.0, candidates=256,
+                 blocks=5, du_weight=0.05, overflow_margin=1.0, sigma=1.5,
+                 rollout_dt=0.25, seed=None):
+        if horizon % blocks:
+            raise ValueError("horizon must be a multiple of blocks")
+        self.network = network
+        self.target = target
+        self.horizon = horizon
+        self.control_dt = control_dt
+        self.candidates = candidates
+        self.blocks = blocks
+        self.du_weight = du_weight
+        self.limit = network.max_height - overflow_margin
+        self.sigma = sigma
+        self.rollout_dt = rollout_dt
+        self.rng = np.random.default_rng(seed)
+        self.plan = None            # best block levels from the previous step
+
+    # ------------------------------------------------------------
+    # Batch rollout engine
+    # ------------------------------------------------------------
+    def rollout(self, h0, sequences):
+        """Levels (K, horizon, N) for K voltage sequences (K, horizon) from levels h0 (N,)."""
+        k = len(sequences)
+        h = np.broadcast_to(h0, (k, self.network.n)).astype(np.float64)
+        levels = np.empty((k, self.horizon, self.network.n))
+        for i in range(self.horizon):
+            h = self.network.step(h, sequences[:, i], self.control_dt, max_dt=self.rollout_dt)
+            levels[:, i] = h
+        return levels
+
+    def sample(self, u_prev):
+        """Candidate block levels (K, blocks): warm start, constants and perturbations."""
+        if self.plan is None:
+            self.plan = np.full(self.blocks, u_prev)
+        warm = np.append(self.plan[1:], self.plan[-1])
+
+        fixed = np.array([warm, np.full(self.blocks, u_prev),
+                          np.full(self.blocks, U_MIN), np.full(self.blocks, U_MAX)])
+        n_rand = max(0, self.candidates - len(fixed))
+        n_uniform = n_rand // 4
+        noisy = warm + self.rng.normal(0.0, self.sigma, (n_rand - n_uniform, self.blocks))
+        uniform = self.rng.uniform(U_MIN, U_MAX, (n_uniform, self.blocks))
+        return np.clip(np.vstack([fixed, noisy, uniform]), U_MIN, U_MAX)
+
+    def cost(self, levels, sequences, setpoint, u_prev):
+        err = levels[:, :, self.target] - setpoint
+        du = np.diff(sequences, axis=1, prepend=u_prev)
+        cost = np.mean(err ** 2, axis=1) + self.du_weight * np.sum(du ** 2, axis=1)
+        overflow = np.any(levels >= self.limit, axis=(1, 2))
+        return np.where(overflow, INFEASIBLE + cost, cost), ~overflow
+
+    def solve(self, h0, setpoint, u_prev):
+        """Best voltage to apply now. Returns (voltage, info)."""
+        started = time.perf_counter()
+        blocks = self.sample(u_prev)
+        sequences = np.repeat(blocks, self.horizon // self.blocks, axis=1)
+
+        levels = self.rollout(np.asarray(h0, dtype=np.float64), sequences)
+        cost, feasible = self.cost(levels, sequences, setpoint, u_prev)
+        best = int(np.argmin(cost))
+        self.plan = blocks[best]
+
+        return float(sequences[best, 0]), {
+            "cost": float(cost[best]),
+            "feasible": bool(feasible[best]),
+            "solve_ms": (time.perf_counter() - started) * 1e3,
+        }
+
+
+class LevelController:
+    """Applies the MPC voltage and holds it between control updates."""
+
+    def __init__(self, mpc, setpoint):
+        self.mpc = mpc
+        self.setpoint = setpoint
+        self.u = 0.0
+        self.next_update = 0.0
+        self.last_info = None
+
+    def voltage(self, t, levels):
+        if t >= self.next_update:
+            self.u, self.last_info = self.mpc.solve(levels, self.setpoint, self.u)
+            self.next_update += self.mpc.control_dt
+        return self.u
+
+
+def benchmark(network, candidates=(64, 256, 1024, 4096), repeats=20, **kwargs):
+    """Mean / worst solve time per batch size, against the control period."""
+    rows = []
+    for k in candidates:
+        mpc = RolloutMPC(network, candidates=k, seed=0, **kwargs)
+        h = network.initial_state(5.0)
+        times = []
+        u = 5.0
+        for _ in range(repeats):
+            u, info = mpc.solve(h, 12.0, u)
+            times.append(info["solve_ms"])
+            h = network.step(h, u, mpc.control_dt)
+        rows.append({
+            "candidates": k,
+            "mean_ms": float(np.mean(times)),
+            "max_ms": float(np.max(times)),
+            "fits_period": bool(np.max(times) < mpc.control_dt * 1e3),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    import tank_model
+
+    for net in (tank_model.cascade(2), tank_model.cascade(4)):
+        print(f"[MPC] {net.n}-tank {net.topology}, horizon 30 x 1.0 s")
+        for row in benchmark(net):
+            print(f"  {row['candidates']:5d} candidates: mean {row['mean_ms']:7.2f} ms, "
+                  f"max {row['max_ms']:7.2f} ms, fits 1 s period: {row['fits_period']}")
@@ -0,0 +1,125 @@
+"""
+Multi-rate sample pipeline for the coupled tank app.
+
+Samples are acquired fast and pushed through a chain of streaming stages
+that each take and return NumPy blocks: times with shape (n,) and values
+with shape (n, channels). Stages keep their own state between blocks, so
+block boundaries never show up in the output. At the end of a run,
+flush() emits what the stages still hold back.
+
+    acquire (e.g. 200 Hz) -> low-pass -> decimate -> storage (e.g. 10 Hz)
+    storage               -> low-pass -> decimate -> UI      (e.g. 2 Hz)
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+MAX_TAPS = 255
+
+
+class FirLowpass:
+    """Streaming windowed-sinc low-pass filter.
+
+    The filter is causal, so its output lags the input by (taps - 1) / 2
+    samples (`delay`, seconds). Output times are moved back by that delay,
+    so each filtered sample carries the time it is centred on: the first
+    `delay` seconds of output are only warm-up and are dropped, and the
+    last `delay` seconds arrive with the next block or from flush().
+    """
+
+    def __init__(self, cutoff, rate, taps=None):
+        if not 0 < cutoff < rate / 2:
+            raise ValueError("cutoff must be between 0 and rate / 2")
+        if taps is None:
+            taps = min(MAX_TAPS, int(2 * rate / cutoff) | 1)
+        n = np.arange(taps) - (taps - 1) / 2
+        h = np.sinc(2 * cutoff / rate * n) * np.hamming(taps)
+        self.taps = h / h.sum()
+        self.rate = rate
+        self.delay = (taps - 1) / 2 / rate
+        self.history = None
+        self.t_first = None
+        self.last = None                 # newest input (t, x) for flush()
+
+    def process(self, t, x):
+        if len(t) == 0:
+            return t, x
+        if self.history is None:
+            # Start from steady state at the first sample instead of zeros
+            self.history = np.repeat(x[:1], len(self.taps) - 1, axis=0)
+            self.t_first = t[0]
+        buf = np.concatenate([self.history, x])
+        self.history = buf[len(buf) - len(self.taps) + 1:]
+        self.last = (t[-1], x[-1:])
+        windows = sliding_window_view(buf, len(self.taps), axis=0)   # (n, channels, taps)
+        t = t - self.delay
+        keep = t >= self.t_first - 0.5 / self.rate
+        return t[keep], (windows @ self.taps[::-1])[keep]
+
+    def flush(self):
+        """The held-back tail, filtered as if the last sample were held."""
+        if self.last is None:
+            return np.empty(0), None
+        t_last, x_last = self.last
+        pad = (len(self.taps) - 1) // 2
+        t, x = self.process(t_last + np.arange(1, pad + 1) / self.rate, np.repeat(x_last, pad, axis=0))
+        self.last = None
+        return t, x
+
+
+class Decimator:
+    """Keeps every `factor`-th sample, with the phase carried across blocks."""
+
+    def __init__(self, factor):
+        if factor < 1 or int(factor) != factor:
+            raise ValueError("decimation factor must be a positive integer")
+        self.factor = int(factor)
+        self.phase = 0
+
+    def process(self, t, x):
+        idx = np.arange(self.phase, len(t), self.factor)
+        self.phase = (self.phase - len(t)) % self.factor
+        return t[idx], x[idx]
+
+
+class Chain:
+    """Runs a block through several stages in order."""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    def process(self, t, x):
+        for stage in self.stages:
+            t, x = stage.process(t, x)
+            if len(t) == 0:
+                break
+        return t, x
+
+    def flush(self):
+        """End of stream: push every stage's held-back samples through the rest."""
+        t, x = np.empty(0), None
+        for stage in self.stages:
+            if len(t):
+                t, x = stage.process(t, x)
+            if hasattr(stage, "flush"):
+                tail_t, tail_x = stage.flush()
+                if len(tail_t):
+                    t, x = (tail_t, tail_x) if not len(t) else (np.r_[t, tail_t], np.vstack([x, tail_x]))
+        return t, x
+
+
+def resampler(in_rate, out_rate, strict=True):
+    """Anti-alias filter + decimator taking in_rate down to out_rate.
+
+    Returns an empty (pass-through) chain when no reduction is needed.
+    With strict=False a non-integer ratio is rounded instead of rejected.
+    """
+    if out_rate >= in_rate:
+        return Chain([])
+    factor = in_rate / out_rate
+    if strict and abs(factor - round(factor)) > 1e-9:
+        raise ValueError(f"{in_rate} Hz is not an integer multiple of {out_rate} Hz")
+    factor = int(round(factor))
+    if factor == 1:
+        return Chain([])
+    return Chain([FirLowpass(0.4 * out_rate, in_rate), Decimator(factor)])
+
@@ -0,0 +1,225 @@
+"""
+Frequency-response (Bode) sweeps for the coupled tank twin.
+
+Stepped sine on the model runs every test frequency at once: each batch
+row of the TankNetwork state is one frequency, stepped with its own time
+step so that all rows cover the same number of cycles in the same number
+of steps. The analysis window is then an exact whole number of periods
+for every row, and a single rfft along time gives the excitation bin
+(bin = cycles) for the whole batch.
+
+A chirp run and a back-to-back stepped sine on the hardware are also
+provided. The hardware samples at one fixed rate for every frequency (the
+rate the publish chain's filter is designed for), so a frequency's period
+is generally not a whole number of samples; its cycle count is raised
+until the window is close to whole periods and the response is read with
+a single-frequency DFT at f instead of an FFT bin.
+"""
+import time
+import numpy as np
+
+MAX_DT = 0.5             # largest model step (s), well below the tank time constants
+POINTS_PER_CYCLE = 50
+SETTLE_CYCLES = 2        # discarded before the analysis window
+CYCLES = 5               # analysed cycles per frequency
+MAX_CYCLES = 50
+CHIRP_PERIODS = 10       # periods of f_min a chirp lasts
+MIN_FREQUENCY = 0.0005   # Hz; one cycle is already over half an hour
+MAX_SIM_STEPS = 100_000  # model steps a simulated sweep may take (a few seconds)
+
+
+def frequencies(f_min, f_max, points):
+    if not MIN_FREQUENCY <= f_min < f_max:
+        raise ValueError(f"need {MIN_FREQUENCY} <= f_min < f_max")
+    return np.geomspace(f_min, f_max, int(points))
+
+
+def cycle_points(f_min):
+    """Steps per cycle of a batched stepped sine, set by its slowest frequency."""
+    return max(POINTS_PER_CYCLE, int(np.ceil(1.0 / (f_min * MAX_DT))))
+
+
+def chirp_timing(f_min, f_max, periods=CHIRP_PERIODS):
+    """(duration, dt, steps) of a simulated chirp."""
+    duration = periods / f_min
+    dt = min(MAX_DT, 1.0 / (20 * f_max))
+    return duration, dt, int(duration / dt)
+
+
+def sim_steps(mode, f_min, f_max, cycles=CYCLES, settle_cycles=SETTLE_CYCLES):
+    """Model steps a simulated sweep takes, to refuse ones that would run for minutes."""
+    if mode == "chirp":
+        return chirp_timing(f_min, f_max)[2]
+    return cycle_points(f_min) * (settle_cycles + cycles)
+
+
+def bode(u, y, bin_index):
+    """Gain and phase of y relative to u at one FFT bin.
+
+    Time runs along axis 0: u is (T, ...) and y is (T, ..., channels).
+    Returns (gain, phase_deg) shaped like y without the time axis.
+    """
+    U = np.fft.rfft(u, axis=0)[bin_index]
+    Y = np.fft.rfft(y, axis=0)[bin_index]
+    H = Y / U[..., None]
+    return np.abs(H), np.degrees(np.angle(H))
+
+
+def tone(u, y, f, dt):
+    """Gain and phase of y relative to u at frequency f (Hz), for samples dt apart.
+
+    Like bode(), but f need not fall on an FFT bin; means are removed
+    first so the DC level does not leak into the estimate.
+    """
+    e = np.exp(-2j * np.pi * f * dt * np.arange(len(u)))
+    U = (u - u.mean()) @ e
+    Y = e @ (y - y.mean(axis=0))
+    H = Y / U
+    return np.abs(H), np.degrees(np.angle(H))
+
+
+def whole_cycles(samples_per_cycle, cycles, max_factor=4):
+    """Cycle count from cycles to max_factor * cycles whose window is nearest
+    to a whole number of samples."""
+    counts = np.arange(cycles, max_factor * cycles + 1)
+    spans = counts * samples_per_cycle
+    return int(counts[np.argmin(np.abs(spans - np.round(spans)))])
+
+
+def settle(network, voltage, duration=3000.0, dt=MAX_DT, tol=1e-6):
+    """Levels after holding `voltage` until they stop moving."""
+    h = network.initial_state(0.0)
+    for _ in range(int(duration / dt)):
+        h_next = network.step(h, voltage, dt, max_dt=dt)
+        if np.max(np.abs(h_next - h)) < tol:
+            return h_next
+        h = h_next
+    return h
+
+
+def result(mode, target, channels, freqs, gain, phase, started):
+    # Unwrap along frequency so the phase curve is continuous
+    phase = np.degrees(np.unwrap(np.radians(phase), axis=0))
+    return {
+        "mode": mode,
+        "target": target,
+        "channels": list(channels),
+        "frequency": np.asarray(freqs).tolist(),
+        "gain": gain.T.tolist(),
+        "gain_db": (20 * np.log10(np.maximum(gain, 1e-12))).T.tolist(),
+        "phase_deg": phase.T.tolist(),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+# ------------------------------------------------------------
+# Simulated sweeps
+# ------------------------------------------------------------
+def stepped_sine_sim(network, freqs, base, amp, cycles=CYCLES, settle_cycles=SETTLE_CYCLES):
+    """All frequencies in one batched simulation."""
+    started = time.perf_counter()
+    freqs = np.asarray(freqs, dtype=np.float64)
+    total_cycles = settle_cycles + cycles
+
+    # Same step count for every row; the slowest row decides it
+    per_cycle = cycle_points(freqs.min())
+    steps = per_cycle * total_cycles
+    dt = 1.0 / (freqs * per_cycle)                     # (B,)
+
+    h = np.tile(settle(network, base), (len(freqs), 1))
+    window = cycles * per_cycle
+    u_rec = np.empty((window, len(freqs)))
+    y_rec = np.empty((window, len(freqs), network.n))
+
+    for k in range(steps):
+        # Every row is at the same phase of its own sine, so u is shared
+        u = np.clip(base + amp * np.sin(2 * np.pi * k / per_cycle), 0.0, 10.0)
+        h = np.clip(h + dt[:, None] * network.derivative(h, np.full(len(freqs), u)), 0.0, network.max_height)
+        if k >= steps - window:
+            u_rec[k - (steps - window)] = u
+            y_rec[k - (steps - window)] = h
+
+    gain, phase = bode(u_rec, y_rec, cycles)
+    return result("stepped", "sim", network.names, freqs, gain, phase, started)
+
+
+def chirp_sim(network, f_min, f_max, points, base, amp, periods=CHIRP_PERIODS):
+    """One exponential chirp through the model, H(f) = Y(f) / U(f)."""
+    started = time.perf_counter()
+    duration, dt, steps = chirp_timing(f_min, f_max, periods)
+    t = np.arange(steps) * dt
+    k = np.log(f_max / f_min) / duration
+    u = np.clip(base + amp * np.sin(2 * np.pi * f_min * (np.exp(k * t) - 1) / k), 0.0, 10.0)
+
+    h = settle(network, base)
+    y = np.empty((len(t), network.n))
+    for i, v in enumerate(u):
+        h = network.step(h, v, dt)
+        y[i] = h
+
+    U = np.fft.rfft(u - u.mean())
+    Y = np.fft.rfft(y - y.mean(axis=0), axis=0)
+    bins = np.fft.rfftfreq(len(t), dt)
+    freqs = frequencies(f_min, f_max, points)
+    idx = np.clip(np.searchsorted(bins, freqs), 1, len(bins) - 1)
+    H = Y[idx] / U[idx, None]
+    return result("chirp", "sim", network.names, bins[idx], np.abs(H), np.degrees(np.angle(H)), started)
+
+
+# ------------------------------------------------------------
+# Hardware sweep
+# ------------------------------------------------------------
+def stepped_sine_hardware(write_voltage, read_levels, channels, freqs, base, amp, rate,
+                          cycles=CYCLES, settle_cycles=SETTLE_CYCLES,
+                          should_stop=lambda: False, on_block=None, block_seconds=0.5):
+    """Frequencies one after another on the real plant, all sampled at rate (Hz).
+
+    write_voltage(v) drives the pump, read_levels() returns the current
+    levels. on_block(t, levels) is called every block_seconds with the
+    samples since the last call, so long low-frequency points stream too.
+    """
+    started = time.perf_counter()
+    gains, phases, done = [], [], []
+    dt = 1.0 / rate
+    block = max(1, int(round(rate * block_seconds)))
+    t_offset = 0.0
+
+    for f in freqs:
+        if not 0 < f < rate / 2:
+            raise ValueError(f"{f:g} Hz cannot be measured at {rate:g} Hz sampling")
+        per_cycle = rate / f
+        window = int(round(whole_cycles(per_cycle, cycles) * per_cycle))
+        steps = int(np.ceil(settle_cycles * per_cycle)) + window
+        u = np.clip(base + amp * np.sin(2 * np.pi * f * dt * np.arange(steps)), 0.0, 10.0)
+        y = np.empty((steps, len(channels)))
+
+        stopped = False
+        published = 0
+        t0 = time.perf_counter()
+        for k in range(steps):
+            if should_stop():
+                stopped = True
+                break
+            wait = t0 + k * dt - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            write_voltage(u[k])
+            y[k] = read_levels()
+            if on_block and k + 1 - published == block:
+                on_block(t_offset + np.arange(published, k + 1) * dt, y[published:k + 1])
+                published = k + 1
+        measured = k + 1 if not stopped else k
+        if on_block and measured > published:
+            on_block(t_offset + np.arange(published, measured) * dt, y[published:measured])
+        if stopped:
+            break
+
+        gain, phase = tone(u[-window:], y[-window:], f, dt)
+        gains.append(gain)
+        phases.append(phase)
+        done.append(f)
+        t_offset += steps * dt
+
+    gain = np.array(gains).reshape(len(done), len(channels))
+    phase = np.array(phases).reshape(len(done), len(channels))
+    return result("stepped", "hardware", channels, done, gain, phase, started)
@@ -1,13 +1,33 @@
-import requests
+import os
 import speech_recognition as sr
+from command_dispatch import CommandDispatcher
 
-# Webhook URL from Pushcut or Shortcuts Remote
+# Webhook URL from Pushcut or Shortcuts Remote (env overrides, e.g. a local
+# stub from command_dispatch.stub_server() for testing)
 SHORTCUT_URLS = {
     #replace links with ones from the shortcuts app 
-    "takeoff": "https://api.pushcut.io/3CsuPL31cbY8gkSfKlG73/notifications/Dji%20Take%20Off",
-    "land": "https://api.pushcut.io/3CsuPL31cbY8gkSfKlG73/notifications/Dji%20Land"
+    "takeoff": os.getenv("SHORTCUT_TAKEOFF_URL", "https://api.pushcut.io/3CsuPL31cbY8gkSfKlG73/notifications/Dji%20Take%20Off"),
+    "land": os.getenv("SHORTCUT_LAND_URL", "https://api.pushcut.io/3CsuPL31cbY8gkSfKlG73/notifications/Dji%20Land")
 }
 
+
+def report(result):
+    if result["state"] == "acked":
+        print(f"[BRIDGE] {result['command']} acknowledged ({result['status']}) in {result['latency_s']} s")
+    else:
+        print(f"[BRIDGE] {result['command']} {result['state']} after {result['attempts']} attempt(s): "
+              f"{result['error'] or result['status']}")
+
+
+# Webhooks are sent from a background thread so listening never waits on the network
+dispatcher = CommandDispatcher(SHORTCUT_URLS, on_result=report)
+
+
+def send(command):
+    if dispatcher.submit(command) is None:
+        print(f"[BRIDGE] {command} skipped (just sent, or too many commands waiting)")
+
+
 r = sr.Recognizer()
 mic = sr.Microphone()
 print("Say a command: (take off / land)")
@@ -21,10 +41,10 @@ while True:
 
         if "take off" in cmd:
             print("Sending takeoff command to iPad...")
-            requests.get(SHORTCUT_URLS["takeoff"])
+            send("takeoff")
         elif "land" in cmd:
             print("Sending land command to iPad...")
-            requests.get(SHORTCUT_URLS["land"])
+            send("land")
         elif "exit" in cmd:
             print("Closing..")
             break
@@ -33,5 +53,4 @@ while True:
     except Exception as e:
         print("Error:", e)
 
-
-
+dispatcher.close()
@@ -1,8 +1,11 @@
-from flask import Flask, render_template_string, jsonify, request
-from datetime import datetime
+from flask import Flask, Response, render_template_string, jsonify, request
+import json
+import os
 import threading
-import zmq
 import time
+import zmq
+import telemetry_wire
+from telemetry_buffer import TelemetryRingBuffer, MONOTONIC_TO_WALL
 
 app = Flask(__name__)
 
@@ -16,8 +19,19 @@ telemetry_data = {
     "longitude": 0.0
 }
 
-altitude_history = []
+# All telemetry fields, HISTORY_CAPACITY samples (default 10 min at 50 Hz)
+history = TelemetryRingBuffer(int(os.getenv("HISTORY_CAPACITY", 30000)))
+HISTORY_SECONDS = 60     # default window returned by /telemetry
+STREAM_PERIOD = float(os.getenv("STREAM_PERIOD", 0.2))   # s between /stream updates
+STREAM_HEARTBEAT = 15.0  # s between keep-alive comments on an idle stream
 telemetry_lock = threading.Lock()
+# This single-drone dashboard follows one drone from the fleet bus
+DRONE_ID = os.getenv("DRONE_ID", "drone_1")
+# "latest" uses a conflated socket: only the newest frame is kept, so
+# the listener's work does not grow with the publish rate
+TELEMETRY_MODE = os.getenv("TELEMETRY_MODE", "all")
+DISPLAY_RATE = float(os.getenv("DISPLAY_RATE", 20))     # Hz in "latest" mode
+BAD_FRAME_REPORT = 1000  # print every this many undecodable frames
 
 # ==========================
 # HTML Template
@@ -193,16 +207,17 @@ function updateDronePosition(altitude) {
 </div>
 
 <script>
-async function fetchTelemetry() {
-    const res = await fetch('/telemetry');
-    const data = await res.json();
+// Server-sent deltas: each event only carries samples the chart has not seen
+const source = new EventSource('/stream');
+source.onmessage = (e) => showTelemetry(JSON.parse(e.data));
 
+function showTelemetry(data) {
     document.getElementById("altitude").textContent = data.altitude.toFixed(2);
     document.getElementById("speed").textContent = data.speed.toFixed(2);
     document.getElementById("latitude").textContent = data.latitude.toFixed(6);
     document.getElementById("longitude").textContent = data.longitude.toFixed(6);
 
-    updateChart(data.history);
+    appendChart(data.history);
     updateDronePosition(data.altitude);
 }
 
@@ -228,10 +243,27 @@ const chart = new Chart(ctx, {
     }
 });
 
-function updateChart(history) {
-    chart.data.labels = history.map(h => h.time);
-    chart.data.datasets[0].data = history.map(h => h.altitude);
-    chart.update();
+// Times of the plotted points, to drop the ones older than the window
+let chartTimes = [];
+const CHART_SECONDS = {{ history_seconds }};
+
+function appendChart(history) {
+    if (!history.t.length) return;
+    const labels = chart.data.labels, values = chart.data.datasets[0].data;
+    for (let i = 0; i < history.t.length; i++) {
+        chartTimes.push(history.t[i]);
+        labels.push(new Date(history.t[i] * 1000).toLocaleTimeString());
+        values.push(history.z[i]);
+    }
+    const cutoff = chartTimes[chartTimes.length - 1] - CHART_SECONDS;
+    let old = 0;
+    while (old < chartTimes.length && chartTimes[old] < cutoff) old++;
+    if (old) {
+        chartTimes.splice(0, old);
+        labels.splice(0, old);
+        values.splice(0, old);
+    }
+    chart.update("none");
 }
 
 document.getElementById("simulationForm").addEventListener("submit", async (e) => {
@@ -248,11 +280,7 @@ document.getElementById("simulationForm").addEventListener("submit", async (e) =
         headers: {"Content-Type": "application/json"},
         body: JSON.stringify(data)
     });
-
-    await fetchTelemetry();
 });
-
-setInterval(fetchTelemetry, 1000);
 </script>
 
 </body>
@@ -262,27 +290,70 @@ setInterval(fetchTelemetry, 1000);
 # ==========================
 # Flask API Routes
 # ==========================
+def record_sample(x, y, z, vx, vy, vz, speed, t=None):
+    """Append one sample to the history (caller holds telemetry_lock)."""
+    history.append(time.monotonic() if t is None else t, (x, y, z, vx, vy, vz, speed))
+
+def telemetry_delta(since, seconds):
+    """Latest values plus the samples from cursor `since` (or the last `seconds`).
+
+    "seq" in the result is the cursor for the next call (caller holds
+    telemetry_lock).
+    """
+    t_from = time.monotonic() - seconds
+    if since is None:
+        t, values = history.since(t_from)
+    else:
+        t, values = history.after(since, t_from)
+    return {**telemetry_data, "seq": history.count, "history": history.to_json(t, values)}
+
 @app.route("/")
 def index():
-    return render_template_string(dashboard_html)
+    return render_template_string(dashboard_html, history_seconds=HISTORY_SECONDS)
 
 @app.route("/telemetry")
 def telemetry():
+    seconds = request.args.get("seconds", HISTORY_SECONDS, type=float)
+    since = request.args.get("since", type=int)
     with telemetry_lock:
-        return jsonify({**telemetry_data, "history": altitude_history})
+        return jsonify(telemetry_delta(since, seconds))
+
+@app.route("/stream")
+def stream():
+    """Server-sent events: one delta per STREAM_PERIOD while new samples arrive.
+
+    Event IDs are sequence cursors, so a reconnecting EventSource resumes
+    where it left off via Last-Event-ID.
+    """
+    seconds = request.args.get("seconds", HISTORY_SECONDS, type=float)
+    since = request.headers.get("Last-Event-ID", request.args.get("since"))
+    since = int(since) if since not in (None, "") else None
+
+    def events(since):
+        idle = 0.0
+        while True:
+            with telemetry_lock:
+                delta = telemetry_delta(since, seconds)
+            if delta["seq"] != since:
+                since = delta["seq"]
+                idle = 0.0
+                yield f"id: {since}\ndata: {json.dumps(delta)}\n\n"
+            elif idle >= STREAM_HEARTBEAT:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            time.sleep(STREAM_PERIOD)
+            idle += STREAM_PERIOD
+
+    return Response(events(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/simulate", methods=["POST"])
 def simulate():
     data = request.get_json()
     with telemetry_lock:
         telemetry_data.update(data)
-        altitude_history.append({
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "altitude": telemetry_data["altitude"]
-        })
-
-        if len(altitude_history) > 60:
-            altitude_history.pop(0)
+        record_sample(telemetry_data["latitude"], telemetry_data["longitude"],
+                      telemetry_data["altitude"], 0.0, 0.0, 0.0, telemetry_data["speed"])
 
     return jsonify({"status": "ok"})
 
@@ -292,26 +363,33 @@ def simulate():
 # ==========================
 def zmq_listener():
     ctx = zmq.Context()
-    socket = ctx.socket(zmq.SUB)
-    socket.connect("tcp://localhost:5556")
-    socket.setsockopt_string(zmq.SUBSCRIBE, "")
+    latest = TELEMETRY_MODE == "latest"
+    socket = telemetry_wire.subscriber(ctx, [DRONE_ID], conflate=latest)
+    bad_frames = 0
 
     while True:
-        msg = socket.recv_json()
+        frame = socket.recv()
+        if latest:
+            time.sleep(1.0 / DISPLAY_RATE)
+        try:
+            msgs = [telemetry_wire.decode(frame)[1]] if latest else telemetry_wire.decode_all(frame)[1]
+            # Batched samples carry the publisher's wall-clock stamp
+            rows = [(float(m["x"]), float(m["y"]), float(m["z"]), float(m["vx"]), float(m["vy"]), float(m["vz"]),
+                     float(m["t"]) - MONOTONIC_TO_WALL if "t" in m else None) for m in msgs]
+        except telemetry_wire.FRAME_ERRORS as exc:
+            # One bad frame must not end the listener
+            bad_frames += 1
+            if bad_frames % BAD_FRAME_REPORT == 1:
+                print(f"[ZMQ] Skipping undecodable frame ({bad_frames} so far): {type(exc).__name__}: {exc}")
+            continue
 
         with telemetry_lock:
-            telemetry_data["altitude"] = msg["z"]
-            telemetry_data["speed"] = (msg["vx"]**2 + msg["vy"]**2 + msg["vz"]**2)**0.5
-            telemetry_data["latitude"] = msg["x"]
-            telemetry_data["longitude"] = msg["y"]
-
-            altitude_history.append({
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "altitude": telemetry_data["altitude"]
-            })
-
-            if len(altitude_history) > 60:
-                altitude_history.pop(0)
+            for x, y, z, vx, vy, vz, t in rows:
+                telemetry_data["altitude"] = z
+                telemetry_data["speed"] = (vx**2 + vy**2 + vz**2)**0.5
+                telemetry_data["latitude"] = x
+                telemetry_data["longitude"] = y
+                record_sample(x, y, z, vx, vy, vz, telemetry_data["speed"], t)
 
 
 threading.Thread(target=zmq_listener, daemon=True).start()
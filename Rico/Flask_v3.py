@@ -1,13 +1,44 @@
-from flask import Flask, render_template_string, jsonify, request
-from datetime import datetime
+from flask import Flask, Response, render_template_string, jsonify, request
+import atexit
+import json
+import os
 import threading
+import time
 import zmq
+import telemetry_wire
+from fleet import DroneTrack, Fleet, run_latest, start_async
+from flight_store import FlightStore, COLUMNS
+from telemetry_buffer import MONOTONIC_TO_WALL
+from fleet_space import SeparationMonitor, SpatialGrid
+from telemetry_trace import Tracer
+from telemetry_rollup import ROLLUP_POINTS
+from dead_reckoning import DR_HORIZON
+import numpy as np
 
 app = Flask(__name__)
 
-telemetry_data = {"altitude": 0.0, "speed": 0.0, "latitude": 0.0, "longitude": 0.0}
-altitude_history = []
-telemetry_lock = threading.Lock()
+# One track (latest values + ring-buffer history) per drone ID on the bus
+fleet = Fleet()
+HISTORY_SECONDS = 60     # default window returned by /telemetry
+STREAM_PERIOD = float(os.getenv("STREAM_PERIOD", 0.2))   # s between /stream updates
+STREAM_HEARTBEAT = 15.0  # s between keep-alive comments on an idle stream
+# Drone shown when a request does not name one (first drone seen if unset)
+DEFAULT_DRONE = os.getenv("DEFAULT_DRONE", "")
+# "all" records every sample, "latest" only keeps each drone's newest value
+# at DISPLAY_RATE (history is then sampled at that rate too)
+TELEMETRY_MODE = os.getenv("TELEMETRY_MODE", "all")
+
+# Latency per stage (bus, ingest, emit) and sequence gaps, served at /metrics
+tracer = Tracer()
+fleet.tracer = tracer
+
+# Every recorded sample also goes to the on-disk flight store (RECORD_FLIGHTS=0 to disable);
+# the ingest loop only queues it, the store's writer thread does the disk I/O
+flight_store = FlightStore()
+RECORD_FLIGHTS = os.getenv("RECORD_FLIGHTS", "1") != "0"
+if RECORD_FLIGHTS:
+    fleet.consumers.append(lambda drone_id, t, values:
+                           flight_store.submit(drone_id, t + MONOTONIC_TO_WALL, values))
 
 # ------------------ HTML TEMPLATE -------------------
 
@@ -194,6 +225,12 @@ init3D();
 <div class="container">
   <h2>Live Telemetry</h2>
 
+  <div id="telemetryRow">
+    <label>Drone&nbsp;</label>
+    <select id="droneSelect"></select>
+    &nbsp;<span id="fleetInfo"></span>
+  </div>
+
   <div id="telemetryRow">
     <div class="value-box">Altitude: <span id="altitude">0</span></div>
     <div class="value-box">Speed: <span id="speed">0</span></div>
@@ -205,23 +242,90 @@ init3D();
 <!-- CHART -->
 <div class="container">
   <h2>Altitude Chart</h2>
+  <div style="text-align:center">
+    <label for="zoomSelect">Window</label>
+    <select id="zoomSelect">
+      <option value="{{ history_seconds }}">Last {{ history_seconds }} s (live)</option>
+      <option value="600">10 minutes</option>
+      <option value="3600">1 hour</option>
+      <option value="21600">6 hours</option>
+      <option value="86400">24 hours</option>
+    </select>
+    &nbsp;<span id="tierInfo">raw samples</span>
+  </div>
   <canvas id="altChart" height="200"></canvas>
 </div>
 
 <script>
-async function fetchTelemetry() {
-    const r = await fetch('/telemetry');
-    const data = await r.json();
+let selectedDrone = "";
+
+async function fetchDrones() {
+    const r = await fetch('/drones');
+    const drones = await r.json();
+    const select = document.getElementById("droneSelect");
+    const ids = drones.map(d => d.id);
+    if (select.options.length !== ids.length) {
+        select.innerHTML = ids.map(id => `<option value="${id}">${id}</option>`).join("");
+        if (ids.includes(selectedDrone)) select.value = selectedDrone;
+    }
+    document.getElementById("fleetInfo").textContent = `${ids.length} drone(s) online`;
+}
+
+document.getElementById("droneSelect").addEventListener("change", (e) => {
+    selectedDrone = e.target.value;
+    connectStream();
+    if (!liveChart()) loadRollup();
+});
+
+// Server-sent deltas: each event only carries samples the chart has not seen
+let source = null;
+
+function connectStream() {
+    if (source) source.close();
+    fix = null;
+    resetChart();
+    source = new EventSource('/stream?drone=' + encodeURIComponent(selectedDrone));
+    source.onmessage = (e) => showTelemetry(JSON.parse(e.data));
+}
+
+function showTelemetry(data) {
+    if (!selectedDrone) {
+        selectedDrone = data.drone;
+        document.getElementById("droneSelect").value = data.drone;
+    }
 
-    document.getElementById("altitude").textContent = data.altitude.toFixed(2);
     document.getElementById("speed").textContent = data.speed.toFixed(2);
-    document.getElementById("latitude").textContent = data.latitude.toFixed(6);
-    document.getElementById("longitude").textContent = data.longitude.toFixed(6);
+    const h = data.history, last = h.t.length - 1;
+    if (last >= 0) {
+        // Extrapolate from when the sample was taken, not when this delta arrived
+        fix = {x: h.x[last], y: h.y[last], z: h.z[last], vx: h.vx[last], vy: h.vy[last], vz: h.vz[last],
+               at: h.t[last]};
+    } else if (!fix) {
+        fix = {x: data.latitude, y: data.longitude, z: data.altitude, vx: 0, vy: 0, vz: 0, at: Date.now() / 1000};
+    }
+    showPosition();
 
-    updateChart(data.history);
-    updateDronePosition(data.altitude);
+    if (liveChart()) appendChart(data.history);
 }
 
+// Dead reckoning between samples: publishers may only send when the drone
+// leaves its predicted track (DR_THRESHOLD), so keep moving it along its velocity
+const DR_HORIZON = {{ dr_horizon }};
+let fix = null;
+
+function showPosition() {
+    if (!fix) return;
+    // fix.at is wall-clock seconds, like history.t
+    const dt = Math.min(Math.max(Date.now() / 1000 - fix.at, 0), DR_HORIZON);
+    const altitude = fix.z + fix.vz * dt;
+    document.getElementById("altitude").textContent = altitude.toFixed(2);
+    document.getElementById("latitude").textContent = (fix.x + fix.vx * dt).toFixed(6);
+    document.getElementById("longitude").textContent = (fix.y + fix.vy * dt).toFixed(6);
+    updateDronePosition(altitude);
+}
+
+setInterval(showPosition, 50);
+
 const ctx = document.getElementById("altChart").getContext("2d");
 
 const chart = new Chart(ctx, {
@@ -236,9 +340,23 @@ const chart = new Chart(ctx, {
             borderWidth: 2,
             fill: false,
             pointRadius: 4
+        }, {
+            label: "Min",
+            data: [],
+            borderWidth: 0,
+            pointRadius: 0,
+            fill: false
+        }, {
+            label: "Max",
+            data: [],
+            borderWidth: 0,
+            pointRadius: 0,
+            fill: "-1",                          // band down to the Min dataset
+            backgroundColor: "rgba(0, 0, 255, 0.15)"
         }]
     },
     options: {
+        plugins: { legend: { labels: { filter: (item) => item.datasetIndex === 0 } } },
         scales: {
             x: { ticks: { color: "black" } },   // BLACK AXIS LABELS
             y: { ticks: { color: "black" } }
@@ -247,15 +365,75 @@ const chart = new Chart(ctx, {
     }
 });
 
-function updateChart(history) {
-    chart.data.labels = history.map(v => v.time);
-    chart.data.datasets[0].data = history.map(v => v.altitude);
-    chart.update();
+// Times of the plotted points, to drop the ones older than the window
+let chartTimes = [];
+const CHART_SECONDS = {{ history_seconds }};
+
+function resetChart() {
+    chartTimes = [];
+    chart.data.labels = [];
+    chart.data.datasets.forEach(d => d.data = []);
+    chart.update("none");
+}
+
+// Wider windows plot server-side rollups (mean line, min/max band) instead of raw samples
+let chartSeconds = CHART_SECONDS;
+let rollupLoad = 0;          // bumped to cancel the pending refresh
+
+function liveChart() {
+    return chartSeconds <= CHART_SECONDS;
+}
+
+document.getElementById("zoomSelect").addEventListener("change", (e) => {
+    chartSeconds = parseFloat(e.target.value);
+    rollupLoad++;
+    if (liveChart()) {
+        document.getElementById("tierInfo").textContent = "raw samples";
+        connectStream();
+    } else {
+        resetChart();
+        loadRollup();
+    }
+});
+
+async function loadRollup() {
+    const load = ++rollupLoad;
+    const r = await fetch(`/history?drone=${encodeURIComponent(selectedDrone)}&seconds=${chartSeconds}&fields=z`);
+    const data = await r.json();
+    if (load !== rollupLoad || liveChart()) return;
+    chart.data.labels = data.t.map(t => new Date(t * 1000).toLocaleTimeString());
+    chart.data.datasets[0].data = data.z_mean;
+    chart.data.datasets[1].data = data.z_min;
+    chart.data.datasets[2].data = data.z_max;
+    chart.update("none");
+    document.getElementById("tierInfo").textContent = `${data.tier} buckets, mean with min/max`;
+    // Refresh about once per bucket, between 2 and 10 s
+    setTimeout(() => { if (load === rollupLoad) loadRollup(); }, Math.min(Math.max(data.width, 2), 10) * 1000);
+}
+
+function appendChart(history) {
+    if (!history.t.length) return;
+    const labels = chart.data.labels, values = chart.data.datasets[0].data;
+    for (let i = 0; i < history.t.length; i++) {
+        chartTimes.push(history.t[i]);
+        labels.push(new Date(history.t[i] * 1000).toLocaleTimeString());
+        values.push(history.z[i]);
+    }
+    const cutoff = chartTimes[chartTimes.length - 1] - CHART_SECONDS;
+    let old = 0;
+    while (old < chartTimes.length && chartTimes[old] < cutoff) old++;
+    if (old) {
+        chartTimes.splice(0, old);
+        labels.splice(0, old);
+        values.splice(0, old);
+    }
+    chart.update("none");
 }
 
 document.getElementById("manualForm").addEventListener("submit", async (e) => {
     e.preventDefault();
     const d = {
+        drone: selectedDrone,
         altitude: parseFloat(document.getElementById("sim_altitude").value),
         speed: parseFloat(document.getElementById("sim_speed").value),
         latitude: parseFloat(document.getElementById("sim_lat").value),
@@ -267,11 +445,11 @@ document.getElementById("manualForm").addEventListener("submit", async (e) => {
         headers: {"Content-Type": "application/json"},
         body: JSON.stringify(d)
     });
-
-    fetchTelemetry();
 });
 
-setInterval(fetchTelemetry, 1000);
+setInterval(fetchDrones, 2000);
+fetchDrones();
+connectStream();
 </script>
 
 </body>
@@ -280,51 +458,234 @@ setInterval(fetchTelemetry, 1000);
 
 # ------------------ FLASK ROUTES -------------------
 
+def default_drone():
+    """DEFAULT_DRONE, else the first drone seen, else drone_1."""
+    if DEFAULT_DRONE:
+        return DEFAULT_DRONE
+    ids = fleet.ids()
+    return ids[0] if ids else "drone_1"
+
+def telemetry_delta(drone_id, since, seconds):
+    """Latest values plus the samples from cursor `since` (or the last `seconds`).
+
+    Returns a dict whose "seq" is the cursor for the next call. Reads
+    without a lock; the ingest loop is the only writer.
+    """
+    # Unknown IDs get an empty track without being added to the fleet
+    track = fleet.get(drone_id) or DroneTrack(drone_id, capacity=1)
+    state = track.state
+    t_from = time.monotonic() - seconds
+    if since is None:
+        t, values, seq = track.history.read(track.history.since, t_from)
+    else:
+        t, values, seq = track.history.read(track.history.after, since, t_from)
+    return {"drone": drone_id, **state, "seq": seq,
+            "history": track.history.to_json(t, values)}
+
+def drone_telemetry(drone_id):
+    seconds = request.args.get("seconds", HISTORY_SECONDS, type=float)
+    since = request.args.get("since", type=int)
+    return jsonify(telemetry_delta(drone_id or default_drone(), since, seconds))
+
 @app.route("/")
 def index():
-    return render_template_string(dashboard_html)
+    return render_template_string(dashboard_html, history_seconds=HISTORY_SECONDS, dr_horizon=DR_HORIZON)
 
 @app.route("/telemetry")
 def telemetry():
-    with telemetry_lock:
-        return jsonify({**telemetry_data, "history": altitude_history})
+    return drone_telemetry(request.args.get("drone", ""))
+
+@app.route("/history")
+def history():
+    """Chart data for a window: raw samples up to HISTORY_SECONDS, beyond that
+    the finest rollup tier with at most `points` buckets (min/max/mean columns).
+
+    ?drone=&seconds=&points=&fields=z,speed (fields limits the columns)
+    """
+    drone_id = request.args.get("drone", "") or default_drone()
+    seconds = request.args.get("seconds", HISTORY_SECONDS, type=float)
+    points = request.args.get("points", ROLLUP_POINTS, type=int)
+    fields = request.args.get("fields", "")
+    track = fleet.get(drone_id) or DroneTrack(drone_id, capacity=1)
+    t_from = time.monotonic() - seconds
+    if seconds <= HISTORY_SECONDS or not track.rollup.tiers:
+        t, values, _ = track.history.read(track.history.since, t_from)
+        out = {"tier": "raw", "width": 0, **track.history.to_json(t, values)}
+    else:
+        tier = track.rollup.tier_for(seconds, points)
+        t, values = track.rollup.read(tier, t_from)
+        out = {"tier": f"{tier.width:g}s", **track.rollup.to_json(tier, t, values)}
+    if fields:
+        keep = set(fields.split(","))
+        out = {k: v for k, v in out.items() if not isinstance(v, list) or k in ("t", "n")
+               or k in keep or k.rpartition("_")[0] in keep}
+    return jsonify({"drone": drone_id, **out})
+
+@app.route("/stream")
+def stream():
+    """Server-sent events: one delta per STREAM_PERIOD while new samples arrive.
+
+    Event IDs are sequence cursors, so a reconnecting EventSource resumes
+    where it left off via Last-Event-ID.
+    """
+    seconds = request.args.get("seconds", HISTORY_SECONDS, type=float)
+    since = request.headers.get("Last-Event-ID", request.args.get("since"))
+    since = int(since) if since not in (None, "") else None
+    drone_id = request.args.get("drone", "") or default_drone()
+
+    def events(since):
+        idle = 0.0
+        while True:
+            delta = telemetry_delta(drone_id, since, seconds)
+            if delta["seq"] != since:
+                # Time from recording to leaving the server, per live sample
+                # (not the backfill sent on connect)
+                if since is not None and delta["history"]["t"]:
+                    tracer.stage("emit").add(time.time() - np.array(delta["history"]["t"]))
+                since = delta["seq"]
+                idle = 0.0
+                yield f"id: {since}\ndata: {json.dumps(delta)}\n\n"
+            elif idle >= STREAM_HEARTBEAT:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            time.sleep(STREAM_PERIOD)
+            idle += STREAM_PERIOD
+
+    return Response(events(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/drones")
+def drones():
+    return jsonify(fleet.summary())
+
+@app.route("/drones/<drone_id>/telemetry")
+def drone_history(drone_id):
+    if fleet.get(drone_id) is None:
+        return jsonify({"error": f"unknown drone {drone_id}"}), 404
+    return drone_telemetry(drone_id)
 
 @app.route("/simulate", methods=["POST"])
 def simulate():
     data = request.get_json()
-    with telemetry_lock:
-        telemetry_data.update(data)
-        altitude_history.append({
-            "time": datetime.now().strftime("%H:%M:%S"),
-            "altitude": telemetry_data["altitude"]
-        })
-        if len(altitude_history) > 60:
-            altitude_history.pop(0)
+    drone_id = data.pop("drone", "") or default_drone()
+    track = fleet.get(drone_id)
+    state = {**(track.state if track else DroneTrack(drone_id, capacity=1).state), **data}
+    # Applied by the ingest loop, the fleet's only writer
+    fleet.submit(drone_id, (state["latitude"], state["longitude"], state["altitude"],
+                            0.0, 0.0, 0.0, state["speed"]))
     return jsonify({"status": "ok"})
 
+@app.route("/flights")
+def flights():
+    return jsonify(flight_store.flights())
+
+@app.route("/flights/<flight_id>")
+def flight_data(flight_id):
+    """Columns of a stored flight; from/to are seconds since the flight started."""
+    try:
+        info, data = flight_store.read(flight_id, request.args.get("from", type=float),
+                                       request.args.get("to", type=float))
+    except FileNotFoundError:
+        return jsonify({"error": f"unknown flight {flight_id}"}), 404
+    columns = {name: data[i].tolist() for i, name in enumerate(COLUMNS)}
+    columns["t"] = (data[0] - info["started"]).tolist()
+    return jsonify({**info, "rows": data.shape[1], "columns": columns})
+
+@app.route("/ingest")
+def ingest_stats():
+    return jsonify(fleet.ingest_stats())
+
+@app.route("/metrics")
+def metrics():
+    """Latency percentiles per stage, sequence loss (totals and the worst
+    drones) and ingest counters."""
+    return jsonify({**tracer.summary(), "ingest": fleet.ingest_stats(),
+                    "zmq": {"rcvhwm": telemetry_wire.RCVHWM, "mode": TELEMETRY_MODE},
+                    "flights": {**flight_store.stats, "queued": len(flight_store.incoming)}})
+
 # ------------- ZEROMQ LISTENER --------------
 def zmq_listener():
-    ctx = zmq.Context()
-    socket = ctx.socket(zmq.SUB)
-    socket.connect("tcp://localhost:5556")
-    socket.setsockopt_string(zmq.SUBSCRIBE, "")
-
+    # DRONE_IDS=drone_1,drone_3 limits the dashboard to those drones
+    drone_ids = telemetry_wire.drone_ids_from_env()
+    print(f"[ZMQ] Listening on {telemetry_wire.TELEMETRY_ENDPOINT} ({TELEMETRY_MODE})")
+    if TELEMETRY_MODE == "latest":
+        run_latest(telemetry_wire.subscriber(zmq.Context(), drone_ids), fleet)
+    else:
+        # asyncio ingest on this thread's own event loop
+        start_async(fleet, lambda ctx: telemetry_wire.subscriber(ctx, drone_ids))
+
+# ------------- SEPARATION MONITOR --------------
+SEPARATION_MIN = float(os.getenv("SEPARATION_MIN", 5.0))     # m between any two drones
+SEPARATION_RATE = float(os.getenv("SEPARATION_RATE", 2.0))   # checks per second
+separation = SeparationMonitor(SEPARATION_MIN)
+
+def separation_loop():
     while True:
-        msg = socket.recv_json()
-        with telemetry_lock:
-            telemetry_data["altitude"] = msg["z"]
-            telemetry_data["speed"] = (msg["vx"]**2 + msg["vy"]**2 + msg["vz"]**2) ** 0.5
-            telemetry_data["latitude"] = msg["x"]
-            telemetry_data["longitude"] = msg["y"]
-
-            altitude_history.append({
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "altitude": telemetry_data["altitude"]
-            })
-            if len(altitude_history) > 60:
-                altitude_history.pop(0)
+        time.sleep(1.0 / SEPARATION_RATE)
+        ids, positions = fleet.positions()
+        seq = separation.seq
+        separation.tick(ids, positions)
+        alerts = [e for e in separation.events_after(seq) if e["type"] == "alert"]
+        if len(alerts) == 1:
+            a = alerts[0]
+            print(f"[SEPARATION] {a['drones'][0]} / {a['drones'][1]} at {a['distance']} m")
+        elif alerts:
+            print(f"[SEPARATION] {len(alerts)} new conflicts, {len(separation.active)} active")
+
+@app.route("/drones/<drone_id>/nearby")
+def nearby(drone_id):
+    """k nearest drones (?k=, default 3) or all within ?radius= metres."""
+    ids, positions = fleet.positions()
+    if drone_id not in ids:
+        return jsonify({"error": f"unknown drone {drone_id}"}), 404
+    grid = SpatialGrid(ids, positions, SEPARATION_MIN)
+    me = grid.index[drone_id]
+    radius = request.args.get("radius", type=float)
+    if radius is not None:
+        idx, dist = grid.within(positions[me], radius)
+        keep = idx != me
+        idx, dist = idx[keep], dist[keep]
+    else:
+        idx, dist = grid.nearest(positions[me], request.args.get("k", 3, type=int), exclude=me)
+    return jsonify({"drone": drone_id,
+                    "neighbours": [{"id": ids[i], "distance": round(d, 3)}
+                                   for i, d in zip(idx.tolist(), dist.tolist())]})
+
+@app.route("/separation")
+def separation_status():
+    return jsonify({"min_separation": SEPARATION_MIN, "conflicts": separation.conflicts(),
+                    "last_check": separation.last_tick, "seq": separation.seq})
+
+@app.route("/separation/stream")
+def separation_stream():
+    """SSE of alert/clear events; event IDs are sequence numbers for Last-Event-ID."""
+    since = request.headers.get("Last-Event-ID", request.args.get("since"))
+    since = int(since) + 1 if since not in (None, "") else separation.seq
+
+    def events(since):
+        idle = 0.0
+        while True:
+            pending = separation.events_after(since)
+            for event in pending:
+                yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+            if pending:
+                since = pending[-1]["seq"] + 1
+                idle = 0.0
+            elif idle >= STREAM_HEARTBEAT:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            time.sleep(STREAM_PERIOD)
+            idle += STREAM_PERIOD
+
+    return Response(events(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 threading.Thread(target=zmq_listener, daemon=True).start()
+if RECORD_FLIGHTS:
+    flight_store.start()
+threading.Thread(target=separation_loop, daemon=True).start()
+atexit.register(flight_store.close)
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # FLASK_DEBUG=0 skips the reloader, whose parent process would also ingest (see loadgen.py)
+    app.run(debug=os.getenv("FLASK_DEBUG", "1") != "0", port=int(os.getenv("DASHBOARD_PORT", 5000)))
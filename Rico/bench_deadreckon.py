@@ -0,0 +1,77 @@
+"""
+Dead reckoning: link bandwidth versus position error.
+
+Simulates a fleet (drone_sim, wind included) at 50 Hz and runs the
+publisher's DeadReckoningFilter at several thresholds. The twin's view
+of each drone is the extrapolation of the last sample it was sent; the
+error is its distance from the true position at every tick.
+
+For comparison, "decimated" sends every k-th sample at the same message
+rate and lets the twin extrapolate the same way, which is what simply
+lowering PUBLISH_RATE would give.
+
+    python bench_deadreckon.py [drones] [seconds]
+"""
+import sys
+import numpy as np
+import telemetry_wire
+from dead_reckoning import DeadReckoningFilter, extrapolate
+from drone_sim import FleetSim
+
+DRONES = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+RATE = 50.0
+THRESHOLDS = (0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0)
+# Bytes per traced binary frame, plus ZMQ's 2-byte frame header
+FRAME_BYTES = len(telemetry_wire.encode_values("drone_1", [0.0] * 6, seq=0)) + 2
+
+
+def trajectory():
+    sim = FleetSim(DRONES, seed=0)
+    steps = int(SECONDS * RATE)
+    out = np.empty((steps, DRONES, 6))
+    for i in range(steps):
+        sim.step(1.0 / RATE)
+        out[i] = sim.state().round(3)
+    return out
+
+
+def dead_reckoned(states, threshold):
+    """(messages sent, per-tick errors) with the publisher's filter."""
+    dr = DeadReckoningFilter(DRONES, threshold)
+    errors = np.empty(states.shape[:2])
+    for i, rows in enumerate(states):
+        t = i / RATE
+        dr.update(t, rows)
+        errors[i] = np.sqrt(np.sum((rows[:, :3] - extrapolate(dr.rows, t - dr.t)) ** 2, axis=1))
+    return dr.sent, errors
+
+
+def decimated(states, every):
+    """The same, sending every drone on every `every`-th tick."""
+    errors = np.empty(states.shape[:2])
+    sent = states[0]
+    for i, rows in enumerate(states):
+        if i % every == 0:
+            sent = rows
+        errors[i] = np.sqrt(np.sum((rows[:, :3] - extrapolate(sent, np.full(DRONES, (i % every) / RATE))) ** 2, axis=1))
+    return len(range(0, len(states), every)) * DRONES, errors
+
+
+def row(label, sent, errors):
+    rate = sent / SECONDS / DRONES
+    return (f"  {label:>16s} {rate:7.2f} Hz {rate * FRAME_BYTES * 8 / 1e3:8.2f} kbit/s "
+            f"{errors.mean():8.3f} {np.percentile(errors, 95):8.3f} {errors.max():8.3f}")
+
+
+if __name__ == "__main__":
+    states = trajectory()
+    print(f"[BENCH] {DRONES} drones, {SECONDS:g} s at {RATE:g} Hz, {FRAME_BYTES} bytes/frame; per drone:")
+    print(f"  {'':>16s} {'msg rate':>10s} {'bandwidth':>15s} {'mean m':>8s} {'p95 m':>8s} {'max m':>8s}")
+    for threshold in THRESHOLDS:
+        sent, errors = dead_reckoned(states, threshold)
+        print(row(f"DR {threshold:g} m", sent, errors))
+        every = max(1, round(states.size / 6 / sent))
+        if threshold and every > 1:
+            sent, errors = decimated(states, every)
+            print(row(f"decimated 1/{every}", sent, errors))
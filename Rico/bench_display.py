@@ -0,0 +1,69 @@
+"""
+Dashboard ingest CPU versus publish rate.
+
+One publisher sends a drone at increasing rates; the consumer thread's
+CPU time (time.thread_time) is measured for each ingest mode:
+
+    all       fleet.run_ingest, every message decoded and recorded
+    latest    fleet.run_latest, newest frame per drone at DISPLAY_RATE
+    conflate  ZMQ_CONFLATE socket + run_latest (single-drone consumers)
+
+    python bench_display.py [seconds per rate]
+"""
+import sys
+import threading
+import time
+import zmq
+import telemetry_wire
+from fleet import Fleet, run_ingest, run_latest
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+RATES = (1, 50, 200, 1000, 5000)
+ENDPOINT = "tcp://127.0.0.1:5598"
+
+
+def consume(mode, stop, out):
+    ctx = zmq.Context.instance()
+    socket = telemetry_wire.subscriber(ctx, conflate=mode == "conflate", endpoint=ENDPOINT, rcvhwm=0)
+    fleet = Fleet()
+    cpu = time.thread_time()
+    if mode == "all":
+        run_ingest(socket, fleet, should_stop=stop.is_set)
+    else:
+        run_latest(socket, fleet, should_stop=stop.is_set)
+    out["cpu"] = time.thread_time() - cpu
+    socket.close()
+
+
+def publish(pub, rate, seconds):
+    frame = telemetry_wire.encode({"id": "drone_1", "x": 1.0, "y": 2.0, "z": 3.0, "vx": 0.1, "vy": 0.2, "vz": 0.0})
+    tick = 0.01
+    per_tick = rate * tick
+    sent = 0.0
+    end = time.monotonic() + seconds
+    next_tick = time.monotonic()
+    while time.monotonic() < end:
+        sent += per_tick
+        while sent >= 1:
+            pub.send(frame)
+            sent -= 1
+        next_tick += tick
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+
+
+if __name__ == "__main__":
+    pub = telemetry_wire.publisher(zmq.Context.instance(), ENDPOINT, sndhwm=0)
+    print(f"[BENCH] consumer CPU ms per second of wall time, {SECONDS:g} s per rate")
+    print("  rate Hz " + "".join(f"{m:>10s}" for m in ("all", "latest", "conflate")))
+    for rate in RATES:
+        row = []
+        for mode in ("all", "latest", "conflate"):
+            stop, out = threading.Event(), {}
+            worker = threading.Thread(target=consume, args=(mode, stop, out))
+            worker.start()
+            time.sleep(0.3)                  # let the subscription connect
+            publish(pub, rate, SECONDS)
+            stop.set()
+            worker.join()
+            row.append(out["cpu"] / SECONDS * 1e3)
+        print(f"  {rate:7d} " + "".join(f"{v:10.1f}" for v in row))
@@ -0,0 +1,91 @@
+"""
+Throughput check for the multi-drone telemetry pipeline.
+
+Measures decode + Fleet.ingest in-process, then the same path through a
+real PUB/SUB pair on TCP loopback, and compares both against the load of
+N drones publishing at RATE Hz.
+
+    python bench_fleet.py [drones] [rate_hz]
+"""
+import sys
+import threading
+import time
+import zmq
+import telemetry_wire
+from fleet import Fleet
+
+DRONES = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+RATE = float(sys.argv[2]) if len(sys.argv) > 2 else 50.0
+MESSAGES = 200000
+
+
+def frames(n_drones, count):
+    msgs = []
+    for i in range(count):
+        d = i % n_drones
+        msgs.append(telemetry_wire.encode({
+            "id": f"drone_{d + 1}", "x": 1.0 + d, "y": 2.0, "z": 3.0 + i % 7,
+            "vx": 0.5, "vy": -0.25, "vz": 0.1,
+        }))
+    return msgs
+
+
+def bench_inprocess(msgs):
+    fleet = Fleet()
+    started = time.perf_counter()
+    for frame in msgs:
+        drone_id, msg = telemetry_wire.decode(frame)
+        fleet.ingest(drone_id, msg)
+    return len(msgs) / (time.perf_counter() - started)
+
+
+def bench_loopback(msgs, port=5599):
+    ctx = zmq.Context()
+    pub = ctx.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)
+    pub.bind(f"tcp://127.0.0.1:{port}")
+    sub = ctx.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, 0)
+    sub.connect(f"tcp://127.0.0.1:{port}")
+    telemetry_wire.subscribe(sub)
+
+    # Wait for the subscription to reach the publisher (slow joiner)
+    probe = telemetry_wire.encode({"id": "probe", "x": 0, "y": 0, "z": 0, "vx": 0, "vy": 0, "vz": 0})
+    while True:
+        pub.send(probe)
+        if sub.poll(50):
+            sub.recv()
+            break
+    while sub.poll(50):
+        sub.recv()
+
+    fleet = Fleet()
+    received = [0]
+
+    def consume():
+        while received[0] < len(msgs):
+            drone_id, msg = telemetry_wire.decode(sub.recv())
+            fleet.ingest(drone_id, msg)
+            received[0] += 1
+
+    worker = threading.Thread(target=consume)
+    started = time.perf_counter()
+    worker.start()
+    for frame in msgs:
+        pub.send(frame)
+    worker.join()
+    elapsed = time.perf_counter() - started
+    pub.close()
+    sub.close()
+    ctx.term()
+    return received[0] / elapsed
+
+
+if __name__ == "__main__":
+    needed = DRONES * RATE
+    msgs = frames(DRONES, MESSAGES)
+    print(f"[BENCH] {DRONES} drones x {RATE:g} Hz = {needed:,.0f} msg/s needed")
+    for name, fn in (("decode+ingest", bench_inprocess), ("tcp loopback", bench_loopback)):
+        rate = fn(msgs)
+        print(f"[BENCH] {name:14s}: {rate:10,.0f} msg/s  "
+              f"({rate / needed:.1f}x, ~{int(rate / RATE):,} drones at {RATE:g} Hz)")
@@ -0,0 +1,91 @@
+"""
+Ingest capacity of the dashboard's asyncio batched loop (fleet.run_async).
+
+Two measurements over TCP loopback:
+
+  capacity   publish a burst as fast as possible and time how long
+             the ingest takes to record all of it, batched (run_async)
+             versus one frame per wake-up (max_batch=1)
+  rates      pace the publisher at increasing rates and report the mean
+             batch size and ingest cost per sample: batches grow with
+             the rate, so the per-sample cost falls as load rises
+
+    python bench_ingest.py [drones]
+"""
+import asyncio
+import sys
+import threading
+import time
+import zmq
+import zmq.asyncio
+import telemetry_wire
+from fleet import Fleet, run_async
+
+DRONES = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+ENDPOINT = "tcp://127.0.0.1:5597"
+BURST = 100000
+RATES = (100, 1000, 10000, 50000)
+SECONDS = 2.0
+
+
+def frames(count):
+    return [telemetry_wire.encode({
+        "id": f"drone_{i % DRONES + 1}", "x": 1.0, "y": 2.0, "z": 3.0 + i % 7,
+        "vx": 0.5, "vy": -0.25, "vz": 0.1,
+    }) for i in range(count)]
+
+
+def consume(fleet, max_batch, expected, ready, out):
+    async def main():
+        ctx = zmq.asyncio.Context()
+        socket = telemetry_wire.subscriber(ctx, endpoint=ENDPOINT, rcvhwm=0)
+        await asyncio.sleep(0.3)           # let the subscription reach the publisher
+        ready.set()
+        cpu = time.thread_time()
+        await run_async(socket, fleet, max_batch,
+                        should_stop=lambda: fleet.stats["samples"] >= expected)
+        out["done"] = time.perf_counter()
+        out["cpu"] = time.thread_time() - cpu
+        socket.close(linger=0)
+        ctx.term()
+    asyncio.run(main())
+
+
+def run(pub, msgs, max_batch, rate=None):
+    fleet, ready, out = Fleet(), threading.Event(), {}
+    worker = threading.Thread(target=consume, args=(fleet, max_batch, len(msgs), ready, out))
+    worker.start()
+    ready.wait()
+    started = time.perf_counter()
+    if rate is None:
+        for frame in msgs:
+            pub.send(frame)
+    else:
+        tick, sent, next_tick = 0.005, 0, time.perf_counter()
+        while sent < len(msgs):
+            burst = msgs[sent:sent + max(1, int(rate * tick))]
+            for frame in burst:
+                pub.send(frame)
+            sent += len(burst)
+            next_tick += tick
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+    worker.join()
+    return fleet.ingest_stats(), out["done"] - started, out["cpu"]
+
+
+if __name__ == "__main__":
+    pub = telemetry_wire.publisher(zmq.Context.instance(), ENDPOINT, sndhwm=0)
+    burst = frames(BURST)
+
+    print(f"[BENCH] capacity, {BURST:,} frames from {DRONES} drones")
+    for label, max_batch in (("per-frame", 1), ("batched", 2000)):
+        stats, elapsed, cpu = run(pub, burst, max_batch)
+        print(f"  {label:9s}: {BURST / elapsed:9,.0f} msg/s, mean batch {stats['mean_batch']:7.1f}, "
+              f"ingest {stats['us_per_sample']:5.2f} us/sample")
+
+    print("[BENCH] paced publisher (batched)")
+    for rate in RATES:
+        count = int(rate * SECONDS)
+        stats, elapsed, cpu = run(pub, burst[:count], 2000, rate)
+        print(f"  {rate:6d} msg/s: mean batch {stats['mean_batch']:7.1f}, "
+              f"ingest {stats['us_per_sample']:6.2f} us/sample, consumer CPU {cpu / elapsed * 100:5.1f} %")
@@ -0,0 +1,41 @@
+"""
+Encode/decode benchmark for the telemetry wire formats.
+
+Reports messages per second (wall clock), CPU microseconds per message
+(process time) and bytes per frame for the binary and JSON payloads.
+
+    python bench_wire.py [messages]
+"""
+import sys
+import time
+import telemetry_wire
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+
+def sample_messages(count, n_drones=100):
+    return [{
+        "id": f"drone_{i % n_drones + 1}",
+        "x": 12.345 + i * 0.01, "y": -7.5 + i * 0.02, "z": 30.0 + (i % 50) * 0.1,
+        "vx": 1.25, "vy": -0.5, "vz": 0.05,
+    } for i in range(count)]
+
+
+def timed(fn, items):
+    wall, cpu = time.perf_counter(), time.process_time()
+    for item in items:
+        fn(item)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return len(items) / wall, cpu / len(items) * 1e6
+
+
+if __name__ == "__main__":
+    msgs = sample_messages(MESSAGES)
+    print(f"[BENCH] {MESSAGES:,} messages")
+    for wire_format in ("binary", "json"):
+        frames = [telemetry_wire.encode(m, wire_format) for m in msgs]
+        enc_rate, enc_cpu = timed(lambda m: telemetry_wire.encode(m, wire_format), msgs)
+        dec_rate, dec_cpu = timed(telemetry_wire.decode, frames)
+        size = sum(map(len, frames)) / len(frames)
+        print(f"[BENCH] {wire_format:6s}: encode {enc_rate:10,.0f} msg/s ({enc_cpu:5.2f} us CPU), "
+              f"decode {dec_rate:10,.0f} msg/s ({dec_cpu:5.2f} us CPU), {size:5.1f} B/frame")
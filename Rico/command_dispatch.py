@@ -0,0 +1,214 @@
+"""
+Background dispatcher for drone commands sent as HTTP webhooks.
+
+The voice bridge (Drone_bridge.py) must keep listening while a webhook is
+slow or down, so it only calls submit(), which never touches the network:
+the command goes on a bounded queue and a worker thread sends it over one
+pooled keep-alive session.
+
+    queue       at most COMMAND_QUEUE commands waiting; submit() returns
+                None instead of blocking when it is full
+    dedup       the same command again within COMMAND_DEDUP seconds of
+                the last one (queued or sent) is dropped, so a repeated
+                "take off" does not fire twice
+    timeouts    COMMAND_CONNECT_TIMEOUT / COMMAND_READ_TIMEOUT per attempt
+    retries     up to COMMAND_RETRIES more attempts with exponential
+                backoff, only when the request cannot have been acted on:
+                connection failures, 429 and 502-504. A read timeout may
+                mean the webhook already ran, so it is reported instead
+                of retried.
+    acks        every command gets an ID; status(id) and the on_result
+                callback report queued / acked / failed / unknown with the
+                HTTP status, attempts and latency
+
+Run `python command_dispatch.py` to exercise it against a local stub
+server (slow, failing and normal webhooks) without a drone or network.
+"""
+import collections
+import itertools
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+COMMAND_QUEUE = int(os.getenv("COMMAND_QUEUE", 8))
+COMMAND_DEDUP = float(os.getenv("COMMAND_DEDUP", 3.0))               # s
+COMMAND_CONNECT_TIMEOUT = float(os.getenv("COMMAND_CONNECT_TIMEOUT", 3.0))
+COMMAND_READ_TIMEOUT = float(os.getenv("COMMAND_READ_TIMEOUT", 10.0))
+COMMAND_RETRIES = int(os.getenv("COMMAND_RETRIES", 2))
+RETRY_BACKOFF = 0.5      # s before the first retry, doubled each time
+RETRY_STATUS = (429, 502, 503, 504)
+HISTORY = 100            # finished commands kept for status()
+IDLE_POLL = 0.2          # s the worker waits for a command before checking for close()
+
+
+class CommandDispatcher:
+    def __init__(self, urls, on_result=None, maxsize=COMMAND_QUEUE, dedup=COMMAND_DEDUP,
+                 timeout=(COMMAND_CONNECT_TIMEOUT, COMMAND_READ_TIMEOUT), retries=COMMAND_RETRIES):
+        self.urls = dict(urls)
+        self.on_result = on_result
+        self.dedup = dedup
+        self.timeout = timeout
+        self.retries = retries
+        self.queue = queue.Queue(maxsize)
+        self.session = requests.Session()
+        self.ids = itertools.count(1)
+        self.last_submit = {}                              # command -> monotonic time
+        self.results = collections.OrderedDict()           # id -> result dict
+        self.lock = threading.Lock()
+        self.closing = threading.Event()                   # close() called: finish the queue
+        self.stopped = threading.Event()                   # close() timed out: stop now
+        self.stats = {"submitted": 0, "duplicates": 0, "rejected": 0,
+                      "acked": 0, "failed": 0, "unknown": 0, "retries": 0}
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    # ------------------------------------------------------------
+    # Caller side (never blocks)
+    # ------------------------------------------------------------
+    def submit(self, command):
+        """Queue a command; returns its ID, or None if unknown, a duplicate or the queue is full."""
+        if command not in self.urls:
+            raise KeyError(f"no URL configured for command {command!r}")
+        now = time.monotonic()
+        with self.lock:
+            if self.closing.is_set():
+                self.stats["rejected"] += 1
+                return None
+            last = self.last_submit.get(command)
+            if last is not None and now - last < self.dedup:
+                self.stats["duplicates"] += 1
+                return None
+            command_id = next(self.ids)
+            result = {"id": command_id, "command": command, "state": "queued",
+                      "status": None, "attempts": 0, "latency_s": None, "error": None}
+            try:
+                self.queue.put_nowait((result, now))
+            except queue.Full:
+                self.stats["rejected"] += 1
+                return None
+            self.last_submit[command] = now
+            self.results[command_id] = result
+            while len(self.results) > HISTORY:
+                self.results.popitem(last=False)
+            self.stats["submitted"] += 1
+        return command_id
+
+    def status(self, command_id):
+        with self.lock:
+            result = self.results.get(command_id)
+            return dict(result) if result else None
+
+    def pending(self):
+        return self.queue.unfinished_tasks
+
+    def close(self, timeout=5.0):
+        """Let queued commands finish for up to timeout seconds, then stop;
+        whatever is still queued is reported as failed."""
+        self.closing.set()
+        self.worker.join(timeout)
+        self.stopped.set()
+        while True:
+            try:
+                result, submitted = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.finish(result, "failed", None, "dispatcher closed before sending", submitted)
+            self.queue.task_done()
+        self.session.close()
+
+    # ------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                result, submitted = self.queue.get(timeout=IDLE_POLL)
+            except queue.Empty:
+                if self.closing.is_set():
+                    return
+                continue
+            self.send(result, submitted)
+            self.queue.task_done()
+            if self.on_result is not None:
+                self.on_result(dict(result))
+
+    def send(self, result, submitted):
+        url = self.urls[result["command"]]
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                if self.stopped.wait(RETRY_BACKOFF * 2 ** (attempt - 1)):
+                    break
+            result["attempts"] = attempt + 1
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.ReadTimeout as e:
+                # Sent, but no answer: it may have run, so do not send it again
+                self.finish(result, "unknown", None, e, submitted)
+                return
+            except requests.RequestException as e:
+                result["error"] = str(e)
+                continue
+            if response.status_code in RETRY_STATUS:
+                result["status"] = response.status_code
+                continue
+            state = "acked" if response.ok else "failed"
+            self.finish(result, state, response.status_code, None, submitted)
+            return
+        self.finish(result, "failed", result["status"], result["error"], submitted)
+
+    def finish(self, result, state, status, error, submitted):
+        with self.lock:
+            result.update(state=state, status=status, error=None if error is None else str(error),
+                          latency_s=round(time.monotonic() - submitted, 3))
+            self.stats[state] += 1
+
+
+# ------------------------------------------------------------
+# Local stub webhook server
+# ------------------------------------------------------------
+class StubHandler(BaseHTTPRequestHandler):
+    """/ok answers at once, /slow after STUB_DELAY s, /flaky fails the first
+    two calls with 503, /down always answers 500."""
+    calls = collections.Counter()
+
+    def do_GET(self):
+        self.calls[self.path] += 1
+        if self.path == "/slow":
+            time.sleep(self.server.delay)
+        if self.path == "/flaky" and self.calls[self.path] <= 2:
+            self.send_response(503)
+        elif self.path == "/down":
+            self.send_response(500)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def stub_server(port=0, delay=2.0):
+    """Start the stub on localhost in a thread; returns (server, base URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    server, base = stub_server(delay=1.0)
+    urls = {name: f"{base}/{name}" for name in ("ok", "slow", "flaky", "down")}
+    dispatcher = CommandDispatcher(urls, on_result=lambda r: print(f"[DISPATCH] {r}"), dedup=1.0)
+    print(f"[DISPATCH] stub webhooks at {base}")
+
+    started = time.perf_counter()
+    ids = [dispatcher.submit(name) for name in ("slow", "ok", "ok", "flaky", "down")]
+    print(f"[DISPATCH] 5 submits took {(time.perf_counter() - started) * 1e3:.2f} ms, ids {ids}")
+    dispatcher.close(timeout=15.0)
+    print(f"[DISPATCH] {dispatcher.stats}")
+    server.shutdown()
@@ -0,0 +1,52 @@
+"""
+Dead reckoning for drone telemetry.
+
+Publisher and twin share one model: a drone keeps flying at the velocity
+of its last sample, so its position at time t is
+
+    x + v * (t - t_sample)      (extrapolation capped at DR_HORIZON)
+
+The publisher runs the same prediction the twin does and only sends a
+drone's sample when the prediction is off by more than DR_THRESHOLD
+metres, or DR_HEARTBEAT seconds after its last send so the twin knows it
+is still alive. The twin (fleet.Fleet.positions) and the dashboard
+page extrapolate between samples, so motion stays smooth at a fraction
+of the message rate.
+
+Run bench_deadreckon.py for bandwidth versus error.
+"""
+import os
+import numpy as np
+
+DR_THRESHOLD = float(os.getenv("DR_THRESHOLD", 0))      # m; 0 sends every sample
+DR_HEARTBEAT = float(os.getenv("DR_HEARTBEAT", 1.0))    # s between sends at the latest
+DR_HORIZON = 5.0         # s; past this a silent drone is held, not extrapolated
+
+
+def extrapolate(rows, dt):
+    """Positions (n, 3) of x y z vx vy vz rows (n, 6) after dt seconds (n,)."""
+    dt = np.clip(dt, 0.0, DR_HORIZON)
+    return rows[:, :3] + rows[:, 3:6] * dt[:, None]
+
+
+class DeadReckoningFilter:
+    """Publisher side: which drones need a frame this tick."""
+
+    def __init__(self, n, threshold=DR_THRESHOLD, heartbeat=DR_HEARTBEAT):
+        self.threshold = threshold
+        self.heartbeat = heartbeat
+        self.t = np.full(n, -np.inf)     # when each drone was last sent
+        self.rows = np.zeros((n, 6))     # what was sent, i.e. what the twin extrapolates
+        self.samples = 0
+        self.sent = 0
+
+    def update(self, t, rows):
+        """Mask of the drones whose rows (n, 6) must be sent at time t; records them as sent."""
+        age = t - self.t
+        error = np.sqrt(np.sum((rows[:, :3] - extrapolate(self.rows, age)) ** 2, axis=1))
+        send = (error > self.threshold) | (age >= self.heartbeat)
+        self.t[send] = t
+        self.rows[send] = rows[send]
+        self.samples += len(rows)
+        self.sent += int(send.sum())
+        return send
@@ -0,0 +1,91 @@
+"""
+Vectorised point-mass simulator for a fleet of drones.
+
+All N drones are stepped together as (N, 3) position and velocity
+arrays. Each drone flies a loop of random waypoints: a proportional
+controller asks for a velocity towards the current waypoint (capped at
+max_speed), the commanded acceleration is capped at max_accel, and a
+per-drone wind gust (Ornstein-Uhlenbeck noise) pushes it around through
+linear drag. Waypoints advance when a drone gets within arrive_radius.
+
+Run `python drone_sim.py` for steps per second against real time.
+"""
+import time
+import numpy as np
+
+
+class FleetSim:
+    def __init__(self, n, waypoints=5, area=100.0, altitude=(5.0, 40.0), max_speed=12.0,
+                 max_accel=4.0, gain=0.8, response=0.5, drag=0.3, wind_sigma=1.5, wind_tau=5.0,
+                 arrive_radius=2.0, seed=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.max_speed = max_speed
+        self.max_accel = max_accel
+        self.gain = gain
+        self.response = response     # s to reach the commanded velocity
+        self.drag = drag
+        self.wind_sigma = wind_sigma
+        self.wind_tau = wind_tau
+        self.arrive_radius = arrive_radius
+
+        low = np.array([0.0, 0.0, altitude[0]])
+        high = np.array([area, area, altitude[1]])
+        self.waypoints = self.rng.uniform(low, high, (n, waypoints, 3))
+        self.target = np.zeros(n, dtype=np.int64)
+        self.pos = self.rng.uniform(low * [1, 1, 0], high * [1, 1, 0], (n, 3))   # start on the ground
+        self.vel = np.zeros((n, 3))
+        self.wind = np.zeros((n, 3))
+        self.t = 0.0
+        self.rows = np.arange(n)
+
+    def step(self, dt):
+        """Advance every drone by dt seconds."""
+        goal = self.waypoints[self.rows, self.target]
+        to_goal = goal - self.pos
+        dist = np.sqrt(np.einsum("ij,ij->i", to_goal, to_goal))
+
+        # Waypoint reached: move on to the next one in the loop
+        arrived = dist < self.arrive_radius
+        self.target[arrived] = (self.target[arrived] + 1) % self.waypoints.shape[1]
+
+        v_cmd = self.gain * to_goal
+        v_cmd *= np.minimum(1.0, self.max_speed / np.maximum(np.sqrt(np.einsum("ij,ij->i", v_cmd, v_cmd)), 1e-9))[:, None]
+        accel = (v_cmd - self.vel) / self.response
+        accel *= np.minimum(1.0, self.max_accel / np.maximum(np.sqrt(np.einsum("ij,ij->i", accel, accel)), 1e-9))[:, None]
+
+        # Wind gusts: exact Ornstein-Uhlenbeck update, felt through drag
+        decay = np.exp(-dt / self.wind_tau)
+        self.wind = self.wind * decay + self.wind_sigma * np.sqrt(1 - decay ** 2) * self.rng.standard_normal((self.n, 3))
+        accel += self.drag * (self.wind - self.vel)
+
+        self.vel += accel * dt
+        self.pos += self.vel * dt
+        below = self.pos[:, 2] < 0.0
+        self.pos[below, 2] = 0.0
+        self.vel[below, 2] = np.maximum(self.vel[below, 2], 0.0)
+        self.t += dt
+
+    def state(self):
+        """(N, 6) rows of x y z vx vy vz."""
+        return np.hstack([self.pos, self.vel])
+
+
+def benchmark(sizes=(10, 100, 1000, 5000, 20000), rate=100.0, seconds=2.0):
+    """Simulated seconds per wall second for each fleet size at the given step rate."""
+    rows = []
+    for n in sizes:
+        sim = FleetSim(n, seed=0)
+        steps = int(rate * seconds)
+        started = time.perf_counter()
+        for _ in range(steps):
+            sim.step(1.0 / rate)
+        elapsed = time.perf_counter() - started
+        rows.append({"drones": n, "step_us": elapsed / steps * 1e6, "realtime_x": seconds / elapsed})
+    return rows
+
+
+if __name__ == "__main__":
+    print("[SIM] point-mass fleet, 100 Hz steps")
+    for row in benchmark():
+        print(f"  {row['drones']:6d} drones: {row['step_us']:8.1f} us/step, {row['realtime_x']:7.1f}x real time")
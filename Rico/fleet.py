@@ -0,0 +1,275 @@
+"""
+Per-drone telemetry state for the drone dashboard.
+
+The Fleet keeps one DroneTrack per drone ID seen on the bus: the latest
+display values (same keys the dashboard has always used) plus a
+TelemetryRingBuffer history and TelemetryRollup tiers for long flights.
+
+There is no lock. Exactly one ingest loop writes to the fleet; readers
+get the state dict (replaced on every update, never mutated) and history
+copies that TelemetryRingBuffer.read() checks against the writer. Writes
+from other threads, such as the dashboard's manual input, are queued
+with Fleet.submit() and applied by the ingest loop.
+
+Ingest loops (run exactly one):
+    run_async()   zmq.asyncio; drains frames in batches and computes
+                  derived fields for the whole batch with NumPy
+    run_ingest()  the same batching in a plain blocking thread
+    run_latest()  newest frame per drone at DISPLAY_RATE, for displays
+"""
+import asyncio
+import collections
+import os
+import time
+import numpy as np
+import zmq
+import zmq.asyncio
+from telemetry_buffer import TelemetryRingBuffer, MONOTONIC_TO_WALL
+from telemetry_rollup import TelemetryRollup
+from dead_reckoning import extrapolate
+import telemetry_wire
+
+# Per-drone history; 3000 samples is 60 s at 50 Hz
+FLEET_HISTORY_CAPACITY = int(os.getenv("FLEET_HISTORY_CAPACITY", 3000))
+DISPLAY_RATE = float(os.getenv("DISPLAY_RATE", 20))     # Hz, for run_latest()
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", 2000))     # max frames per ingest batch
+IDLE_POLL_MS = 100       # how often an idle loop applies submitted samples
+BAD_FRAME_REPORT = 1000  # print every this many undecodable frames
+
+
+def derive(rows):
+    """(n, 6) x y z vx vy vz rows -> (n, 7) history rows with speed appended."""
+    values = np.empty((len(rows), 7))
+    values[:, :6] = rows
+    values[:, 6] = np.sqrt(np.einsum("ij,ij->i", values[:, 3:6], values[:, 3:6]))
+    return values
+
+
+class DroneTrack:
+    def __init__(self, drone_id, capacity=FLEET_HISTORY_CAPACITY):
+        self.id = drone_id
+        self.state = {"altitude": 0.0, "speed": 0.0, "latitude": 0.0, "longitude": 0.0}
+        self.history = TelemetryRingBuffer(capacity)
+        self.rollup = TelemetryRollup()
+        self.messages = 0
+        self.last_seen = None
+        self.fix = None                  # (t, x y z vx vy vz) of the newest sample
+
+    def record(self, t, values):
+        """Append history rows (n, 7) and publish the newest as state (writer only)."""
+        if len(t) == 1:
+            self.history.append(t[0], values[0])
+        else:
+            self.history.extend(t, values)
+        self.rollup.extend(t, values)
+        x, y, z, _, _, _, speed = values[-1].tolist()
+        self.state = {"altitude": z, "speed": speed, "latitude": x, "longitude": y}
+        self.fix = (float(t[-1]), values[-1, :6].copy())
+        self.messages += len(t)
+        self.last_seen = float(t[-1])
+
+    def summary(self, now):
+        return {
+            "id": self.id,
+            **self.state,
+            "messages": self.messages,
+            "age_s": None if self.last_seen is None else round(now - self.last_seen, 3),
+        }
+
+
+class Fleet:
+    def __init__(self, capacity=FLEET_HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.tracks = {}
+        self.submitted = collections.deque()
+        self.consumers = []          # callables (drone_id, t, values) run after each record
+        self.tracer = None           # telemetry_trace.Tracer for bus/ingest latency
+        self.stats = {"frames": 0, "samples": 0, "batches": 0, "max_batch": 0, "busy_s": 0.0,
+                      "bad_frames": 0}
+
+    def track(self, drone_id):
+        """Track for a drone, created on first use (writer only)."""
+        track = self.tracks.get(drone_id)
+        if track is None:
+            track = self.tracks[drone_id] = DroneTrack(drone_id, self.capacity)
+        return track
+
+    def record(self, drone_id, t, values):
+        """Append rows to a drone's track and hand them to the consumers (writer only)."""
+        self.track(drone_id).record(t, values)
+        for consumer in self.consumers:
+            consumer(drone_id, t, values)
+
+    def get(self, drone_id):
+        return self.tracks.get(drone_id)
+
+    def ids(self):
+        return sorted(list(self.tracks))
+
+    def positions(self, now=None):
+        """Drone IDs and (N, 3) x y z positions dead-reckoned to now.
+
+        Publishers that send on prediction error (dead_reckoning.py) go
+        quiet while a drone flies straight, so the newest sample alone lags.
+        """
+        now = time.monotonic() if now is None else now
+        fixes = [(d, self.tracks[d].fix) for d in self.ids()]
+        fixes = [(d, fix) for d, fix in fixes if fix is not None]
+        if not fixes:
+            return [], np.empty((0, 3))
+        t = np.array([fix[0] for _, fix in fixes])
+        rows = np.array([fix[1] for _, fix in fixes])
+        return [d for d, _ in fixes], extrapolate(rows, now - t)
+
+    # ------------------------------------------------------------
+    # Writer side
+    # ------------------------------------------------------------
+    def ingest_frames(self, frames, now=None):
+        """Decode a batch of frames and record every sample in it.
+
+        Rows from all frames are stacked so the derived fields are computed
+        once per batch, then appended to each drone's history in one call.
+        """
+        started = time.perf_counter()
+        now = time.monotonic() if now is None else now
+        by_drone = {}
+        stamps, rows, sent = [], [], []
+        for frame in frames:
+            try:
+                drone_id, wall, values, trace = telemetry_wire.decode_values(frame)
+            except telemetry_wire.FRAME_ERRORS as exc:
+                self.bad_frame(frame, exc)
+                continue
+            if trace is not None and self.tracer is not None:
+                self.tracer.sequence.observe(drone_id, trace[0])
+                sent.append(trace[1])
+            first = len(rows)
+            rows.extend(values)
+            # Batched samples carry the publisher's wall-clock stamps
+            stamps.extend([now] * len(values) if wall is None else [w - MONOTONIC_TO_WALL for w in wall])
+            by_drone.setdefault(drone_id, []).extend(range(first, len(rows)))
+        if rows:
+            t = np.array(stamps)
+            values = derive(np.array(rows))
+            for drone_id, idx in by_drone.items():
+                self.record(drone_id, t[idx], values[idx])
+        self.apply_submitted()
+        if sent:
+            self.tracer.stage("bus").add(now - np.array(sent))
+            self.tracer.stage("ingest").add(np.full(len(sent), time.monotonic() - now))
+
+        self.stats["frames"] += len(frames)
+        self.stats["samples"] += len(rows)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(frames))
+        self.stats["busy_s"] += time.perf_counter() - started
+
+    def bad_frame(self, frame, exc):
+        """Count a frame that failed to decode; the rest of its batch still goes in."""
+        self.stats["bad_frames"] += 1
+        if self.stats["bad_frames"] % BAD_FRAME_REPORT == 1:
+            print(f"[FLEET] Skipping undecodable frame ({self.stats['bad_frames']} so far): "
+                  f"{type(exc).__name__}: {exc} in {frame[:40]!r}")
+
+    def ingest(self, drone_id, msg, t=None):
+        """Record one decoded message (single-threaded tools and benchmarks)."""
+        t = time.monotonic() if t is None else t
+        row = [[msg["x"], msg["y"], msg["z"], msg["vx"], msg["vy"], msg["vz"]]]
+        self.record(drone_id, np.array([t]), derive(row))
+
+    def ingest_latest(self, frames, superseded=None):
+        """Newest frame per drone ({drone_id bytes: frame}).
+
+        superseded counts the older frames dropped per drone, so sequence
+        tracking books them as conflated rather than lost.
+        """
+        if superseded and self.tracer is not None:
+            for drone_id, count in superseded.items():
+                self.tracer.sequence.skip(drone_id.decode(), count)
+        self.ingest_frames(list(frames.values()))
+
+    def submit(self, drone_id, row, t=None):
+        """Queue a full history row (x y z vx vy vz speed) from any thread."""
+        self.submitted.append((drone_id, time.monotonic() if t is None else t, row))
+
+    def apply_submitted(self):
+        while self.submitted:
+            drone_id, t, row = self.submitted.popleft()
+            self.record(drone_id, np.array([t]), np.array([row], dtype=np.float64))
+
+    # ------------------------------------------------------------
+    # Reader side
+    # ------------------------------------------------------------
+    def summary(self):
+        now = time.monotonic()
+        return [self.tracks[d].summary(now) for d in self.ids()]
+
+    def ingest_stats(self):
+        stats = dict(self.stats)
+        stats["mean_batch"] = round(stats["frames"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["us_per_sample"] = round(stats["busy_s"] / stats["samples"] * 1e6, 2) if stats["samples"] else 0.0
+        return stats
+
+
+def drain(socket, limit):
+    """Frames already queued on a (sync) socket, up to limit."""
+    frames = []
+    while len(frames) < limit:
+        try:
+            frames.append(socket.recv(zmq.NOBLOCK))
+        except zmq.Again:
+            break
+    return frames
+
+
+async def run_async(socket, fleet, max_batch=INGEST_BATCH, should_stop=lambda: False):
+    """asyncio ingest on a zmq.asyncio SUB socket.
+
+    Waits for the socket to become readable, then drains everything queued
+    (up to max_batch frames) through a synchronous shadow socket, so one
+    wake-up handles a whole burst and batches grow with the message rate.
+    """
+    sync = zmq.Socket.shadow(socket.underlying)
+    while not should_stop():
+        if not await socket.poll(IDLE_POLL_MS):
+            fleet.apply_submitted()
+            continue
+        fleet.ingest_frames(drain(sync, max_batch))
+
+
+def run_ingest(socket, fleet, max_batch=INGEST_BATCH, should_stop=lambda: False):
+    """Blocking-thread version of run_async() on a plain SUB socket."""
+    while not should_stop():
+        if not socket.poll(IDLE_POLL_MS):
+            fleet.apply_submitted()
+            continue
+        fleet.ingest_frames(drain(socket, max_batch))
+
+
+def run_latest(socket, fleet, rate=DISPLAY_RATE, should_stop=lambda: False):
+    """Display loop: every 1/rate s, drain the socket and keep each drone's newest frame.
+
+    Superseded frames are only split at the topic, never decoded.
+    """
+    period = 1.0 / rate
+    while not should_stop():
+        if not socket.poll(IDLE_POLL_MS):
+            fleet.apply_submitted()
+            continue
+        started = time.monotonic()
+        latest, superseded = {}, collections.Counter()
+        for frame in drain(socket, float("inf")):
+            drone_id = frame.partition(telemetry_wire.SEPARATOR)[0]
+            if drone_id in latest:
+                superseded[drone_id] += 1
+            latest[drone_id] = frame
+        fleet.ingest_latest(latest, superseded)
+        time.sleep(max(0.0, started + period - time.monotonic()))
+
+
+def start_async(fleet, socket_factory):
+    """Run run_async() on its own event loop; socket_factory(ctx) makes the SUB socket."""
+    async def main():
+        ctx = zmq.asyncio.Context()
+        await run_async(socket_factory(ctx), fleet)
+    asyncio.run(main())
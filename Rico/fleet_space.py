@@ -0,0 +1,187 @@
+"""
+Spatial queries over the fleet's latest positions.
+
+SpatialGrid buckets drones into cubic cells (cell size = the query radius
+it is built for) by sorting them on a packed integer cell key. A cell's
+drones are then one contiguous run of the sorted order, found with
+searchsorted, so building is O(N log N) and close-pair search only looks
+at neighbouring cells instead of all N^2 pairs. The grid is rebuilt from
+scratch every tick.
+
+SeparationMonitor uses it to find pairs closer than a separation minimum
+and keeps a numbered event log (alert / clear) for streaming.
+
+Run `python fleet_space.py` to compare against the all-pairs check.
+"""
+import collections
+import itertools
+import time
+import numpy as np
+
+CELL_BITS = 20                      # cell coordinates packed 20 bits per axis
+CELL_BIAS = 1 << (CELL_BITS - 1)
+# Own cell plus half of the 26 neighbours: every neighbouring cell pair once
+HALF_OFFSETS = np.array([o for o in itertools.product((-1, 0, 1), repeat=3) if o > (0, 0, 0)] + [(0, 0, 0)])
+
+
+def cell_keys(cells):
+    c = cells + CELL_BIAS
+    return (c[:, 0] << (2 * CELL_BITS)) | (c[:, 1] << CELL_BITS) | c[:, 2]
+
+
+def expand(starts, counts):
+    """Concatenation of the ranges [start, start + count) as one index array."""
+    total = int(counts.sum())
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(total) - offsets
+
+
+class SpatialGrid:
+    def __init__(self, ids, positions, cell):
+        self.ids = list(ids)
+        self.pos = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self.cell = float(cell)
+        self.cells = np.floor(self.pos / self.cell).astype(np.int64)
+        keys = cell_keys(self.cells)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        self.index = {drone_id: i for i, drone_id in enumerate(self.ids)}
+
+    def _members(self, keys):
+        """Drone indices in the given cells."""
+        lo = np.searchsorted(self.keys, keys, side="left")
+        hi = np.searchsorted(self.keys, keys, side="right")
+        return self.order[expand(lo, hi - lo)]
+
+    def within(self, point, radius):
+        """(indices, distances) of drones within radius of a point, nearest first."""
+        point = np.asarray(point, dtype=np.float64)
+        candidates = self._candidates(point, radius)
+        dist = np.sqrt(np.sum((self.pos[candidates] - point) ** 2, axis=1))
+        keep = dist <= radius
+        order = np.argsort(dist[keep])
+        return candidates[keep][order], dist[keep][order]
+
+    def _candidates(self, point, radius):
+        """Drones in the cells a radius around point touches; all drones once
+        those cells outnumber them, so a wide query stays O(N)."""
+        lo = np.floor((point - radius) / self.cell).astype(np.int64)
+        hi = np.floor((point + radius) / self.cell).astype(np.int64)
+        if np.prod((hi - lo + 1).astype(np.float64)) > len(self.ids):
+            return np.arange(len(self.ids))
+        grid = np.stack(np.meshgrid(*[np.arange(a, b + 1) for a, b in zip(lo, hi)], indexing="ij"), -1)
+        return self._members(cell_keys(grid.reshape(-1, 3)))
+
+    def nearest(self, point, k=1, exclude=None):
+        """k nearest drones to a point, searching outwards one radius doubling at a time
+        until the search covers more cells than there are drones, then checking all."""
+        point = np.asarray(point, dtype=np.float64)
+        k = min(k, len(self.ids) - (exclude is not None))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        radius = self.cell
+        while True:
+            idx = self._candidates(point, radius)
+            everyone = len(idx) == len(self.ids)
+            dist = np.sqrt(np.sum((self.pos[idx] - point) ** 2, axis=1))
+            if not everyone:
+                keep = dist <= radius
+                idx, dist = idx[keep], dist[keep]
+            if exclude is not None:
+                keep = idx != exclude
+                idx, dist = idx[keep], dist[keep]
+            if everyone or len(idx) >= k:
+                order = np.argsort(dist, kind="stable")[:k]
+                return idx[order], dist[order]
+            radius *= 2
+
+    def pairs(self, radius):
+        """All pairs (i, j, distance) closer than radius; radius must not exceed the cell size."""
+        if radius > self.cell:
+            raise ValueError("radius larger than the grid cell")
+        found_i, found_j = [], []
+        for offset in HALF_OFFSETS:
+            neighbour = cell_keys(self.cells + offset)
+            lo = np.searchsorted(self.keys, neighbour, side="left")
+            hi = np.searchsorted(self.keys, neighbour, side="right")
+            counts = hi - lo
+            i = np.repeat(np.arange(len(self.ids)), counts)
+            j = self.order[expand(lo, counts)]
+            if not offset.any():
+                keep = i < j             # same cell: each pair once, no self pairs
+                i, j = i[keep], j[keep]
+            found_i.append(i)
+            found_j.append(j)
+        i = np.concatenate(found_i)
+        j = np.concatenate(found_j)
+        dist = np.sqrt(np.sum((self.pos[i] - self.pos[j]) ** 2, axis=1))
+        close = dist < radius
+        return i[close], j[close], dist[close]
+
+
+class SeparationMonitor:
+    """Tracks pairs of drones closer than min_separation from tick to tick."""
+
+    def __init__(self, min_separation, history=1000):
+        self.min_separation = min_separation
+        self.active = {}                       # (id_a, id_b) -> latest distance
+        self.events = collections.deque(maxlen=history)
+        self.seq = 0                           # events ever logged
+        self.last_tick = {"drones": 0, "pairs": 0, "ms": 0.0}
+
+    def tick(self, ids, positions, t=None):
+        """Check one set of positions; log alert/clear events. Returns the grid."""
+        started = time.perf_counter()
+        t = time.time() if t is None else t
+        grid = SpatialGrid(ids, positions, self.min_separation)
+        i, j, dist = grid.pairs(self.min_separation)
+
+        now = {}
+        for a, b, d in zip(i.tolist(), j.tolist(), dist.tolist()):
+            pair = tuple(sorted((grid.ids[a], grid.ids[b])))
+            now[pair] = round(d, 3)
+        for pair in now.keys() - self.active.keys():
+            self.log("alert", pair, now[pair], t)
+        for pair in self.active.keys() - now.keys():
+            self.log("clear", pair, self.active[pair], t)
+        self.active = now
+        self.last_tick = {"drones": len(grid.ids), "pairs": len(now),
+                          "ms": round((time.perf_counter() - started) * 1e3, 3)}
+        return grid
+
+    def log(self, kind, pair, distance, t):
+        self.events.append({"seq": self.seq, "type": kind, "drones": list(pair),
+                            "distance": distance, "t": t})
+        self.seq += 1
+
+    def events_after(self, seq):
+        """Logged events numbered seq and later (the oldest may have been dropped)."""
+        return [e for e in list(self.events) if e["seq"] >= seq]
+
+    def conflicts(self):
+        return [{"drones": list(pair), "distance": d} for pair, d in sorted(self.active.items())]
+
+
+def brute_force_pairs(positions, radius):
+    diff = positions[:, None, :] - positions[None, :, :]
+    dist = np.sqrt(np.sum(diff ** 2, axis=2))
+    i, j = np.nonzero(np.triu(dist < radius, k=1))
+    return i, j
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    radius = 5.0
+    print(f"[SPACE] close pairs under {radius} m, drones spread over 1 km x 1 km x 100 m")
+    for n in (100, 500, 2000, 10000, 50000):
+        pos = rng.uniform([0, 0, 0], [1000, 1000, 100], (n, 3))
+        started = time.perf_counter()
+        grid = SpatialGrid(range(n), pos, radius)
+        i, j, _ = grid.pairs(radius)
+        grid_ms = (time.perf_counter() - started) * 1e3
+        line = f"  {n:6d} drones: grid {grid_ms:8.2f} ms ({len(i)} pairs)"
+        if n <= 2000:
+            started = time.perf_counter()
+            bi, _ = brute_force_pairs(pos, radius)
+            line += f", all-pairs {(time.perf_counter() - started) * 1e3:8.2f} ms ({len(bi)} pairs)"
+        print(line)
@@ -0,0 +1,276 @@
+"""
+On-disk flight store for drone telemetry.
+
+Each flight gets a directory under FLIGHTS_DIR:
+
+    <flight_id>/meta.json          drone ID and start time
+    <flight_id>/index.jsonl        one line per segment: file, t_start, t_end, rows
+    <flight_id>/seg_000000.npy     float64 array shaped (columns, rows)
+
+Segments are append-only and cover at most SEGMENT_SECONDS. The active
+segment is buffered in memory and written as a whole when it closes, so
+every column of a closed segment is one contiguous run in its file.
+Range reads use the index to pick the overlapping segments, memory-map
+just those, and binary-search the time column, so nothing outside the
+range is read.
+
+A drone's flight ends after FLIGHT_GAP seconds without samples; its next
+sample starts a new flight. expire() closes such flights without waiting
+for that sample.
+
+The ingest loop must not wait on the store's lock or on disk, so it only
+calls submit(), which queues the samples without a lock (like
+Fleet.submit()). A writer thread started with start() applies the queue
+every FLIGHT_WRITE_PERIOD seconds, writes closed segments and expires
+idle flights; reads see samples once the writer has applied them. The
+queue holds at most FLIGHT_QUEUE blocks; beyond that the oldest are
+dropped and counted, so a stalled writer cannot grow it without bound.
+Disk errors are logged and counted per flight and the writer carries on.
+"""
+import bisect
+import collections
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from telemetry_buffer import FIELDS
+
+FLIGHTS_DIR = os.getenv("FLIGHTS_DIR", "flights")
+SEGMENT_SECONDS = float(os.getenv("SEGMENT_SECONDS", 10))
+FLIGHT_GAP = float(os.getenv("FLIGHT_GAP", 30))
+FLIGHT_WRITE_PERIOD = float(os.getenv("FLIGHT_WRITE_PERIOD", 0.5))    # s between writer passes
+FLIGHT_QUEUE = int(os.getenv("FLIGHT_QUEUE", 100000))   # submitted blocks waiting for the writer
+EXPIRE_PERIOD = 5.0      # s between expire() passes of the writer thread
+ERROR_REPORT = 100       # print every this many write errors
+COLUMNS = ("t",) + FIELDS          # t is wall-clock seconds
+# Drone IDs come off the bus and flight IDs from URLs: only these characters reach a path
+UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_-]")
+FLIGHT_ID = re.compile(r"[A-Za-z0-9_-]{1,100}")
+
+
+def flight_dir(root, flight_id):
+    """Directory of a flight; FileNotFoundError for IDs that are not plain names."""
+    if not FLIGHT_ID.fullmatch(flight_id):
+        raise FileNotFoundError(flight_id)
+    return os.path.join(root, flight_id)
+
+
+class ActiveFlight:
+    """Writer state for a drone's current flight."""
+
+    def __init__(self, root, drone_id, t0):
+        self.flight_id = (f"{UNSAFE_CHARS.sub('_', drone_id)[:64]}"
+                          f"_{time.strftime('%Y%m%d-%H%M%S', time.localtime(t0))}"
+                          f"-{int(t0 * 1000) % 1000:03d}")
+        self.path = flight_dir(root, self.flight_id)
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"flight_id": self.flight_id, "drone": drone_id, "started": t0}, f)
+        self.drone = drone_id
+        self.started = t0
+        self.segments = 0
+        self.blocks = []             # (columns, n) arrays of the open segment
+        self.segment_start = None
+        self.last_t = t0
+
+    def append(self, t, values):
+        block = np.vstack([t, values.T])
+        if self.segment_start is None:
+            self.segment_start = t[0]
+        self.blocks.append(block)
+        self.last_t = t[-1]
+        if self.last_t - self.segment_start >= SEGMENT_SECONDS:
+            self.flush()
+
+    def pending(self):
+        return np.hstack(self.blocks) if self.blocks else np.empty((len(COLUMNS), 0))
+
+    def flush(self):
+        """Write the open segment and index it."""
+        if not self.blocks:
+            return
+        data = self.pending()
+        name = f"seg_{self.segments:06d}.npy"
+        np.save(os.path.join(self.path, name), data)
+        with open(os.path.join(self.path, "index.jsonl"), "a") as f:
+            f.write(json.dumps({"file": name, "t_start": data[0, 0], "t_end": data[0, -1],
+                                "rows": data.shape[1]}) + "\n")
+        self.segments += 1
+        self.blocks = []
+        self.segment_start = None
+
+
+class FlightStore:
+    def __init__(self, root=FLIGHTS_DIR):
+        self.root = root
+        self.active = {}             # drone_id -> ActiveFlight
+        self.lock = threading.Lock()
+        self.incoming = collections.deque(maxlen=FLIGHT_QUEUE)   # (drone_id, t, values) from submit()
+        self.stopped = threading.Event()
+        self.writer = None
+        self.stats = {"dropped": 0, "errors": 0}
+        # The directory is created with the first flight, so a disabled store leaves no trace
+
+    # ------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------
+    def submit(self, drone_id, t, values):
+        """Queue samples for the writer thread; never blocks (any thread)."""
+        if len(self.incoming) == self.incoming.maxlen:
+            self.stats["dropped"] += 1           # the deque drops the oldest on append
+        self.incoming.append((drone_id, t, values))
+
+    def start(self, period=FLIGHT_WRITE_PERIOD):
+        """Start the writer thread that applies submitted samples."""
+        self.writer = threading.Thread(target=self.run, args=(period,), daemon=True)
+        self.writer.start()
+
+    def run(self, period):
+        last_expire = time.monotonic()
+        while not self.stopped.wait(period):
+            self.write_submitted()
+            if time.monotonic() - last_expire >= EXPIRE_PERIOD:
+                self.expire()
+                last_expire = time.monotonic()
+
+    def write_submitted(self):
+        """Apply everything queued by submit() under one lock."""
+        if not self.incoming:
+            return
+        with self.lock:
+            while self.incoming:
+                drone_id, t, values = self.incoming.popleft()
+                try:
+                    self._append(drone_id, t, values)
+                except (OSError, ValueError) as exc:
+                    self.failed(drone_id, exc)
+
+    def failed(self, drone_id, exc):
+        """Count and log a write error; the writer carries on with the next flight."""
+        self.stats["errors"] += 1
+        if self.stats["errors"] % ERROR_REPORT == 1:
+            print(f"[FLIGHTS] Write error for {drone_id!r} ({self.stats['errors']} so far): {exc}")
+
+    def append(self, drone_id, t, values):
+        """Record samples now: t (n,) wall-clock, values (n, FIELDS)."""
+        with self.lock:
+            self._append(drone_id, t, values)
+
+    def _append(self, drone_id, t, values):
+        flight = self.active.get(drone_id)
+        if flight is not None and t[0] - flight.last_t > FLIGHT_GAP:
+            del self.active[drone_id]
+            try:
+                flight.flush()
+            except OSError as exc:
+                self.failed(drone_id, exc)       # its unwritten rows are lost
+            flight = None
+        if flight is None:
+            flight = self.active[drone_id] = ActiveFlight(self.root, drone_id, float(t[0]))
+        flight.append(np.asarray(t, dtype=np.float64), np.asarray(values, dtype=np.float64))
+
+    def expire(self, now=None):
+        """Flush and close flights that have been idle for FLIGHT_GAP."""
+        now = time.time() if now is None else now
+        with self.lock:
+            for drone_id, flight in list(self.active.items()):
+                if now - flight.last_t > FLIGHT_GAP:
+                    try:
+                        flight.flush()
+                    except OSError as exc:
+                        self.failed(drone_id, exc)
+                        continue
+                    del self.active[drone_id]
+
+    def close(self):
+        """Stop the writer thread and write everything out."""
+        self.stopped.set()
+        if self.writer is not None:
+            self.writer.join()
+        self.write_submitted()
+        with self.lock:
+            for drone_id, flight in self.active.items():
+                try:
+                    flight.flush()
+                except OSError as exc:
+                    self.failed(drone_id, exc)
+            self.active.clear()
+
+    # ------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------
+    def index(self, flight_id):
+        path = os.path.join(flight_dir(self.root, flight_id), "index.jsonl")
+        if not os.path.isfile(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def meta(self, flight_id):
+        path = os.path.join(flight_dir(self.root, flight_id), "meta.json")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(flight_id)
+        with open(path) as f:
+            return json.load(f)
+
+    def flights(self):
+        """Summary of every stored flight, newest first."""
+        out = []
+        with self.lock:
+            live = {f.flight_id: f for f in self.active.values()}
+        if not os.path.isdir(self.root):
+            return out
+        for flight_id in os.listdir(self.root):
+            try:
+                info = self.meta(flight_id)
+            except (FileNotFoundError, ValueError):
+                continue
+            segments = self.index(flight_id)
+            info["segments"] = len(segments)
+            info["rows"] = sum(s["rows"] for s in segments)
+            info["ended"] = segments[-1]["t_end"] if segments else info["started"]
+            info["active"] = flight_id in live
+            if info["active"]:
+                info["ended"] = live[flight_id].last_t
+                info["rows"] += live[flight_id].pending().shape[1]
+            info["duration_s"] = round(info["ended"] - info["started"], 3)
+            out.append(info)
+        return sorted(out, key=lambda f: f["started"], reverse=True)
+
+    def read(self, flight_id, t_from=None, t_to=None):
+        """Columns of a flight between two times (seconds from its start).
+
+        Returns (meta, data) with data shaped (columns, rows).
+        """
+        info = self.meta(flight_id)
+        lo = -np.inf if t_from is None else info["started"] + t_from
+        hi = np.inf if t_to is None else info["started"] + t_to
+        # Index and open segment together, so a flush in between cannot hide rows
+        with self.lock:
+            segments = self.index(flight_id)
+            live = next((f for f in self.active.values() if f.flight_id == flight_id), None)
+            pending = live.pending() if live is not None else None
+
+        # Segments are in time order: skip straight to the first that can overlap
+        first = bisect.bisect_left([s["t_end"] for s in segments], lo)
+        parts = []
+        for seg in segments[first:]:
+            if seg["t_start"] > hi:
+                break
+            data = np.load(os.path.join(flight_dir(self.root, flight_id), os.path.basename(seg["file"])),
+                           mmap_mode="r")
+            parts.append(slice_time(data, lo, hi))
+        if pending is not None:
+            parts.append(slice_time(pending, lo, hi))
+        data = np.hstack(parts) if parts else np.empty((len(COLUMNS), 0))
+        return info, data
+
+
+def slice_time(data, lo, hi):
+    """Columns of a (columns, rows) segment with lo <= t <= hi, copied out of the map."""
+    t = data[0]
+    start = np.searchsorted(t, lo, side="left")
+    end = np.searchsorted(t, hi, side="right")
+    return np.array(data[:, start:end])
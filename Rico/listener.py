@@ -1,10 +1,37 @@
+import time
 import zmq
+import telemetry_wire
+from telemetry_trace import Tracer
+
+REPORT_EVERY = 5.0       # s between latency / gap reports
+BAD_FRAME_REPORT = 1000  # print every this many undecodable frames
 
 ctx = zmq.Context()
-socket = ctx.socket(zmq.SUB)
-socket.connect("tcp://localhost:5556")
-socket.setsockopt_string(zmq.SUBSCRIBE, "")
+# DRONE_IDS=drone_1,drone_2 to listen to part of the fleet; TELEMETRY_RCVHWM applies too
+socket = telemetry_wire.subscriber(ctx, telemetry_wire.drone_ids_from_env())
 
+tracer = Tracer()
+bad_frames = 0
+next_report = time.monotonic() + REPORT_EVERY
 while True:
-    message = socket.recv_json()
-    print(f"Received: {message}")
+    frame = socket.recv()
+    received = time.monotonic()
+    try:
+        drone_id, message = telemetry_wire.decode(frame)
+        if "seq" in message:
+            tracer.sequence.observe(drone_id, int(message["seq"]))
+            tracer.stage("bus").add(received - float(message["t_sent"]))
+    except telemetry_wire.FRAME_ERRORS as exc:
+        bad_frames += 1
+        if bad_frames % BAD_FRAME_REPORT == 1:
+            print(f"[LISTENER] Skipping undecodable frame ({bad_frames} so far): "
+                  f"{type(exc).__name__}: {exc} in {frame[:40]!r}")
+        continue
+    print(f"Received [{drone_id}]: {message}")
+    if received >= next_report:
+        next_report = received + REPORT_EVERY
+        bus, seq = tracer.stage("bus").summary(), tracer.sequence.summary()
+        if bus["count"]:
+            print(f"[LISTENER] bus p50 {bus['p50_ms']} ms, p99 {bus['p99_ms']} ms, max {bus['max_ms']} ms; "
+                  f"{seq['received']} received, {seq['lost']} lost in {seq['gaps']} gaps, "
+                  f"{seq['reordered']} reordered, {seq['duplicates']} duplicates, {bad_frames} bad frames")
@@ -0,0 +1,347 @@
+"""
+Load generator for the drone telemetry stack, entirely on localhost.
+
+Starts the stack as subprocesses (twin_agent publisher, Flask_v3
+dashboard, ws_gateway), connects a pool of simulated dashboard clients,
+lets everything warm up, then measures for a fixed time:
+
+    ingest      samples/s recorded by the dashboard and sequence gaps
+                (from its /metrics endpoint)
+    latency     histograms per client kind:
+                  sse  sample recorded -> delta received from /stream
+                  ws   publisher send  -> update received from the gateway
+                plus the dashboard's own bus/ingest/emit percentiles
+    resources   CPU % and peak RSS per process, read from /proc (Linux)
+
+SSE clients spread over the fleet, one drone each, like the dashboard
+page does; WebSocket clients get the whole fleet unless --ws-rate limits
+them. The clients run in this process, so on a small machine they compete
+with the stack for CPU: watch the loadgen line in the resource table.
+
+This replaces run_drone_dashboard.sh's manual startup for perf runs:
+
+    python loadgen.py --drones 50 --rate 50 --sse 5 --ws 10 --seconds 20
+    python loadgen.py --format json --batch 10 --mode latest
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import requests
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+LATENCY_BINS_MS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, np.inf)
+
+
+# ------------------------------------------------------------
+# Stack processes
+# ------------------------------------------------------------
+class Service:
+    """One stack process, started in its own process group so any children
+    (such as Flask's reloader) are measured and stopped with it."""
+
+    def __init__(self, name, script, env, log_dir=None):
+        self.name = name
+        out = open(os.path.join(log_dir, f"{name}.log"), "w") if log_dir else subprocess.DEVNULL
+        self.proc = subprocess.Popen([sys.executable, script], cwd=HERE, env={**os.environ, **env},
+                                     stdout=out, stderr=subprocess.STDOUT, start_new_session=True)
+
+    def pids(self):
+        group = str(self.proc.pid)
+        return [pid for pid in proc_pids() if (proc_stat(pid) or [None] * 3)[2] == group]
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def stop(self):
+        if not self.alive():
+            return
+        os.killpg(self.proc.pid, signal.SIGINT)
+        try:
+            self.proc.wait(5)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+            self.proc.wait()
+
+
+def proc_pids():
+    return [int(p) for p in os.listdir("/proc") if p.isdigit()]
+
+
+def proc_stat(pid):
+    """Fields of /proc/<pid>/stat after the command name (state, ppid, pgrp, ...)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rpartition(")")[2].split()
+    except OSError:
+        return None
+
+
+def usage(pids):
+    """(CPU seconds, RSS in MB) summed over processes."""
+    cpu, rss_kb = 0.0, 0
+    for pid in pids:
+        fields = proc_stat(pid)
+        if fields:
+            cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS     # utime + stime
+            rss_kb += int(fields[21]) * PAGE_KB
+    return cpu, rss_kb / 1024
+
+
+class ResourceMonitor(threading.Thread):
+    """Samples CPU and peak RSS of every service (and this process) once a second."""
+
+    def __init__(self, services):
+        super().__init__(daemon=True)
+        self.services = services
+        self.peak = {}
+        self.running = True
+
+    def groups(self):
+        groups = {s.name: s.pids() for s in self.services}
+        groups["loadgen"] = [os.getpid()]
+        return groups
+
+    def snapshot(self):
+        return {name: usage(pids)[0] for name, pids in self.groups().items()}
+
+    def run(self):
+        while self.running:
+            for name, pids in self.groups().items():
+                self.peak[name] = max(self.peak.get(name, 0.0), usage(pids)[1])
+            time.sleep(1.0)
+
+
+def wait_ready(check, what, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except (OSError, requests.RequestException):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{what} did not come up within {timeout:g} s")
+
+
+def port_open(port):
+    with socket.create_connection(("127.0.0.1", port), timeout=1):
+        return True
+
+
+# ------------------------------------------------------------
+# Simulated clients
+# ------------------------------------------------------------
+class LatencyRecorder:
+    """Latencies (s) and message counts of one client kind while recording."""
+
+    def __init__(self):
+        self.chunks = []
+        self.messages = 0
+        self.errors = 0
+        self.recording = False
+
+    def add(self, latencies):
+        if self.recording:
+            self.chunks.append(np.atleast_1d(latencies))
+            self.messages += 1
+
+    def values_ms(self):
+        return np.concatenate(self.chunks) * 1e3 if self.chunks else np.empty(0)
+
+
+def sse_client(base, drone_id, recorder, stop):
+    """Follows /stream for one drone; latency is recorded (wall t) -> delta received."""
+    try:
+        with requests.get(f"{base}/stream", params={"drone": drone_id, "seconds": 1},
+                          stream=True, timeout=(5, 30)) as response:
+            backfill = True
+            for line in response.iter_lines(chunk_size=None):
+                if stop.is_set():
+                    break
+                if not line.startswith(b"data: "):
+                    continue
+                now = time.time()
+                delta = json.loads(line[6:])
+                if backfill:                 # first delta is the history on connect
+                    backfill = False
+                    continue
+                if delta["history"]["t"]:
+                    recorder.add(now - np.array(delta["history"]["t"]))
+    except requests.RequestException:
+        if not stop.is_set():
+            recorder.errors += 1
+
+
+async def ws_client(url, recorder):
+    """Gateway updates; traced frames carry the publisher's monotonic t_sent,
+    batched ones a wall-clock t."""
+    try:
+        async with connect(url, compression=None, max_size=None) as ws:
+            async for text in ws:
+                mono, wall = time.monotonic(), time.time()
+                msg = json.loads(text)
+                if "t_sent" in msg:
+                    recorder.add(mono - msg["t_sent"])
+                elif "t" in msg:
+                    recorder.add(wall - msg["t"])
+    except (OSError, asyncio.TimeoutError, ConnectionClosed) as exc:
+        recorder.errors += 1
+        print(f"[LOADGEN] WebSocket client failed: {exc}")
+
+
+def run_ws_clients(urls, recorder, stop):
+    async def main():
+        tasks = [asyncio.create_task(ws_client(url, recorder)) for url in urls]
+        while not stop.is_set():
+            await asyncio.sleep(0.2)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    asyncio.run(main())
+
+
+# ------------------------------------------------------------
+# Report
+# ------------------------------------------------------------
+def print_latency(label, recorder, seconds):
+    values = recorder.values_ms()
+    if not len(values):
+        print(f"  {label}: no samples ({recorder.messages} messages, {recorder.errors} errors)")
+        return
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    print(f"  {label}: {recorder.messages / seconds:,.0f} msg/s, {len(values):,} samples, "
+          f"p50 {p50:.2f} ms, p90 {p90:.2f} ms, p99 {p99:.2f} ms, max {values.max():.2f} ms"
+          + (f", {recorder.errors} errors" if recorder.errors else ""))
+    counts, _ = np.histogram(values, bins=LATENCY_BINS_MS)
+    width = 40 / max(counts.max(), 1)
+    for lo, hi, count in zip(LATENCY_BINS_MS[:-1], LATENCY_BINS_MS[1:], counts):
+        if count:
+            edge = f"{lo:g}-{hi:g}" if np.isfinite(hi) else f">{lo:g}"
+            print(f"    {edge:>10s} ms {count:9,d} {'#' * max(1, int(count * width))}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the drone telemetry stack on localhost.")
+    parser.add_argument("--drones", type=int, default=20, help="simulated drones (default 20)")
+    parser.add_argument("--rate", type=float, default=50.0, help="publish rate per drone, Hz (default 50)")
+    parser.add_argument("--format", choices=("binary", "json"), default="binary", help="wire payload format")
+    parser.add_argument("--batch", type=int, default=1, help="samples per frame (> 1 is untraced)")
+    parser.add_argument("--mode", choices=("all", "latest"), default="all", help="dashboard TELEMETRY_MODE")
+    parser.add_argument("--sse", type=int, default=5, help="SSE dashboard clients (default 5)")
+    parser.add_argument("--ws", type=int, default=5, help="WebSocket clients (default 5)")
+    parser.add_argument("--ws-rate", type=float, default=0.0, help="per-drone rate limit for WebSocket clients")
+    parser.add_argument("--seconds", type=float, default=15.0, help="measurement time (default 15)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds before measuring (default 3)")
+    parser.add_argument("--sndhwm", type=int, help="publisher SNDHWM (default TELEMETRY_SNDHWM or 1000)")
+    parser.add_argument("--rcvhwm", type=int, help="subscriber RCVHWM (default TELEMETRY_RCVHWM or 1000)")
+    parser.add_argument("--nodrop", action="store_true", help="publisher counts SNDHWM drops (TELEMETRY_NODROP)")
+    parser.add_argument("--record-flights", action="store_true", help="let the dashboard write flights to disk")
+    parser.add_argument("--zmq-port", type=int, default=5556)
+    parser.add_argument("--http-port", type=int, default=5000)
+    parser.add_argument("--ws-port", type=int, default=8765)
+    parser.add_argument("--log-dir", help="write each process's output to <dir>/<name>.log")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    base = f"http://127.0.0.1:{args.http_port}"
+    bus = {"TELEMETRY_BIND": f"tcp://127.0.0.1:{args.zmq_port}",
+           "TELEMETRY_ENDPOINT": f"tcp://127.0.0.1:{args.zmq_port}", "WIRE_FORMAT": args.format}
+    for name, value in (("TELEMETRY_SNDHWM", args.sndhwm), ("TELEMETRY_RCVHWM", args.rcvhwm)):
+        if value is not None:
+            bus[name] = str(value)
+    if args.nodrop:
+        bus["TELEMETRY_NODROP"] = "1"
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+
+    print(f"[LOADGEN] {args.drones} drones at {args.rate:g} Hz ({args.format}, batch {args.batch}), "
+          f"{args.sse} SSE + {args.ws} WebSocket clients, dashboard mode {args.mode}")
+    services = []
+    stop = threading.Event()
+    try:
+        # Subscribers first, so the publisher's first messages are not lost to the slow joiner
+        services.append(Service("dashboard", "Flask_v3.py", {
+            **bus, "FLASK_DEBUG": "0", "DASHBOARD_PORT": str(args.http_port), "TELEMETRY_MODE": args.mode,
+            "RECORD_FLIGHTS": "1" if args.record_flights else "0"}, args.log_dir))
+        services.append(Service("gateway", "ws_gateway.py", {
+            **bus, "WS_HOST": "127.0.0.1", "WS_PORT": str(args.ws_port)}, args.log_dir))
+        wait_ready(lambda: requests.get(f"{base}/metrics", timeout=1).ok, "dashboard")
+        wait_ready(lambda: port_open(args.ws_port), "gateway")
+        services.append(Service("agent", "twin_agent.py", {
+            **bus, "NUM_DRONES": str(args.drones), "PUBLISH_RATE": str(args.rate),
+            "SIM_RATE": str(max(100.0, args.rate)), "BATCH_SIZE": str(args.batch)}, args.log_dir))
+        wait_ready(lambda: requests.get(f"{base}/drones", timeout=1).json(), "telemetry")
+
+        sse, ws = LatencyRecorder(), LatencyRecorder()
+        drone_ids = [f"drone_{i % args.drones + 1}" for i in range(args.sse)]
+        for drone_id in drone_ids:
+            threading.Thread(target=sse_client, args=(base, drone_id, sse, stop), daemon=True).start()
+        query = f"?rate={args.ws_rate:g}" if args.ws_rate else ""
+        ws_thread = threading.Thread(target=run_ws_clients, daemon=True, args=(
+            [f"ws://127.0.0.1:{args.ws_port}/{query}"] * args.ws, ws, stop))
+        ws_thread.start()
+
+        monitor = ResourceMonitor(services)
+        monitor.start()
+        time.sleep(args.warmup)
+
+        # Measurement window
+        before = requests.get(f"{base}/metrics", timeout=5).json()
+        cpu_before = monitor.snapshot()
+        started = time.monotonic()
+        sse.recording = ws.recording = True
+        time.sleep(args.seconds)
+        sse.recording = ws.recording = False
+        elapsed = time.monotonic() - started
+        cpu_after = monitor.snapshot()
+        after = requests.get(f"{base}/metrics", timeout=5).json()
+        monitor.running = False
+
+        dead = [s.name for s in services if not s.alive()]
+        if dead:
+            print(f"[LOADGEN] warning: {', '.join(dead)} exited during the run (see --log-dir)")
+
+        offered = args.drones * args.rate
+        samples = after["ingest"]["samples"] - before["ingest"]["samples"]
+        lost = after["sequence"]["lost"] - before["sequence"]["lost"]
+        conflated = after["sequence"]["conflated"] - before["sequence"]["conflated"]
+        print(f"[LOADGEN] ingest over {elapsed:.1f} s")
+        print(f"  offered {offered:,.0f} samples/s, recorded {samples / elapsed:,.0f} samples/s, "
+              f"mean batch {after['ingest']['mean_batch']}, {after['ingest']['us_per_sample']} us/sample, "
+              f"{lost:,} lost by sequence, {conflated:,} conflated")
+        for drone in after["sequence"]["worst"]:
+            print(f"    {drone['id']}: {drone['lost']:,} lost in {drone['gaps']:,} gaps")
+        print("[LOADGEN] dashboard stages (recent samples)")
+        for name, stage in after["stages"].items():
+            if stage["count"]:
+                print(f"  {name:7s} p50 {stage['p50_ms']:.2f} ms, p90 {stage['p90_ms']:.2f} ms, "
+                      f"p99 {stage['p99_ms']:.2f} ms, max {stage['max_ms']:.2f} ms")
+        print("[LOADGEN] client latency")
+        print_latency("sse (recorded -> client)", sse, elapsed)
+        print_latency("ws  (publisher -> client)", ws, elapsed)
+        print("[LOADGEN] resources")
+        for name in cpu_after:
+            cpu = (cpu_after[name] - cpu_before.get(name, 0.0)) / elapsed * 100
+            print(f"  {name:9s} CPU {cpu:6.1f} %, peak RSS {monitor.peak.get(name, 0.0):7.1f} MB")
+    finally:
+        stop.set()
+        for service in reversed(services):
+            service.stop()
+
+
+if __name__ == "__main__":
+    main()
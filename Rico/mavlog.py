@@ -0,0 +1,427 @@
+"""
+MAVLink flight-log ingest: parse .tlog / dataflash .bin logs and replay
+them into the telemetry bus, so the dashboard can run on real flights
+without a drone.
+
+Parsing streams the file in CHUNK_SIZE pieces and decodes only the
+messages the twin uses; everything else is skipped by its length field
+without being unpacked.
+
+    .tlog       8-byte big-endian timestamp (us) + one MAVLink v1/v2 packet,
+                repeated. Uses LOCAL_POSITION_NED (or GLOBAL_POSITION_INT,
+                turned into metres from the first fix) and ATTITUDE.
+                CRCs of decoded packets are checked; corrupt bytes are
+                skipped until the next packet start.
+    dataflash   ArduPilot's on-board log: self-describing FMT records, then
+                0xA3 0x95 <type> records. Uses the EKF (XKF1 / NKF1, core 0)
+                or POS + GPS when there is no EKF output, and ATT.
+
+Each position message becomes one sample (t, system, x, y, z, vx, vy,
+vz, roll, pitch, yaw) with z and vz pointing up, which replay() publishes
+like twin_agent does (traced frames, with attitude), paced by the log's
+timestamps divided by the speed-up.
+
+    python mavlog.py replay flight.tlog --speed 20     # 20x real time
+    python mavlog.py replay 00000042.BIN --speed 0     # as fast as possible
+    python mavlog.py synth fake.tlog --seconds 600     # log from drone_sim
+    python mavlog.py bench                             # parser throughput
+"""
+import argparse
+import math
+import os
+import struct
+import time
+import zmq
+import telemetry_wire
+
+CHUNK_SIZE = 1 << 20
+M_PER_DEG = 111319.49        # metres per degree of latitude (equirectangular)
+
+# ------------------------------------------------------------
+# MAVLink (.tlog)
+# ------------------------------------------------------------
+TLOG_TIME = struct.Struct(">Q")
+ATTITUDE, LOCAL_POSITION_NED, GLOBAL_POSITION_INT = 30, 32, 33
+
+
+class MavSpec:
+    def __init__(self, name, layout, crc_extra):
+        self.name = name
+        self.layout = struct.Struct(layout)
+        self.crc_extra = crc_extra
+
+
+# msgid -> wire layout (fields in MAVLink's size-sorted order) and CRC_EXTRA
+MAV_MESSAGES = {
+    ATTITUDE: MavSpec("ATTITUDE", "<I6f", 39),                         # time_boot_ms, roll..yawspeed
+    LOCAL_POSITION_NED: MavSpec("LOCAL_POSITION_NED", "<I6f", 185),    # time_boot_ms, x y z vx vy vz
+    GLOBAL_POSITION_INT: MavSpec("GLOBAL_POSITION_INT", "<IiiiihhhH", 104),
+}
+
+
+def crc_step(tmp):
+    tmp = (tmp ^ (tmp << 4)) & 0xFF
+    return (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)
+
+
+CRC_TABLE = [crc_step(i) for i in range(256)]
+
+
+def x25_crc(data, crc=0xFFFF):
+    """MAVLink's CRC-16/MCRF4XX, one table lookup per byte."""
+    table = CRC_TABLE
+    for b in data:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    return crc & 0xFFFF
+
+
+class TlogReader:
+    """Iterates (t_us, sysid, msgid, values) over the wanted messages of a .tlog."""
+
+    def __init__(self, path, messages=MAV_MESSAGES, check_crc=True, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.messages = messages
+        self.check_crc = check_crc
+        self.chunk_size = chunk_size
+        self.packets = 0         # every framed packet, decoded or skipped
+        self.bad_crc = 0
+        self.resyncs = 0
+
+    def __iter__(self):
+        wanted, check = self.messages, self.check_crc
+        buf = b""
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                buf += chunk
+                pos, n = 0, len(buf)
+                while n - pos >= 18:                 # timestamp + v2 header
+                    magic = buf[pos + 8]
+                    if magic == 0xFD:
+                        length = buf[pos + 9]
+                        start = pos + 18
+                        end = start + length + 2 + (13 if buf[pos + 10] & 1 else 0)   # signed
+                        msgid = buf[pos + 15] | buf[pos + 16] << 8 | buf[pos + 17] << 16
+                        sysid = buf[pos + 13]
+                    elif magic == 0xFE:
+                        length = buf[pos + 9]
+                        start = pos + 14
+                        end = start + length + 2
+                        msgid = buf[pos + 13]
+                        sysid = buf[pos + 11]
+                    else:
+                        pos = self.resync(buf, pos)
+                        continue
+                    if end > n:
+                        break
+                    self.packets += 1
+                    spec = wanted.get(msgid)
+                    if spec is not None:
+                        crc_at = start + length
+                        if check and x25_crc(buf[pos + 9:crc_at] + bytes((spec.crc_extra,))) != \
+                                buf[crc_at] | buf[crc_at + 1] << 8:
+                            self.bad_crc += 1
+                        else:
+                            payload = buf[start:crc_at]
+                            if length < spec.layout.size:      # v2 trims trailing zero bytes
+                                payload += bytes(spec.layout.size - length)
+                            yield TLOG_TIME.unpack_from(buf, pos)[0], sysid, msgid, spec.layout.unpack(payload)
+                    pos = end
+                buf = buf[pos:]
+
+    def resync(self, buf, pos):
+        """Position of the next plausible packet (its timestamp) after pos."""
+        self.resyncs += 1
+        found = [i for i in (buf.find(b"\xfd", pos + 9), buf.find(b"\xfe", pos + 9)) if i >= 0]
+        return min(found) - 8 if found else max(pos + 1, len(buf) - 8)
+
+
+def tlog_samples(reader):
+    """Samples from a TlogReader: one per position message, with the latest attitude."""
+    attitude, origin, local = {}, {}, set()
+    for t_us, sysid, msgid, v in reader:
+        if msgid == ATTITUDE:
+            attitude[sysid] = v[1:4]
+        elif msgid == LOCAL_POSITION_NED:
+            local.add(sysid)
+            yield (t_us * 1e-6, sysid, v[1], v[2], -v[3], v[4], v[5], -v[6], *attitude.get(sysid, (0.0, 0.0, 0.0)))
+        elif msgid == GLOBAL_POSITION_INT and sysid not in local:
+            lat, lon = v[1] * 1e-7, v[2] * 1e-7
+            lat0, lon0, scale = origin.setdefault(sysid, (lat, lon, math.cos(math.radians(lat))))
+            yield (t_us * 1e-6, sysid, (lat - lat0) * M_PER_DEG, (lon - lon0) * M_PER_DEG * scale,
+                   v[4] / 1000, v[5] / 100, v[6] / 100, -v[7] / 100, *attitude.get(sysid, (0.0, 0.0, 0.0)))
+
+
+# ------------------------------------------------------------
+# Dataflash (.bin)
+# ------------------------------------------------------------
+DF_HEAD = b"\xa3\x95"
+DF_FMT_TYPE = 128
+DF_FMT = struct.Struct("<BB4s16s64s")
+# Format characters: struct code and scale
+DF_TYPES = {
+    "a": ("32h", 1), "b": ("b", 1), "B": ("B", 1), "h": ("h", 1), "H": ("H", 1),
+    "i": ("i", 1), "I": ("I", 1), "f": ("f", 1), "d": ("d", 1), "n": ("4s", 1),
+    "N": ("16s", 1), "Z": ("64s", 1), "c": ("h", 0.01), "C": ("H", 0.01),
+    "e": ("i", 0.01), "E": ("I", 0.01), "L": ("i", 1e-7), "M": ("B", 1),
+    "q": ("q", 1), "Q": ("Q", 1),
+}
+# Messages and columns the twin uses; columns a log lacks read as None
+DF_MESSAGES = {
+    "ATT": ("TimeUS", "Roll", "Pitch", "Yaw"),
+    "XKF1": ("TimeUS", "C", "VN", "VE", "VD", "PN", "PE", "PD"),
+    "NKF1": ("TimeUS", "C", "VN", "VE", "VD", "PN", "PE", "PD"),
+    "POS": ("TimeUS", "Lat", "Lng", "RelHomeAlt"),
+    "GPS": ("TimeUS", "Spd", "GCrs", "VZ"),
+}
+
+
+class DfSpec:
+    def __init__(self, name, length, fmt, columns, wanted):
+        self.name = name
+        self.length = length
+        self.layout = None
+        codes, index, scale, pos = "<", {}, {}, 0
+        for char, column in zip(fmt, columns):
+            if char not in DF_TYPES:
+                return                   # unknown format character: skip this type
+            code, scale[column] = DF_TYPES[char]
+            codes += code
+            index[column] = pos
+            pos += 32 if char == "a" else 1      # an 'a' array unpacks to 32 values
+        if wanted is None or struct.calcsize(codes) != length - 3:
+            return
+        self.layout = struct.Struct(codes)
+        self.columns = [(index.get(c), scale.get(c, 1)) for c in wanted]
+
+
+class DataflashReader:
+    """Iterates (name, values) over the wanted messages of a dataflash log,
+    values in DF_MESSAGES column order."""
+
+    def __init__(self, path, messages=DF_MESSAGES, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.messages = messages
+        self.chunk_size = chunk_size
+        self.specs = {}
+        self.packets = 0
+        self.resyncs = 0
+
+    def __iter__(self):
+        specs = self.specs
+        buf = b""
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                buf += chunk
+                pos, n = 0, len(buf)
+                while n - pos >= 3:
+                    if buf[pos] != 0xA3 or buf[pos + 1] != 0x95:
+                        pos = self.resync(buf, pos)
+                        continue
+                    kind = buf[pos + 2]
+                    if kind == DF_FMT_TYPE:
+                        if pos + DF_FMT.size + 3 > n:
+                            break
+                        self.define(buf, pos + 3)
+                        pos += DF_FMT.size + 3
+                        continue
+                    spec = specs.get(kind)
+                    if spec is None:
+                        pos = self.resync(buf, pos)
+                        continue
+                    if pos + spec.length > n:
+                        break
+                    self.packets += 1
+                    if spec.layout is not None:
+                        raw = spec.layout.unpack_from(buf, pos + 3)
+                        yield spec.name, tuple(None if i is None else raw[i] * s for i, s in spec.columns)
+                    pos += spec.length
+                buf = buf[pos:]
+
+    def define(self, buf, at):
+        kind, length, name, fmt, columns = DF_FMT.unpack_from(buf, at)
+        name = name.rstrip(b"\0").decode("ascii", "replace")
+        columns = columns.rstrip(b"\0").decode("ascii", "replace").split(",")
+        self.specs[kind] = DfSpec(name, length, fmt.rstrip(b"\0").decode("ascii", "replace"),
+                                  columns, self.messages.get(name))
+
+    def resync(self, buf, pos):
+        self.resyncs += 1
+        found = buf.find(DF_HEAD, pos + 1)
+        return found if found >= 0 else max(pos + 1, len(buf) - 1)
+
+
+def dataflash_samples(reader):
+    """Samples from a DataflashReader (system is always 1)."""
+    attitude, ekf, origin = (0.0, 0.0, 0.0), False, None
+    velocity = (0.0, 0.0, 0.0)
+    for name, v in reader:
+        if name == "ATT":
+            attitude = (math.radians(v[1]), math.radians(v[2]), math.radians(v[3]))
+        elif name in ("XKF1", "NKF1"):
+            if v[1]:                                 # other EKF cores duplicate core 0
+                continue
+            ekf = True
+            yield (v[0] * 1e-6, 1, v[5], v[6], -v[7], v[2], v[3], -v[4], *attitude)
+        elif name == "GPS":
+            course = math.radians(v[2])
+            velocity = (v[1] * math.cos(course), v[1] * math.sin(course), -v[3])
+        elif name == "POS" and not ekf:
+            if origin is None:
+                origin = (v[1], v[2], math.cos(math.radians(v[1])))
+            yield (v[0] * 1e-6, 1, (v[1] - origin[0]) * M_PER_DEG, (v[2] - origin[1]) * M_PER_DEG * origin[2],
+                   v[3] or 0.0, *velocity, *attitude)
+
+
+def samples(path, check_crc=True):
+    """(reader, sample iterator) for a log, by extension: .tlog, else dataflash."""
+    if path.lower().endswith(".tlog"):
+        reader = TlogReader(path, check_crc=check_crc)
+        return reader, tlog_samples(reader)
+    reader = DataflashReader(path)
+    return reader, dataflash_samples(reader)
+
+
+# ------------------------------------------------------------
+# Replay
+# ------------------------------------------------------------
+def replay(sample_iter, socket, speed=1.0, drone=None, wire_format=None):
+    """Publish samples paced at log time / speed (0 = no pacing). Returns the count sent."""
+    seqs = {}
+    sent = 0
+    t0 = started = None
+    for s in sample_iter:
+        if t0 is None:
+            t0, started = s[0], time.monotonic()
+        if speed > 0:
+            wait = started + (s[0] - t0) / speed - time.monotonic()
+            if wait > 0.001:
+                time.sleep(wait)
+        drone_id = drone or f"mav_{s[1]}"
+        seq = seqs.get(drone_id, 0)
+        seqs[drone_id] = seq + 1
+        telemetry_wire.send(socket, telemetry_wire.encode_values(
+            drone_id, s[2:8], seq=seq, wire_format=wire_format, attitude=s[8:11]))
+        sent += 1
+    return sent
+
+
+# ------------------------------------------------------------
+# Synthetic logs (from drone_sim) for tests and benchmarks
+# ------------------------------------------------------------
+def mav_packet(seq, msgid, payload, crc_extra, sysid=1, compid=1):
+    header = struct.pack("<BBBBBBBHB", 0xFD, len(payload), 0, 0, seq & 0xFF, sysid, compid,
+                         msgid & 0xFFFF, msgid >> 16)
+    crc = x25_crc(header[1:] + payload + bytes((crc_extra,)))
+    return header + payload + struct.pack("<H", crc)
+
+
+def write_tlog(path, seconds=60.0, rate=50.0, drones=1, seed=0):
+    """A .tlog of simulated flights: ATTITUDE, LOCAL_POSITION_NED and
+    GLOBAL_POSITION_INT per step plus a VFR_HUD the parser skips."""
+    from drone_sim import FleetSim
+    sim = FleetSim(drones, seed=seed)
+    start_us = int(time.time() * 1e6)
+    count = 0
+    with open(path, "wb") as f:
+        for step in range(int(seconds * rate)):
+            sim.step(1.0 / rate)
+            t_us = start_us + int(step / rate * 1e6)
+            ms = int(step / rate * 1e3)
+            for i, (x, y, z, vx, vy, vz) in enumerate(sim.state().tolist()):
+                yaw = math.atan2(vy, vx)
+                lat, lon = 52.0 + x / M_PER_DEG, 4.0 + y / (M_PER_DEG * math.cos(math.radians(52.0)))
+                for msgid, payload in (
+                        (ATTITUDE, struct.pack("<I6f", ms, 0.02 * vy, -0.02 * vx, yaw, 0, 0, 0)),
+                        (LOCAL_POSITION_NED, struct.pack("<I6f", ms, x, y, -z, vx, vy, -vz)),
+                        (GLOBAL_POSITION_INT, struct.pack("<IiiiihhhH", ms, int(lat * 1e7), int(lon * 1e7),
+                                                          int(z * 1000), int(z * 1000), int(vx * 100),
+                                                          int(vy * 100), int(-vz * 100), 0)),
+                        (74, struct.pack("<ffffhH", 0, math.hypot(vx, vy), z, vz, 0, 50))):
+                    crc_extra = MAV_MESSAGES[msgid].crc_extra if msgid in MAV_MESSAGES else 20
+                    f.write(TLOG_TIME.pack(t_us) + mav_packet(count, msgid, payload, crc_extra, sysid=i + 1))
+                    count += 1
+    return count
+
+
+def write_dataflash(path, seconds=60.0, rate=25.0, seed=0):
+    """A dataflash log of one simulated flight with FMT, ATT and XKF1 records."""
+    from drone_sim import FleetSim
+    sim = FleetSim(1, seed=seed)
+    formats = {129: ("ATT", "QffffffB", "TimeUS,DesRoll,Roll,DesPitch,Pitch,DesYaw,Yaw,AEKF"),
+               130: ("XKF1", "QBccCfffffffccce", "TimeUS,C,Roll,Pitch,Yaw,VN,VE,VD,dPD,PN,PE,PD,GX,GY,GZ,OH")}
+    layouts = {kind: struct.Struct("<" + "".join(DF_TYPES[c][0] for c in fmt)) for kind, (_, fmt, _) in formats.items()}
+    count = 0
+    with open(path, "wb") as f:
+        for kind, (name, fmt, columns) in formats.items():
+            f.write(DF_HEAD + bytes((DF_FMT_TYPE,)) + DF_FMT.pack(kind, layouts[kind].size + 3, name.encode(),
+                                                                  fmt.encode(), columns.encode()))
+        for step in range(int(seconds * rate)):
+            sim.step(1.0 / rate)
+            t_us = int(step / rate * 1e6)
+            x, y, z, vx, vy, vz = sim.state()[0].tolist()
+            yaw = math.degrees(math.atan2(vy, vx)) % 360
+            f.write(DF_HEAD + bytes((129,)) + layouts[129].pack(t_us, 0, vy, 0, -vx, 0, yaw, 0))
+            for core in (0, 1):
+                f.write(DF_HEAD + bytes((130,)) + layouts[130].pack(
+                    t_us, core, 0, 0, int(yaw * 100), vx, vy, -vz, 0, x, y, -z, 0, 0, 0, 0))
+            count += 3
+    return count
+
+
+def benchmark(messages=1_000_000):
+    path = f"mavlog_bench_{os.getpid()}.tlog"
+    try:
+        written = write_tlog(path, seconds=messages / (4 * 50 * 10), rate=50, drones=10)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"[MAVLOG] {written:,} packets, {size_mb:.1f} MB")
+        for check in (True, False):
+            reader, it = samples(path, check_crc=check)
+            started = time.perf_counter()
+            n = sum(1 for _ in it)
+            elapsed = time.perf_counter() - started
+            print(f"  crc {'on ' if check else 'off'}: {reader.packets / elapsed:10,.0f} packets/s "
+                  f"({reader.packets / elapsed * 60 / 1e6:5.1f} M/min), {n:,} samples, {size_mb / elapsed:6.1f} MB/s")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse and replay MAVLink flight logs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    play = commands.add_parser("replay", help="publish a log on the telemetry bus")
+    play.add_argument("path")
+    play.add_argument("--speed", type=float, default=1.0, help="speed-up over log time; 0 = unpaced")
+    play.add_argument("--drone", help="drone ID for a single-vehicle log (default mav_<sysid>)")
+    play.add_argument("--no-crc", action="store_true", help="skip CRC checks on .tlog packets")
+    synth = commands.add_parser("synth", help="write a simulated .tlog or dataflash .bin")
+    synth.add_argument("path")
+    synth.add_argument("--seconds", type=float, default=300.0)
+    synth.add_argument("--drones", type=int, default=1)
+    bench = commands.add_parser("bench", help="parser throughput on a synthetic .tlog")
+    bench.add_argument("messages", type=int, nargs="?", default=1_000_000)
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        socket = telemetry_wire.publisher(zmq.Context())
+        time.sleep(0.5)                      # let subscribers connect before the first frames
+        reader, it = samples(args.path, check_crc=not args.no_crc)
+        print(f"[MAVLOG] replaying {args.path} at {args.speed:g}x")
+        started = time.monotonic()
+        sent = replay(it, socket, args.speed, args.drone)
+        elapsed = time.monotonic() - started
+        print(f"[MAVLOG] {sent:,} samples from {reader.packets:,} packets in {elapsed:.1f} s "
+              f"({getattr(reader, 'bad_crc', 0)} bad CRC, {reader.resyncs} resyncs)")
+    elif args.command == "synth":
+        if args.path.lower().endswith(".tlog"):
+            count = write_tlog(args.path, args.seconds, drones=args.drones)
+        else:
+            count = write_dataflash(args.path, args.seconds)
+        print(f"[MAVLOG] wrote {count:,} messages to {args.path}")
+    else:
+        benchmark(args.messages)
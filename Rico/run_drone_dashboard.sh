@@ -2,12 +2,15 @@
 
 # ----------------------------
 # Drone Dashboard Auto-Launcher
+# For perf testing use loadgen.py instead: it starts the same stack on
+# localhost with simulated clients and reports throughput and latency.
 # ----------------------------
 
 # Change these if needed
 DASHBOARD="realtime_drone_dashboard.py"
 AGENT="twin_agent.py"
 LISTENER="listener.py"
+GATEWAY="ws_gateway.py"
 
 echo "===================================="
 echo "     Starting Drone Dashboard"
@@ -20,6 +23,13 @@ echo "Jetson Nano WiFi IP: $IP_ADDR"
 echo "Open the dashboard at: http://$IP_ADDR:5000"
 echo "------------------------------------"
 
+# Stop every service started below when this script exits (Ctrl+C included)
+cleanup() {
+    kill $DASHBOARD_PID $AGENT_PID $GATEWAY_PID $LISTENER_PID 2>/dev/null
+}
+trap cleanup EXIT
+trap exit INT TERM
+
 # Start Flask dashboard
 python3 "$DASHBOARD" &
 DASHBOARD_PID=$!
@@ -27,12 +37,20 @@ echo "Dashboard started (PID $DASHBOARD_PID)"
 sleep 2
 
 # Start twin_agent publisher
+# Over WiFi, export DR_THRESHOLD=0.25 to send only when the dashboard's
+# extrapolation drifts (see dead_reckoning.py / bench_deadreckon.py)
 echo "Starting drone ZMQ publisher..."
 python3 "$AGENT" &
 AGENT_PID=$!
 echo "Publisher started (PID $AGENT_PID)"
 sleep 1
 
+# WebSocket gateway for realtime_drone_dashboard.jsx (ws://<host>:8765)
+echo "Starting WebSocket gateway..."
+python3 "$GATEWAY" &
+GATEWAY_PID=$!
+echo "Gateway started (PID $GATEWAY_PID)"
+
 # Optional listener
 ENABLE_LISTENER=false
 
@@ -50,49 +68,5 @@ echo "   Visit: http://$IP_ADDR:5000"
 echo "==============================="
 echo ""
 
-wait
-#!/bin/bash
-
-
-# Drone Dashboard Auto-Launcher
-
-
-# Change as needed
-DASHBOARD="realtime_drone_dashboard.py"
-AGENT="twin_agent.py"
-LISTENER="listener.py"
-
-echo "Starting Drone Telemetry Dashboard..."
-
-# Start Flask dashboard
-python3 "$DASHBOARD" &
-DASHBOARD_PID=$!
-echo "Dashboard started (PID $DASHBOARD_PID)"
-sleep 2
-
-# Start twin_agent publisher
-echo "Starting drone ZMQ publisher..."
-python3 "$AGENT" &
-AGENT_PID=$!
-echo "Publisher started (PID $AGENT_PID)"
-sleep 1
-
-# Optional: start the listener
-ENABLE_LISTENER=false
-
-if [ "$ENABLE_LISTENER" = true ]; then
-    echo "Starting telemetry listener..."
-    python3 "$LISTENER" &
-    LISTENER_PID=$!
-    echo "Listener started (PID $LISTENER_PID)"
-fi
-
-echo ""
-echo "==============================="
-echo "   All services are running!"
-echo "   Visit: http://127.0.0.1:5000"
-echo "==============================="
-echo ""
-
 # Wait for all background processes
 wait
@@ -0,0 +1,118 @@
+"""
+Fixed-capacity ring buffer for drone telemetry history.
+
+All fields are stored side by side in one NumPy array with a monotonic
+timestamp column. Every sample is written twice, at i and i + capacity,
+so any window of up to `capacity` recent samples is one contiguous slice
+and reads return views instead of copies.
+
+Views stay valid until later appends wrap around onto them; callers that
+keep them past the lock they read under should copy. With a single
+writer thread and no lock, read() returns copies checked against the
+writer instead.
+"""
+import time
+import numpy as np
+
+FIELDS = ("x", "y", "z", "vx", "vy", "vz", "speed")
+HISTORY_CAPACITY = 30000     # 10 minutes at 50 Hz
+
+# Offset to turn time.monotonic() stamps into wall-clock seconds for display
+MONOTONIC_TO_WALL = time.time() - time.monotonic()
+
+
+class TelemetryRingBuffer:
+    def __init__(self, capacity=HISTORY_CAPACITY, fields=FIELDS):
+        self.capacity = int(capacity)
+        self.fields = tuple(fields)
+        self.columns = {name: i for i, name in enumerate(self.fields)}
+        self.t = np.zeros(2 * self.capacity)
+        self.values = np.zeros((2 * self.capacity, len(self.fields)))
+        self.count = 0            # samples ever appended (next sequence number)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, t, values):
+        """Add one sample; values are in self.fields order."""
+        i = self.count % self.capacity
+        self.t[i] = self.t[i + self.capacity] = t
+        self.values[i] = self.values[i + self.capacity] = values
+        self.count += 1
+
+    def extend(self, t, values):
+        """Add a block of samples: t (n,), values (n, fields)."""
+        t = np.asarray(t, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(t)
+        if n > self.capacity:
+            # Only the newest `capacity` samples survive anyway
+            t, values = t[-self.capacity:], values[-self.capacity:]
+        idx = (self.count + n - len(t) + np.arange(len(t))) % self.capacity
+        self.t[idx] = self.t[idx + self.capacity] = t
+        self.values[idx] = self.values[idx + self.capacity] = values
+        # Bumped last so lock-free readers never see rows before they are written
+        self.count += n
+
+    def window(self, n=None, upto=None):
+        """Last n samples (all retained ones by default) as (t, values) views.
+
+        upto ends the window at that sequence number instead of at count.
+        """
+        upto = self.count if upto is None else upto
+        retained = min(upto, self.capacity)
+        n = retained if n is None else min(int(n), retained)
+        end = upto % self.capacity + self.capacity
+        return self.t[end - n:end], self.values[end - n:end]
+
+    def since(self, t_from, upto=None):
+        """Samples with timestamp > t_from, as views."""
+        t, values = self.window(upto=upto)
+        start = np.searchsorted(t, t_from, side="right")
+        return t[start:], values[start:]
+
+    def after(self, seq, t_from=None, upto=None):
+        """Samples with sequence number >= seq (and timestamp > t_from), as views.
+
+        Sequence numbers count appends from 0, so `count` is the cursor to
+        pass next time. A cursor ahead of count (e.g. from before a server
+        restart) starts over from the oldest retained sample.
+        """
+        upto = self.count if upto is None else upto
+        seq = 0 if seq > upto else seq
+        t, values = self.window(upto - max(seq, upto - min(upto, self.capacity)), upto)
+        if t_from is not None:
+            start = np.searchsorted(t, t_from, side="right")
+            t, values = t[start:], values[start:]
+        return t, values
+
+    def read(self, method, *args):
+        """Copy of method(*args, upto=count), e.g. read(self.since, t0), safe without a lock.
+
+        Returns (t, values, upto); upto is the cursor for after(). Only valid
+        with a single writer thread: the writer fills rows before bumping
+        count, and the copy is retried if enough appends happened meanwhile
+        to wrap onto the copied rows.
+        """
+        while True:
+            upto = self.count
+            t, values = method(*args, upto=upto)
+            t, values = t.copy(), values.copy()
+            if self.count - upto <= self.capacity - len(t):
+                return t, values, upto
+
+    def field(self, name, n=None):
+        return self.window(n)[1][:, self.columns[name]]
+
+    def latest(self):
+        if not self.count:
+            return None
+        t, values = self.window(1)
+        return t[0], values[0]
+
+    def to_json(self, t, values):
+        """Columnar dict for a window: wall-clock 't' plus one list per field."""
+        out = {"t": (t + MONOTONIC_TO_WALL).tolist()}
+        for name, i in self.columns.items():
+            out[name] = values[:, i].tolist()
+        return out
@@ -0,0 +1,155 @@
+"""
+Downsampled telemetry tiers for long flights.
+
+Raw samples only cover the last minute or so of a drone's history. A
+TelemetryRollup keeps coarser tiers next to it, by default
+
+    1 s buckets for 10 minutes, 10 s buckets for 1 hour, 1 min buckets for 24 hours
+
+each bucket holding the min, max and mean of every field and its sample
+count. Buckets are aligned on wall-clock multiples of their width.
+
+Maintained incrementally by the single writer: samples are only queued
+on the open 1 s bucket and reduced in one go when it closes, and each
+closed bucket is folded into the open bucket of the next tier, so a
+sample costs a list append and the coarse tiers cost nothing per sample. Closed buckets
+live in TelemetryRingBuffers (columns x_min ... speed_max ... x_mean ...
+n) and are read lock-free with their read(). A tier's open bucket is not
+published; read() instead rebuilds it from the finer tier's closed
+buckets, so the newest point lags by at most one finer bucket.
+
+ROLLUP_TIERS="1:600,10:360,60:1440" sets width:buckets per tier.
+"""
+import math
+import os
+import numpy as np
+from telemetry_buffer import FIELDS, MONOTONIC_TO_WALL, TelemetryRingBuffer
+
+STATS = ("min", "max", "mean")
+ROLLUP_TIERS = tuple(tuple(float(x) for x in tier.split(":"))
+                     for tier in os.getenv("ROLLUP_TIERS", "1:600,10:360,60:1440").split(",") if tier)
+ROLLUP_POINTS = 600      # default most buckets a chart asks for
+
+
+class RollupTier:
+    def __init__(self, width, capacity, fields=FIELDS, parent=None):
+        self.width = float(width)
+        self.fields = tuple(fields)
+        self.parent = parent             # next coarser tier
+        self.buckets = TelemetryRingBuffer(
+            capacity, [f"{f}_{s}" for s in STATS for f in self.fields] + ["n"])
+        self.key = None                  # open bucket: wall-clock start / width
+        self.acc = None                  # open bucket: [min, max, sum, n]
+        self.pending = []                # open bucket: raw value blocks not yet in acc
+
+    def start(self, key):
+        """Monotonic time a bucket starts at (the buffers' time base)."""
+        return key * self.width - MONOTONIC_TO_WALL
+
+    def add(self, t, values):
+        """Fold raw samples (t (n,) monotonic, values (n, fields)) into the tier (writer only).
+
+        values is kept until the open bucket closes and must not be changed.
+        """
+        first = math.floor((float(t[0]) + MONOTONIC_TO_WALL) / self.width)
+        if len(t) == 1 or first == math.floor((float(t[-1]) + MONOTONIC_TO_WALL) / self.width):
+            self.open(first)
+            self.pending.append(values)
+            return
+        keys = np.floor((t + MONOTONIC_TO_WALL) / self.width)
+        starts = np.r_[0, np.flatnonzero(np.diff(keys)) + 1]
+        counts = np.diff(np.r_[starts, len(t)])
+        mins = np.minimum.reduceat(values, starts)
+        maxs = np.maximum.reduceat(values, starts)
+        sums = np.add.reduceat(values, starts)
+        for i, key in enumerate(keys[starts]):
+            self.merge(key, mins[i], maxs[i], sums[i], counts[i])
+
+    def open(self, key):
+        """Make key the open bucket, closing the current one if key is newer.
+        A late sample for an older bucket is counted in the open one."""
+        if self.key is not None and key > self.key:
+            self.close()
+        if self.key is None:
+            self.key = key
+
+    def merge(self, key, mn, mx, total, n):
+        self.open(key)
+        acc = self.acc
+        if acc is None:
+            self.acc = [mn.copy(), mx.copy(), total.copy(), n]
+            return
+        np.minimum(acc[0], mn, out=acc[0])
+        np.maximum(acc[1], mx, out=acc[1])
+        acc[2] += total
+        acc[3] += n
+
+    def fold(self):
+        """Reduce the queued raw blocks into acc."""
+        if not self.pending:
+            return
+        rows = self.pending[0] if len(self.pending) == 1 else np.concatenate(self.pending)
+        self.pending = []
+        self.merge(self.key, rows.min(0), rows.max(0), rows.sum(0), len(rows))
+
+    def close(self):
+        self.fold()
+        mn, mx, total, n = self.acc
+        self.buckets.append(self.start(self.key), np.concatenate([mn, mx, total / n, [n]]))
+        if self.parent is not None:
+            parent_key = np.floor(self.key * self.width / self.parent.width)
+            self.parent.merge(parent_key, mn, mx, total, n)
+        self.key = self.acc = None
+
+
+class TelemetryRollup:
+    def __init__(self, tiers=ROLLUP_TIERS, fields=FIELDS):
+        self.tiers = []
+        parent = None
+        for width, capacity in sorted(tiers, reverse=True):
+            parent = RollupTier(width, int(capacity), fields, parent)
+            self.tiers.insert(0, parent)
+
+    def extend(self, t, values):
+        """Add samples (writer only); values must not be changed afterwards."""
+        if self.tiers:
+            self.tiers[0].add(np.asarray(t, dtype=np.float64), np.asarray(values, dtype=np.float64))
+
+    def tier_for(self, seconds, points=ROLLUP_POINTS):
+        """Finest tier with at most `points` buckets over `seconds` (else the coarsest)."""
+        for tier in self.tiers:
+            if seconds / tier.width <= points:
+                return tier
+        return self.tiers[-1] if self.tiers else None
+
+    def read(self, tier, t_from):
+        """Copies of a tier's buckets starting after t_from, plus its open bucket
+        rebuilt from the finer tier. Safe without a lock (single writer)."""
+        key = tier.key
+        t, values, _ = tier.buckets.read(tier.buckets.since, t_from)
+        index = self.tiers.index(tier)
+        if key is None or index == 0:
+            return t, values
+        # The open bucket may close while we read: keep the two reads consistent
+        open_start = tier.start(key)
+        keep = t < open_start
+        t, values = t[keep], values[keep]
+        finer = self.tiers[index - 1]
+        ft, fv, _ = finer.buckets.read(finer.buckets.since, max(t_from, open_start - 1e-6))
+        inside = ft < tier.start(key + 1)
+        if inside.any():
+            t = np.r_[t, open_start]
+            values = np.vstack([values, combine(fv[inside], len(finer.fields))])
+        return t, values
+
+    def to_json(self, tier, t, values):
+        return {"width": tier.width, **tier.buckets.to_json(t, values)}
+
+
+def combine(rows, n_fields):
+    """One bucket row from several (min, max, mean, n) bucket rows."""
+    n = rows[:, -1]
+    mins = rows[:, :n_fields].min(0)
+    maxs = rows[:, n_fields:2 * n_fields].max(0)
+    means = n @ rows[:, 2 * n_fields:3 * n_fields] / n.sum()
+    return np.concatenate([mins, maxs, means, [n.sum()]])
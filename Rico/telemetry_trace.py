@@ -0,0 +1,141 @@
+"""
+Latency and sequence tracing along the drone telemetry path.
+
+Publishers stamp each frame with a per-drone sequence number and their
+time.monotonic() (see telemetry_wire). Each later stage records how long
+it has been since the previous stamp:
+
+    bus      publisher send  -> subscriber receive (ZMQ + socket queues)
+    ingest   receive         -> sample recorded in the fleet
+    emit     recorded        -> delta sent to a dashboard client
+
+LatencyStats keeps the most recent samples of one stage for percentiles;
+SequenceTracker counts lost, reordered and duplicate messages per drone.
+Monotonic stamps are only comparable between processes on the same host.
+"""
+import threading
+import numpy as np
+
+RESERVOIR = 4096         # latest latencies kept per stage
+
+
+class LatencyStats:
+    def __init__(self, size=RESERVOIR):
+        self.values = np.zeros(size)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, latencies):
+        latencies = np.atleast_1d(np.asarray(latencies, dtype=np.float64))[-len(self.values):]
+        with self.lock:
+            idx = (self.count + np.arange(len(latencies))) % len(self.values)
+            self.values[idx] = latencies
+            self.count += len(latencies)
+
+    def summary(self):
+        with self.lock:
+            recent = self.values[:min(self.count, len(self.values))].copy()
+            count = self.count
+        if not len(recent):
+            return {"count": 0}
+        p50, p90, p99 = np.percentile(recent, [50, 90, 99]) * 1e3
+        return {"count": count, "p50_ms": round(p50, 3), "p90_ms": round(p90, 3),
+                "p99_ms": round(p99, 3), "max_ms": round(recent.max() * 1e3, 3)}
+
+
+class SequenceTracker:
+    """Per-drone loss accounting on sequence numbers.
+
+    A forward jump counts the skipped numbers as lost. A number behind
+    the newest one is a late (reordered) frame if it falls in a recent gap,
+    which takes it back off the lost count and out of the gap; a duplicate
+    if it repeats the newest or any number from the first gap on; and
+    otherwise (further back) a publisher restart. Frames a consumer drops on
+    purpose (display conflation) are reported with skip() beforehand so
+    they are counted as conflated, not lost.
+    """
+    COUNTERS = ("received", "gaps", "lost", "reordered", "duplicates", "restarts", "conflated")
+    RECENT_GAPS = 16         # gap ranges per drone remembered for late frames
+
+    def __init__(self):
+        self.drones = {}         # drone_id -> {"last", "recent", "floor", "skipped", counters...}
+
+    def drone(self, drone_id):
+        d = self.drones.get(drone_id)
+        if d is None:
+            # recent: unfilled [lo, hi) gap ranges, oldest first; floor: start of the first gap
+            d = self.drones[drone_id] = {"last": None, "recent": [], "floor": None,
+                                         "skipped": 0, **dict.fromkeys(self.COUNTERS, 0)}
+        return d
+
+    def skip(self, drone_id, count):
+        """count frames of a drone are being dropped on purpose before the next observe()."""
+        self.drone(drone_id)["skipped"] += count
+
+    def observe(self, drone_id, seq):
+        d = self.drone(drone_id)
+        d["received"] += 1
+        last = d["last"]
+        skipped, d["skipped"] = d["skipped"], 0
+        if last is None or seq == last + 1:
+            d["last"] = seq
+        elif seq > last:
+            missing = seq - last - 1
+            d["conflated"] += min(skipped, missing)
+            if missing > skipped:
+                d["gaps"] += 1
+                d["lost"] += missing - skipped
+                self.add_gap(d, last + 1, seq)
+            d["last"] = seq
+        elif seq == last:
+            d["duplicates"] += 1
+        elif self.fill_gap(d, seq):
+            d["reordered"] += 1
+            d["lost"] -= 1
+        elif d["floor"] is not None and seq >= d["floor"]:
+            d["duplicates"] += 1
+        else:
+            d["restarts"] += 1
+            d["recent"].clear()
+            d["floor"] = None
+            d["last"] = seq
+
+    def add_gap(self, d, lo, hi):
+        d["recent"].append((lo, hi))
+        del d["recent"][:-self.RECENT_GAPS]
+        if d["floor"] is None:
+            d["floor"] = lo
+
+    def fill_gap(self, d, seq):
+        """Take a late number out of the gap holding it; False if no gap does."""
+        recent = d["recent"]
+        for i, (lo, hi) in enumerate(recent):
+            if lo <= seq < hi:
+                recent[i:i + 1] = [(a, b) for a, b in ((lo, seq), (seq + 1, hi)) if a < b]
+                del recent[:-self.RECENT_GAPS]
+                return True
+        return False
+
+    def summary(self, worst=5):
+        drones = list(self.drones.items())
+        totals = {name: sum(d[name] for _, d in drones) for name in self.COUNTERS}
+        # Where the losses are: the drones with the most lost frames
+        ranked = sorted((d for d in drones if d[1]["lost"] > 0), key=lambda item: -item[1]["lost"])
+        return {**totals, "drones": len(drones),
+                "worst": [{"id": drone_id, **{name: d[name] for name in self.COUNTERS}}
+                          for drone_id, d in ranked[:worst]]}
+
+
+class Tracer:
+    STAGES = ("bus", "ingest", "emit")
+
+    def __init__(self):
+        self.stages = {name: LatencyStats() for name in self.STAGES}
+        self.sequence = SequenceTracker()
+
+    def stage(self, name):
+        return self.stages[name]
+
+    def summary(self):
+        return {"stages": {name: s.summary() for name, s in self.stages.items()},
+                "sequence": self.sequence.summary()}
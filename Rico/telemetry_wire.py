@@ -0,0 +1,222 @@
+"""
+Framing for drone telemetry on the ZeroMQ bus.
+
+Every message is a single frame starting with the drone ID and a space,
+followed by the payload. The payload is either a versioned binary record
+(default) or JSON, kept as a fallback for tools that want to read the bus:
+
+    b'drone_1 \x03<uint64 seq, double t_sent, 6 doubles: x y z vx vy vz>'
+    b'drone_1 {"id": "drone_1", "seq": 7, "t_sent": ..., "x": ...}'
+
+seq numbers each drone's messages and t_sent is the publisher's
+time.monotonic() at send, for latency tracing (comparable between
+processes on the same host). Version 1 is the same record without them;
+version 4 adds roll, pitch and yaw (radians) for sources that have
+attitude, such as replayed flight logs (see mavlog.py).
+
+decode() tells them apart by the first payload byte ("{" is JSON, anything
+else is a binary version number), so both can share one bus.
+
+Batched frames (version 2, or a JSON list) pack several timestamped
+samples of one drone for archival consumers; decode() returns the newest
+sample of a batch and decode_all() returns every one. Batches carry no
+seq or t_sent, so loss and latency are not tracked for batched traffic.
+
+ZMQ SUB sockets filter on frame prefixes, so subscribing to b"drone_1 "
+(with the space, so drone_1 does not also match drone_10) receives just
+that drone, and b"" receives the whole fleet.
+"""
+import json
+import os
+import struct
+import time
+import zmq
+
+TELEMETRY_ENDPOINT = os.getenv("TELEMETRY_ENDPOINT", "tcp://localhost:5556")
+SEPARATOR = b" "
+# "binary" or "json" for what encode() writes; decode() accepts both
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "binary")
+
+# Binary payload layouts by version byte: (fields, struct after the version byte)
+WIRE_VERSION = 3
+LAYOUTS = {
+    1: (("x", "y", "z", "vx", "vy", "vz"), struct.Struct("<6d")),
+    3: (("seq", "t_sent", "x", "y", "z", "vx", "vy", "vz"), struct.Struct("<Qd6d")),
+    4: (("seq", "t_sent", "x", "y", "z", "vx", "vy", "vz", "roll", "pitch", "yaw"), struct.Struct("<Qd9d")),
+}
+TRACE_FIELDS = ("seq", "t_sent")
+ATTITUDE_FIELDS = ("roll", "pitch", "yaw")
+ATTITUDE_VERSION = 4
+JSON_START = ord("{")
+
+# Batch payload: version byte, sample count, then (t, x, y, z, vx, vy, vz) per sample
+BATCH_VERSION = 2
+BATCH_FIELDS = ("t", "x", "y", "z", "vx", "vy", "vz")
+BATCH_HEADER = struct.Struct("<BH")
+BATCH_RECORD = struct.Struct("<7d")
+JSON_BATCH_START = ord("[")
+# What decoding a malformed frame raises (JSON and Unicode errors are ValueErrors)
+FRAME_ERRORS = (ValueError, KeyError, IndexError, TypeError, struct.error)
+
+# Queue limits (messages) per socket; 0 means unlimited
+SNDHWM = int(os.getenv("TELEMETRY_SNDHWM", 1000))
+RCVHWM = int(os.getenv("TELEMETRY_RCVHWM", 1000))
+# A PUB socket drops frames for a full subscriber queue without telling anyone.
+# With TELEMETRY_NODROP=1 send() reports them instead (and skips every
+# subscriber for that frame), so the publisher can count what it lost.
+NODROP = os.getenv("TELEMETRY_NODROP", "0") == "1"
+
+
+def topic(drone_id):
+    return str(drone_id).encode() + SEPARATOR
+
+
+def encode_json(msg):
+    return topic(msg["id"]) + json.dumps(msg).encode()
+
+
+def encode_binary(msg, version=None):
+    """Traced record (version 3, or 4 with attitude) when msg has seq/t_sent, else version 1."""
+    if version is None:
+        version = 1 if "seq" not in msg else ATTITUDE_VERSION if "roll" in msg else WIRE_VERSION
+    fields, layout = LAYOUTS[version]
+    return topic(msg["id"]) + bytes((version,)) + layout.pack(*[msg[f] for f in fields])
+
+
+def encode_values(drone_id, values, seq=None, t_sent=None, wire_format=None, attitude=None):
+    """Frame for one sample given as x y z vx vy vz (no dict needed for binary).
+
+    With seq, the frame is traced: t_sent defaults to time.monotonic() now.
+    attitude (roll, pitch, yaw) is only carried by traced frames.
+    """
+    if seq is not None and t_sent is None:
+        t_sent = time.monotonic()
+    if (wire_format or WIRE_FORMAT) == "json":
+        trace = {} if seq is None else {"seq": seq, "t_sent": t_sent}
+        if seq is not None and attitude is not None:
+            trace.update(zip(ATTITUDE_FIELDS, attitude))
+        return encode_json({"id": drone_id, **trace, **dict(zip(BATCH_FIELDS[1:], values))})
+    if seq is None:
+        return topic(drone_id) + b"\x01" + LAYOUTS[1][1].pack(*values)
+    if attitude is not None:
+        return (topic(drone_id) + bytes((ATTITUDE_VERSION,))
+                + LAYOUTS[ATTITUDE_VERSION][1].pack(seq, t_sent, *values, *attitude))
+    return topic(drone_id) + bytes((WIRE_VERSION,)) + LAYOUTS[WIRE_VERSION][1].pack(seq, t_sent, *values)
+
+
+def encode(msg, wire_format=None):
+    if (wire_format or WIRE_FORMAT) == "json":
+        return encode_json(msg)
+    return encode_binary(msg)
+
+
+def encode_batch(drone_id, msgs, wire_format=None):
+    """One frame for several samples of one drone; each msg needs a wall-clock "t"."""
+    if (wire_format or WIRE_FORMAT) == "json":
+        return topic(drone_id) + json.dumps(msgs).encode()
+    body = b"".join(BATCH_RECORD.pack(*[m[f] for f in BATCH_FIELDS]) for m in msgs)
+    return topic(drone_id) + BATCH_HEADER.pack(BATCH_VERSION, len(msgs)) + body
+
+
+def decode_all(frame):
+    """Returns (drone_id, list of message dicts); one item unless the frame is a batch."""
+    drone_id, _, payload = frame.partition(SEPARATOR)
+    if payload[0] == BATCH_VERSION:
+        drone_id = drone_id.decode()
+        count = BATCH_HEADER.unpack_from(payload)[1]
+        records = BATCH_RECORD.iter_unpack(payload[BATCH_HEADER.size:BATCH_HEADER.size + count * BATCH_RECORD.size])
+        return drone_id, [{"id": drone_id, **dict(zip(BATCH_FIELDS, r))} for r in records]
+    if payload[0] == JSON_BATCH_START:
+        return drone_id.decode(), json.loads(payload)
+    drone_id, msg = decode(frame)
+    return drone_id, [msg]
+
+
+def decode_values(frame):
+    """Returns (drone_id, stamps, rows, trace) without building dicts.
+
+    rows are (x, y, z, vx, vy, vz) tuples; stamps is a list of wall-clock
+    times for batched frames and None for single samples; trace is
+    (seq, t_sent) for traced frames, else None. A malformed frame raises
+    one of FRAME_ERRORS.
+    """
+    drone_id, _, payload = frame.partition(SEPARATOR)
+    version = payload[0]
+    if version in (WIRE_VERSION, ATTITUDE_VERSION):
+        values = LAYOUTS[version][1].unpack_from(payload, 1)
+        return drone_id.decode(), None, [values[2:8]], values[:2]
+    if version == 1:
+        return drone_id.decode(), None, [LAYOUTS[1][1].unpack_from(payload, 1)], None
+    if version == BATCH_VERSION:
+        count = BATCH_HEADER.unpack_from(payload)[1]
+        records = list(BATCH_RECORD.iter_unpack(payload[BATCH_HEADER.size:BATCH_HEADER.size + count * BATCH_RECORD.size]))
+        return drone_id.decode(), [r[0] for r in records], [r[1:] for r in records], None
+    drone_id, msgs = decode_all(frame)
+    rows = [tuple(float(m[f]) for f in BATCH_FIELDS[1:]) for m in msgs]
+    trace = (msgs[-1]["seq"], msgs[-1]["t_sent"]) if "seq" in msgs[-1] else None
+    return drone_id, ([float(m["t"]) for m in msgs] if "t" in msgs[0] else None), rows, trace
+
+
+def decode(frame):
+    """Returns (drone_id, message dict) for either payload format (newest sample of a batch)."""
+    drone_id, _, payload = frame.partition(SEPARATOR)
+    if payload[0] in (BATCH_VERSION, JSON_BATCH_START):
+        drone_id, msgs = decode_all(frame)
+        return drone_id, msgs[-1]
+    drone_id = drone_id.decode()
+    if payload[0] == JSON_START:
+        return drone_id, json.loads(payload)
+    if payload[0] not in LAYOUTS:
+        raise ValueError(f"unknown telemetry wire version {payload[0]}")
+    fields, layout = LAYOUTS[payload[0]]
+    msg = dict(zip(fields, layout.unpack_from(payload, 1)))
+    msg["id"] = drone_id
+    return drone_id, msg
+
+
+def publisher(ctx, bind=None, sndhwm=SNDHWM, nodrop=NODROP):
+    socket = ctx.socket(zmq.PUB)
+    socket.setsockopt(zmq.SNDHWM, sndhwm)
+    if nodrop:
+        socket.setsockopt(zmq.XPUB_NODROP, 1)
+    socket.bind(bind or os.getenv("TELEMETRY_BIND", "tcp://*:5556"))
+    return socket
+
+
+def send(socket, frame):
+    """Send without blocking; False if the frame hit SNDHWM (only seen with nodrop)."""
+    try:
+        socket.send(frame, zmq.NOBLOCK)
+        return True
+    except zmq.Again:
+        return False
+
+
+def subscriber(ctx, drone_ids=None, conflate=False, endpoint=None, rcvhwm=RCVHWM):
+    """SUB socket on the telemetry bus.
+
+    conflate=True keeps only the newest frame in the socket queue (ZMQ_CONFLATE).
+    That is per socket, not per topic, so it only suits single-drone consumers;
+    fleet displays conflate per drone in fleet.run_latest() instead.
+    """
+    socket = ctx.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, rcvhwm)
+    if conflate:
+        socket.setsockopt(zmq.CONFLATE, 1)
+    socket.connect(endpoint or TELEMETRY_ENDPOINT)
+    subscribe(socket, drone_ids)
+    return socket
+
+
+def subscribe(socket, drone_ids=None):
+    """Subscribe a SUB socket to some drones, or to all of them."""
+    if not drone_ids:
+        socket.setsockopt(zmq.SUBSCRIBE, b"")
+        return
+    for drone_id in drone_ids:
+        socket.setsockopt(zmq.SUBSCRIBE, topic(drone_id))
+
+
+def drone_ids_from_env(name="DRONE_IDS"):
+    """Comma-separated drone IDs from the environment ([] means all)."""
+    return [d.strip() for d in os.getenv(name, "").split(",") if d.strip()]
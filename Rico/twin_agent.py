@@ -1,25 +1,80 @@
 import zmq
+import os
+import sys
 import time
 import json
-from random import uniform
+import telemetry_wire
+from drone_sim import FleetSim
+from dead_reckoning import DR_THRESHOLD, DeadReckoningFilter
 
 ctx = zmq.Context()
-socket = ctx.socket(zmq.PUB)
-socket.bind("tcp://*:5556")
+# SNDHWM from TELEMETRY_SNDHWM, bind address from TELEMETRY_BIND
+socket = telemetry_wire.publisher(ctx)
 
-drone_id = "drone_1"
+# Fleet size from argv or env: python twin_agent.py 10
+NUM_DRONES = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("NUM_DRONES", 1))
+SIM_RATE = float(os.getenv("SIM_RATE", 100.0))           # physics steps per second
+PUBLISH_RATE = float(os.getenv("PUBLISH_RATE", 50.0))    # Hz per drone, at most SIM_RATE
+# Samples per frame; > 1 packs timestamped batches for archival consumers.
+# Batches carry no seq, so subscribers cannot count their losses.
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 1))
+drone_ids = [f"drone_{i + 1}" for i in range(NUM_DRONES)]
+pending = {drone_id: [] for drone_id in drone_ids}
 
+# Simulated drones flying waypoint loops with wind (see drone_sim.py)
+sim = FleetSim(NUM_DRONES, seed=int(os.getenv("SIM_SEED", 0)))
+dt = 1.0 / SIM_RATE
+publish_every = max(1, round(SIM_RATE / PUBLISH_RATE))
+# DR_THRESHOLD=0.5: send a drone only when the twin's extrapolation is off by
+# more than 0.5 m (or DR_HEARTBEAT has passed); single-sample frames only
+dead_reckoning = DeadReckoningFilter(NUM_DRONES) if DR_THRESHOLD > 0 and BATCH_SIZE == 1 else None
+seqs = [0] * NUM_DRONES      # per-drone sequence numbers, one per traced frame attempted
+
+print(f"[AGENT] Simulating {NUM_DRONES} drone(s) at {SIM_RATE:g} Hz, publishing at "
+      f"{SIM_RATE / publish_every:g} Hz ({telemetry_wire.WIRE_FORMAT}, batch {BATCH_SIZE}"
+      + (f", dead reckoning {DR_THRESHOLD:g} m)" if dead_reckoning else ")"))
+step = 0
+overruns = 0
+dropped = reported = 0       # frames refused at SNDHWM (TELEMETRY_NODROP=1 only)
+next_tick = time.monotonic()
 while True:
-    # Simulated drone state (mock data)
-    state = {
-        "id": drone_id,
-        "x": round(uniform(0, 10), 2),
-        "y": round(uniform(0, 10), 2),
-        "z": round(uniform(1, 5), 2),
-        "vx": round(uniform(-1, 1), 2),
-        "vy": round(uniform(-1, 1), 2),
-        "vz": round(uniform(-0.5, 0.5), 2)
-    }
-    socket.send_json(state)
-    print(f"Sent: {json.dumps(state)}")
-    time.sleep(1)
+    sim.step(dt)
+    step += 1
+    if step % publish_every == 0:
+        now = time.time()
+        state = sim.state().round(3)
+        send = dead_reckoning.update(time.monotonic(), state) if dead_reckoning else None
+        for i, (drone_id, row) in enumerate(zip(drone_ids, state.tolist())):
+            if BATCH_SIZE > 1:
+                pending[drone_id].append({"id": drone_id, "t": now,
+                                          **dict(zip(("x", "y", "z", "vx", "vy", "vz"), row))})
+                if len(pending[drone_id]) >= BATCH_SIZE:
+                    if not telemetry_wire.send(socket, telemetry_wire.encode_batch(drone_id, pending[drone_id])):
+                        dropped += 1
+                    pending[drone_id] = []
+            elif send is None or send[i]:
+                # t_sent is stamped at encode for latency tracing; subscribers
+                # find lost frames as gaps in each drone's seq. seq advances
+                # even when send() refuses the frame, so drops at SNDHWM
+                # show up as gaps too
+                if not telemetry_wire.send(socket, telemetry_wire.encode_values(drone_id, row, seq=seqs[i])):
+                    dropped += 1
+                seqs[i] += 1
+        if NUM_DRONES == 1 and step % round(SIM_RATE) == 0:
+            print(f"Sent: {json.dumps(dict(zip(('x', 'y', 'z', 'vx', 'vy', 'vz'), row)))}")
+        if dead_reckoning and step % round(10 * SIM_RATE) == 0:
+            print(f"[AGENT] Dead reckoning sent {dead_reckoning.sent:,} of {dead_reckoning.samples:,} samples "
+                  f"({dead_reckoning.sent / dead_reckoning.samples:.1%})")
+        if dropped > reported and step % round(SIM_RATE) == 0:
+            print(f"[AGENT] {dropped - reported} frame(s) dropped at SNDHWM in the last second ({dropped} total)")
+            reported = dropped
+
+    next_tick += dt
+    wait = next_tick - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+    elif wait < -1.0:
+        # More than a second behind: report it and drop the backlog instead of bursting
+        overruns += 1
+        print(f"[AGENT] Falling behind real time ({overruns}); reduce NUM_DRONES or SIM_RATE")
+        next_tick = time.monotonic()
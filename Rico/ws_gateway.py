@@ -0,0 +1,166 @@
+"""
+WebSocket fan-out gateway for the realtime drone dashboards.
+
+Subscribes to the ZMQ telemetry bus once and forwards every update as
+JSON to all connected WebSocket clients (realtime_drone_dashboard.jsx
+connects to ws://localhost:8765). Each message is serialised once and
+the same text is queued for every client.
+
+Every client has its own bounded send queue. When a client cannot keep
+up, the oldest queued updates are dropped so it always catches up to the
+newest state instead of falling further behind. Rate-limited clients
+instead keep only the newest update per drone and get those at their
+rate. Query parameters per connection:
+
+    ws://host:8765/?drone=drone_1    only that drone (default: all)
+    ws://host:8765/?rate=10          at most 10 updates/s per drone
+
+    python ws_gateway.py
+"""
+import asyncio
+import collections
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+import zmq
+import zmq.asyncio
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+import telemetry_wire
+from telemetry_trace import SequenceTracker
+
+WS_HOST = os.getenv("WS_HOST", "0.0.0.0")
+WS_PORT = int(os.getenv("WS_PORT", 8765))
+CLIENT_QUEUE = int(os.getenv("CLIENT_QUEUE", 64))      # messages per client before dropping
+CLIENT_RATE = float(os.getenv("CLIENT_RATE", 0))       # default per-client limit, 0 = none
+STATS_PERIOD = 10.0
+
+
+class Client:
+    def __init__(self, connection, drone=None, rate=0.0):
+        self.connection = connection
+        self.drone = drone
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.queue = collections.deque(maxlen=CLIENT_QUEUE)
+        self.latest = {}               # rate-limited clients: newest text per drone
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, drone_id, text):
+        if self.drone and drone_id != self.drone:
+            return
+        if self.interval:
+            if self.latest.pop(drone_id, None) is not None:
+                self.dropped += 1
+            self.latest[drone_id] = text
+        else:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1      # deque drops the oldest on append
+            self.queue.append(text)
+        self.ready.set()
+
+    async def writer(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                if self.interval:
+                    started = time.monotonic()
+                    pending, self.latest = self.latest, {}
+                    for text in pending.values():
+                        await self.connection.send(text)
+                    self.sent += len(pending)
+                    # Updates arriving meanwhile replace each other in self.latest
+                    await asyncio.sleep(max(0.0, started + self.interval - time.monotonic()))
+                    continue
+                while self.queue:
+                    await self.connection.send(self.queue.popleft())
+                    self.sent += 1
+        except ConnectionClosed:
+            pass
+
+
+class Gateway:
+    def __init__(self):
+        self.clients = set()
+        self.received = 0
+        self.sent_closed = 0
+        self.dropped_closed = 0
+        self.bad_frames = 0                   # frames on the bus that failed to decode
+        self.sequence = SequenceTracker()     # bus loss seen by the gateway's SUB socket
+
+    def publish(self, drone_id, msg):
+        """Fan one update out to every client queue (serialised once)."""
+        self.received += 1
+        text = json.dumps(msg)
+        for client in self.clients:
+            client.offer(drone_id, text)
+
+    async def handler(self, connection):
+        query = parse_qs(urlparse(connection.request.path).query)
+        drone = query.get("drone", [None])[0]
+        rate = float(query.get("rate", [CLIENT_RATE])[0])
+        client = Client(connection, drone, rate)
+        self.clients.add(client)
+        writer = asyncio.create_task(client.writer())
+        try:
+            # Clients only listen; this returns when the connection closes
+            await connection.wait_closed()
+        finally:
+            writer.cancel()
+            self.clients.discard(client)
+            self.sent_closed += client.sent
+            self.dropped_closed += client.dropped
+
+    def stats(self):
+        return {
+            "clients": len(self.clients),
+            "received": self.received,
+            "sent": self.sent_closed + sum(c.sent for c in self.clients),
+            "dropped": self.dropped_closed + sum(c.dropped for c in self.clients),
+            "bus_lost": self.sequence.summary(worst=0)["lost"],
+            "bad_frames": self.bad_frames,
+        }
+
+
+async def zmq_ingest(gateway, socket):
+    while True:
+        frame = await socket.recv()
+        try:
+            msgs = telemetry_wire.decode_all(frame)[1]
+            drone_ids = [str(msg["id"]) for msg in msgs]
+        except telemetry_wire.FRAME_ERRORS as exc:
+            gateway.bad_frames += 1
+            if gateway.bad_frames == 1:
+                print(f"[GATEWAY] Skipping undecodable frames, first: {type(exc).__name__}: {exc} in {frame[:40]!r}")
+            continue
+        for drone_id, msg in zip(drone_ids, msgs):
+            if "seq" in msg:
+                gateway.sequence.observe(drone_id, msg["seq"])
+            gateway.publish(drone_id, msg)
+
+
+async def report(gateway):
+    while True:
+        await asyncio.sleep(STATS_PERIOD)
+        print(f"[GATEWAY] {gateway.stats()}")
+
+
+async def main():
+    gateway = Gateway()
+    ctx = zmq.asyncio.Context()
+    socket = telemetry_wire.subscriber(ctx, telemetry_wire.drone_ids_from_env())
+    async with serve(gateway.handler, WS_HOST, WS_PORT, compression=None):
+        print(f"[GATEWAY] {telemetry_wire.TELEMETRY_ENDPOINT} -> ws://{WS_HOST}:{WS_PORT}")
+        await asyncio.gather(zmq_ingest(gateway, socket), report(gateway))
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass